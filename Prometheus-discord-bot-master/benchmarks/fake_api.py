@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Prometheus Obfuscator API
+
+Serves the same endpoints and response shapes as src/api.ts, but instead of
+running the obfuscator it sleeps for a configurable time and returns output
+grown by a configurable factor, per preset. Benchmarks run against it so
+client changes can be measured without a real API or network.
+
+Usage:
+    python -m benchmarks.fake_api [--port 3999] [--profiles profiles.json]
+
+A profiles file maps preset names to any of the PresetProfile fields, e.g.
+{"Strong": {"base_latency": 1.2, "expansion": 80}}.
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import random
+from typing import Dict, NamedTuple, Optional
+
+from aiohttp import web
+
+MAX_SIZE = 40000  # same limit as the real API
+COMPRESS_MIN_SIZE = 1024  # raw responses from this size are gzipped if accepted
+
+
+class PresetProfile(NamedTuple):
+    """How the fake API behaves for one preset"""
+
+    base_latency: float  # seconds per request
+    latency_per_kb: float  # extra seconds per KB of input
+    jitter: float  # +/- share of the latency chosen at random
+    expansion: float  # output size / input size
+
+
+DEFAULT_PROFILES: Dict[str, PresetProfile] = {
+    'Minify': PresetProfile(base_latency=0.02, latency_per_kb=0.001, jitter=0.2, expansion=0.7),
+    'Weak': PresetProfile(base_latency=0.05, latency_per_kb=0.003, jitter=0.2, expansion=3),
+    'Medium': PresetProfile(base_latency=0.15, latency_per_kb=0.01, jitter=0.3, expansion=8),
+    'Strong': PresetProfile(base_latency=0.6, latency_per_kb=0.04, jitter=0.3, expansion=40),
+}
+
+
+def load_profiles(path: Optional[str]) -> Dict[str, PresetProfile]:
+    """
+    Load preset profiles, overriding the defaults field by field
+
+    Args:
+        path: JSON file as described in the module docstring, or None
+    """
+    profiles = dict(DEFAULT_PROFILES)
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            overrides = json.load(f)
+        for preset, fields in overrides.items():
+            base = profiles.get(preset, DEFAULT_PROFILES['Medium'])
+            profiles[preset] = base._replace(**fields)
+    return profiles
+
+
+class FakeObfuscatorAPI:
+    """aiohttp application mimicking the API endpoints"""
+
+    def __init__(self, profiles: Optional[Dict[str, PresetProfile]] = None, error_rate: float = 0.0,
+                 seed: Optional[int] = None, raw: bool = True):
+        """
+        Initialize the fake API
+
+        Args:
+            profiles: Behaviour per preset, DEFAULT_PROFILES when omitted
+            error_rate: Share of obfuscation requests answered with a 503
+            seed: Seed for latency jitter and injected errors
+            raw: Serve /obfuscate-raw (False behaves like an older API)
+        """
+        self.profiles = profiles or dict(DEFAULT_PROFILES)
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.raw = raw
+        self.requests: Dict[str, int] = {}
+        self._runner: Optional[web.AppRunner] = None
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=MAX_SIZE * 2)
+        app.router.add_get('/health', self.health)
+        app.router.add_get('/presets', self.presets)
+        app.router.add_post('/obfuscate', self.obfuscate_file)
+        app.router.add_post('/obfuscate-text', self.obfuscate_text)
+        if self.raw:
+            app.router.add_post('/obfuscate-raw', self.obfuscate_raw)
+        return app
+
+    async def start(self, host: str = '127.0.0.1', port: int = 3999) -> str:
+        """Start serving in the running event loop and return the base URL"""
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        return f"http://{host}:{port}"
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def _count(self, endpoint: str) -> None:
+        self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    async def health(self, request: web.Request) -> web.Response:
+        self._count('/health')
+        return web.json_response({'status': 'ok', 'message': 'Fake Prometheus Obfuscator API is running'})
+
+    async def presets(self, request: web.Request) -> web.Response:
+        self._count('/presets')
+        return web.json_response({'presets': list(self.profiles)})
+
+    async def obfuscate_file(self, request: web.Request) -> web.Response:
+        self._count('/obfuscate')
+        form = await request.post()
+        upload = form.get('file')
+        if not isinstance(upload, web.FileField):
+            return web.json_response({'error': 'No file uploaded. Please upload a .lua file.'}, status=400)
+        code = upload.file.read()
+        if len(code) > MAX_SIZE:
+            return web.json_response({'error': f'File too large. Maximum size is {MAX_SIZE} bytes.'}, status=400)
+        return await self._obfuscate(code, form.get('preset', 'Medium'), {'originalFilename': upload.filename})
+
+    async def obfuscate_text(self, request: web.Request) -> web.Response:
+        self._count('/obfuscate-text')
+        body = await request.json()
+        code = body.get('code')
+        if not code:
+            return web.json_response({'error': 'No code provided. Please include "code" in the request body.'}, status=400)
+        code = code.encode('utf-8')
+        if len(code) > MAX_SIZE:
+            return web.json_response({'error': f'Code too large. Maximum size is {MAX_SIZE} bytes.'}, status=400)
+        return await self._obfuscate(code, body.get('preset', 'Medium'), {})
+
+    async def obfuscate_raw(self, request: web.Request) -> web.Response:
+        self._count('/obfuscate-raw')
+        code = await request.read()
+        if not code:
+            return web.json_response({'error': 'No code provided. Send the Lua source as an '
+                                               'application/octet-stream body.'}, status=400)
+        if len(code) > MAX_SIZE:
+            return web.json_response({'error': f'Code too large. Maximum size is {MAX_SIZE} bytes.'}, status=400)
+        return await self._obfuscate(code, request.headers.get('X-Preset', 'Medium'), {}, raw=True,
+                                     accept_encoding=request.headers.get('Accept-Encoding', ''))
+
+    async def _obfuscate(self, code: bytes, preset: str, extra: Dict[str, str], raw: bool = False,
+                         accept_encoding: str = '') -> web.Response:
+        profile = self.profiles.get(preset)
+        if profile is None:
+            return web.json_response({'error': f"Invalid preset. Valid presets are: {', '.join(self.profiles)}"},
+                                     status=400)
+
+        latency = profile.base_latency + profile.latency_per_kb * len(code) / 1024
+        latency *= 1 + self.random.uniform(-profile.jitter, profile.jitter)
+        await asyncio.sleep(max(0.0, latency))
+
+        if self.error_rate and self.random.random() < self.error_rate:
+            return web.json_response({'error': 'Injected failure'}, status=503)
+
+        obfuscated = expand(code.decode('utf-8'), profile.expansion)
+        if raw:
+            body = obfuscated.encode('utf-8')
+            headers = {'X-Preset': preset}
+            if len(body) >= COMPRESS_MIN_SIZE and 'gzip' in accept_encoding:
+                body = gzip.compress(body, compresslevel=1)
+                headers['Content-Encoding'] = 'gzip'
+            return web.Response(body=body, content_type='application/octet-stream', headers=headers)
+        return web.json_response({
+            'success': True,
+            'preset': preset,
+            **extra,
+            'obfuscatedCode': obfuscated,
+        })
+
+
+def expand(code: str, factor: float) -> str:
+    """Fake obfuscated output of about len(code) * factor characters"""
+    target = max(1, int(len(code) * factor))
+    if factor < 1:
+        return code[:target]
+    # Escapes and non-ASCII text keep the JSON encoding realistic
+    filler = code + '\n--[[ "\\x\u00e9" ]]\n'
+    return (filler * (target // len(filler) + 1))[:target]
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    api = FakeObfuscatorAPI(load_profiles(args.profiles), error_rate=args.error_rate, seed=args.seed,
+                            raw=not args.no_raw)
+    url = await api.start(args.host, args.port)
+    print(f"Fake API listening on {url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await api.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local stand-in for the Prometheus Obfuscator API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3999)
+    parser.add_argument('--profiles', help="JSON file overriding the per-preset profiles")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of requests answered with 503")
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--no-raw', action='store_true', help="Do not serve /obfuscate-raw, like an older API")
+    args = parser.parse_args()
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
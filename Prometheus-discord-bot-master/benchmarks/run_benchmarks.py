@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""
+Benchmark and load-test drivers for the Prometheus client and bot commands
+
+Replays a weighted mix of operations with a fixed number of concurrent
+workers against the fake API (started in-process unless --api-url is given)
+and prints a JSON report with p50/p95/p99 latency per operation, throughput
+and peak RSS. Reports can be saved and compared between runs.
+
+Usage (from the bot directory):
+    python -m benchmarks.run_benchmarks client --requests 500 --concurrency 20
+    python -m benchmarks.run_benchmarks commands --mix upload_heavy --output new.json
+    python -m benchmarks.run_benchmarks compare old.json new.json
+
+Scenarios:
+    client: calls AsyncPrometheusObfuscatorClient directly
+    commands: runs the discord_bot_integration command handlers with
+        stand-in Discord context objects (nothing is sent to Discord)
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import platform
+import random
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from prometheus_obfuscator import AsyncPrometheusObfuscatorClient, ResiliencePolicy, ResultCache
+from prometheus_obfuscator.health import percentile
+
+from .fake_api import FakeObfuscatorAPI, load_profiles
+
+# Operation weights of the built-in mixes
+MIXES: Dict[str, Dict[str, float]] = {
+    'default': {'obfuscate': 0.7, 'obfuscate_text': 0.1, 'presets': 0.15, 'status': 0.05},
+    'upload_heavy': {'obfuscate': 0.95, 'presets': 0.05},
+    'read_heavy': {'obfuscate': 0.2, 'presets': 0.5, 'status': 0.3},
+}
+
+# How often each preset is picked for obfuscations
+PRESET_WEIGHTS = {'Minify': 0.1, 'Weak': 0.25, 'Medium': 0.45, 'Strong': 0.2}
+
+
+def generate_script(rng: random.Random, size: int) -> bytes:
+    """
+    Lua source of about `size` bytes with functions, locals, strings and comments
+
+    Only whole functions are emitted, so the script passes the bot's
+    pre-flight syntax check.
+    """
+    parts: List[str] = []
+    length = 0
+    index = 0
+    while True:
+        index += 1
+        chunk = (
+            f"-- helper {index}\n"
+            f"local function handler_{index}(player, amount)\n"
+            f"    local total = amount * {rng.randint(2, 99)}\n"
+            f"    if total > {rng.randint(100, 9999)} then\n"
+            f"        print(\"limit reached for \" .. player.Name .. \" ({index})\")\n"
+            f"    end\n"
+            f"    return total\n"
+            f"end\n\n"
+        )
+        if parts and length + len(chunk) > size:
+            break
+        parts.append(chunk)
+        length += len(chunk)
+    return ''.join(parts).encode('utf-8')
+
+
+class Workload:
+    """Deterministic sequence of operations and scripts for one run"""
+
+    def __init__(self, mix: Dict[str, float], seed: int, repeat_ratio: float, max_size: int):
+        self.rng = random.Random(seed)
+        self.mix = mix
+        self.repeat_ratio = repeat_ratio
+        self.max_size = max_size
+        self.scripts: List[bytes] = []
+
+    def next_operation(self) -> str:
+        return self.rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+
+    def next_preset(self) -> str:
+        return self.rng.choices(list(PRESET_WEIGHTS), weights=list(PRESET_WEIGHTS.values()))[0]
+
+    def next_script(self) -> bytes:
+        """A new script, or a previously used one (cache hit candidate)"""
+        if self.scripts and self.rng.random() < self.repeat_ratio:
+            return self.rng.choice(self.scripts)
+        # Most scripts are small, a few approach the 40KB limit
+        size = int(min(self.max_size, max(200, self.rng.lognormvariate(8, 1))))
+        script = generate_script(self.rng, size)
+        self.scripts.append(script)
+        return script
+
+
+class Recorder:
+    """Collects latencies and errors per operation"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    async def measure(self, operation: str, func: Callable[[], Awaitable[bool]]) -> None:
+        start = time.perf_counter()
+        try:
+            ok = await func()
+        except Exception:
+            ok = False
+        self.latencies.setdefault(operation, []).append(time.perf_counter() - start)
+        if not ok:
+            self.errors[operation] = self.errors.get(operation, 0) + 1
+
+    def summary(self, duration: float) -> Dict[str, Any]:
+        operations = {}
+        for operation, samples in sorted(self.latencies.items()):
+            operations[operation] = _latency_stats(samples, self.errors.get(operation, 0))
+        all_samples = [sample for samples in self.latencies.values() for sample in samples]
+        total = _latency_stats(all_samples, sum(self.errors.values()))
+        total['throughput_per_s'] = round(len(all_samples) / duration, 2) if duration else None
+        return {'operations': operations, 'total': total}
+
+
+def _latency_stats(samples: List[float], errors: int) -> Dict[str, Any]:
+    ordered = sorted(samples)
+
+    def ms(value: Optional[float]) -> Optional[float]:
+        return None if value is None else round(value * 1000, 2)
+
+    return {
+        'count': len(ordered),
+        'errors': errors,
+        'mean_ms': ms(sum(ordered) / len(ordered)) if ordered else None,
+        'p50_ms': ms(percentile(ordered, 0.50)),
+        'p95_ms': ms(percentile(ordered, 0.95)),
+        'p99_ms': ms(percentile(ordered, 0.99)),
+        'max_ms': ms(ordered[-1]) if ordered else None,
+    }
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(peak / divisor, 1)
+
+
+async def run_workers(requests: int, concurrency: int, step: Callable[[int], Awaitable[None]]) -> float:
+    """Run `requests` steps with `concurrency` workers; returns the wall time"""
+    counter = iter(range(requests))
+
+    async def worker() -> None:
+        for index in counter:
+            await step(index)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start
+
+
+def _make_client(url: str, args: argparse.Namespace) -> AsyncPrometheusObfuscatorClient:
+    cache = ResultCache(max_bytes=args.cache_bytes) if args.cache_bytes else None
+    return AsyncPrometheusObfuscatorClient(url, pool_size=args.pool_size, cache=cache, policy=ResiliencePolicy())
+
+
+async def bench_client(url: str, args: argparse.Namespace, workload: Workload, recorder: Recorder) -> float:
+    """Drive AsyncPrometheusObfuscatorClient directly"""
+    async with _make_client(url, args) as client:
+
+        async def step(index: int) -> None:
+            operation = workload.next_operation()
+            if operation == 'obfuscate':
+                script, preset = workload.next_script(), workload.next_preset()
+
+                async def call() -> bool:
+                    result = await client.obfuscate_stream(script, f"bench_{index}.lua", preset)
+                    if 'file' in result:
+                        result['file'].close()
+                    return 'error' not in result
+            elif operation == 'obfuscate_text':
+                script, preset = workload.next_script(), workload.next_preset()
+
+                async def call() -> bool:
+                    return 'error' not in await client.obfuscate_code(script.decode('utf-8'), preset)
+            elif operation == 'presets':
+                async def call() -> bool:
+                    return 'error' not in await client.get_presets()
+            else:
+                async def call() -> bool:
+                    return 'error' not in await client.health_check()
+            await recorder.measure(operation, call)
+
+        return await run_workers(args.requests, args.concurrency, step)
+
+
+def _read_upload(file) -> None:
+    # Read the upload the way discord.py would
+    while file.fp.read(64 * 1024):
+        pass
+
+
+class _StandInMessage:
+    _ids = itertools.count(1)
+
+    def __init__(self, attachments=None, channel=None):
+        self.id = next(self._ids)
+        self.channel = channel
+        self.attachments = attachments or []
+        self.embed = None
+
+    async def edit(self, embed=None, attachments=(), **kwargs) -> None:
+        self.embed = embed
+        for file in attachments:
+            _read_upload(file)
+
+
+class _StandInAttachment:
+    def __init__(self, filename: str, data: bytes):
+        self.filename = filename
+        self.size = len(data)
+        self._data = data
+
+    async def read(self) -> bytes:
+        return self._data
+
+
+class _StandInUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+
+
+class _StandInGuild:
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+        self.filesize_limit = 10 * 1024 * 1024
+
+
+class _StandInChannel:
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+
+    async def send(self, content=None, embed=None, file=None, **kwargs) -> "_StandInMessage":
+        if file is not None:
+            _read_upload(file)
+        message = _StandInMessage(channel=self)
+        message.embed = embed
+        return message
+
+
+class _StandInContext:
+    """Just enough of commands.Context for the command handlers"""
+
+    def __init__(self, user_id: int, guild_id: int, attachments=None):
+        self.author = _StandInUser(user_id)
+        self.guild = _StandInGuild(guild_id)
+        self.channel = _StandInChannel(guild_id)
+        self.message = _StandInMessage(attachments)
+        self.last_embed = None
+
+    async def send(self, content=None, embed=None, file=None, **kwargs) -> _StandInMessage:
+        message = await self.channel.send(content, embed=embed, file=file, **kwargs)
+        self.last_embed = embed
+        return message
+
+
+async def bench_commands(url: str, args: argparse.Namespace, workload: Workload, recorder: Recorder) -> float:
+    """Drive the discord_bot_integration command handlers"""
+    import discord
+
+    import discord_bot_integration as integration
+    from prometheus_obfuscator import HealthMonitor, PresetRegistry, QuotaManager, ResponseScheduler
+
+    bot = integration.create_bot()
+    bot.obfuscator = _make_client(url, args)
+    bot.preset_registry = PresetRegistry(bot.obfuscator)
+    bot.health_monitor = HealthMonitor(bot.obfuscator)
+    await bot.health_monitor.check_now()
+    # The stand-in channels have no Discord rate limits to pace against
+    bot.responder = ResponseScheduler(rate=1_000_000, per=1.0)
+    # The synthetic users would otherwise run into their quotas on long runs
+    bot.quotas = QuotaManager(user_quota=None, guild_quota=None)
+    failed_colors = (discord.Color.red(),)
+
+    async def step(index: int) -> None:
+        operation = workload.next_operation()
+        ctx = _StandInContext(user_id=index % args.users, guild_id=index % args.guilds)
+        if operation in ('obfuscate', 'obfuscate_text'):
+            operation = 'obfuscate'
+            script, preset = workload.next_script(), workload.next_preset()
+            ctx.message.attachments.append(_StandInAttachment(f"bench_{index}.lua", script))
+            command = integration.obfuscate_command.callback(ctx, preset)
+        elif operation == 'presets':
+            command = integration.presets_command.callback(ctx)
+        else:
+            command = integration.api_status_command.callback(ctx)
+
+        async def call() -> bool:
+            messages: List[_StandInMessage] = []
+            original_send = ctx.send
+
+            async def send(*a, **kw) -> _StandInMessage:
+                message = await original_send(*a, **kw)
+                messages.append(message)
+                return message
+
+            ctx.send = send
+            await command
+            # The handlers report failures by editing their message to a red embed
+            return not any(m.embed is not None and m.embed.color in failed_colors for m in messages)
+
+        await recorder.measure(operation, call)
+
+    try:
+        return await run_workers(args.requests, args.concurrency, step)
+    finally:
+        await bot.obfuscator.close()
+
+
+SCENARIOS = {
+    'client': bench_client,
+    'commands': bench_commands,
+}
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    api = None
+    url = args.api_url
+    if url is None:
+        api = FakeObfuscatorAPI(load_profiles(args.profiles), error_rate=args.error_rate, seed=args.seed,
+                                raw=not args.no_raw)
+        url = await api.start(port=args.port)
+
+    workload = Workload(MIXES[args.mix], args.seed, args.repeat_ratio, args.max_size)
+    recorder = Recorder()
+    try:
+        duration = await SCENARIOS[args.scenario](url, args, workload, recorder)
+    finally:
+        if api is not None:
+            await api.stop()
+
+    report = {
+        'scenario': args.scenario,
+        'config': {
+            'mix': args.mix,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'repeat_ratio': args.repeat_ratio,
+            'pool_size': args.pool_size,
+            'cache_bytes': args.cache_bytes,
+            'error_rate': args.error_rate,
+            'seed': args.seed,
+            'api_url': args.api_url or 'in-process fake',
+        },
+        'duration_s': round(duration, 3),
+        'peak_rss_mb': peak_rss_mb(),
+        'python': platform.python_version(),
+    }
+    report.update(recorder.summary(duration))
+    if api is not None:
+        report['api_requests'] = api.requests
+    return report
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Relative change of the latency percentiles and throughput between two reports"""
+
+    def change(before: Optional[float], after: Optional[float]) -> Optional[float]:
+        if not before or after is None:
+            return None
+        return round((after - before) / before * 100, 1)
+
+    result: Dict[str, Any] = {'operations': {}}
+    for operation in sorted(set(old['operations']) | set(new['operations'])):
+        before = old['operations'].get(operation, {})
+        after = new['operations'].get(operation, {})
+        result['operations'][operation] = {
+            f"{key}_change_pct": change(before.get(key), after.get(key))
+            for key in ('p50_ms', 'p95_ms', 'p99_ms')
+        }
+    result['throughput_change_pct'] = change(old['total'].get('throughput_per_s'), new['total'].get('throughput_per_s'))
+    result['peak_rss_change_pct'] = change(old.get('peak_rss_mb'), new.get('peak_rss_mb'))
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks for the Prometheus client and bot commands")
+    subparsers = parser.add_subparsers(dest='scenario', required=True)
+
+    for scenario in SCENARIOS:
+        sub = subparsers.add_parser(scenario)
+        sub.add_argument('--requests', type=int, default=200, help="Operations to run")
+        sub.add_argument('--concurrency', type=int, default=10, help="Concurrent workers")
+        sub.add_argument('--mix', choices=sorted(MIXES), default='default')
+        sub.add_argument('--repeat-ratio', type=float, default=0.2, help="Share of scripts sent again")
+        sub.add_argument('--max-size', type=int, default=40000, help="Largest generated script in bytes")
+        sub.add_argument('--pool-size', type=int, default=20, help="Client connection pool size")
+        sub.add_argument('--cache-bytes', type=int, default=0, help="Result cache budget, 0 disables it")
+        sub.add_argument('--users', type=int, default=50, help="Distinct Discord users (commands only)")
+        sub.add_argument('--guilds', type=int, default=5, help="Distinct Discord servers (commands only)")
+        sub.add_argument('--api-url', help="Use a running API instead of the in-process fake")
+        sub.add_argument('--port', type=int, default=3999, help="Port of the in-process fake API")
+        sub.add_argument('--profiles', help="JSON file overriding the fake API preset profiles")
+        sub.add_argument('--error-rate', type=float, default=0.0, help="Share of fake API requests failing")
+        sub.add_argument('--no-raw', action='store_true',
+                         help="Fake API without /obfuscate-raw (clients fall back to JSON)")
+        sub.add_argument('--seed', type=int, default=1)
+        sub.add_argument('--output', help="Also write the report to this file")
+
+    sub = subparsers.add_parser('compare')
+    sub.add_argument('old')
+    sub.add_argument('new')
+
+    args = parser.parse_args()
+    if args.scenario == 'compare':
+        with open(args.old, 'r', encoding='utf-8') as f:
+            old = json.load(f)
+        with open(args.new, 'r', encoding='utf-8') as f:
+            new = json.load(f)
+        print(json.dumps(compare(old, new), indent=2))
+        return
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+
+
+if __name__ == "__main__":
+    main()
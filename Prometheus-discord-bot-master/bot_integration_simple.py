@@ -1,58 +1,40 @@
 """
 ðŸš€ Simple Discord Bot Integration for Prometheus Obfuscator
 
-Copy this code into your existing Discord bot to add Lua obfuscation features.
+Copy this code (together with the prometheus_obfuscator package) into your existing
+Discord bot to add Lua obfuscation features.
 Make sure the Prometheus API is running on http://localhost:3000
 
-Required: pip install requests discord.py
+Required: pip install aiohttp discord.py
 """
 
-import requests
 import io
 import discord
 from discord.ext import commands
 
-class PrometheusObfuscatorClient:
-    """Simple client for the Prometheus Obfuscator API"""
-    
-    def __init__(self, base_url="http://localhost:3000"):
-        self.base_url = base_url.rstrip('/')
-    
-    def health_check(self):
-        """Check if API is running"""
-        try:
-            response = requests.get(f"{self.base_url}/health", timeout=5)
-            return response.status_code == 200
-        except:
-            return False
-    
-    def get_presets(self):
-        """Get available presets"""
-        try:
-            response = requests.get(f"{self.base_url}/presets", timeout=5)
-            if response.status_code == 200:
-                return response.json().get('presets', [])
-        except:
-            pass
-        return ["Weak", "Medium", "Strong", "Minify"]  # fallback
-    
-    def obfuscate_code(self, lua_code, preset="Medium"):
-        """Obfuscate Lua code"""
-        try:
-            data = {'code': lua_code, 'preset': preset}
-            response = requests.post(
-                f"{self.base_url}/obfuscate-text",
-                json=data,
-                headers={'Content-Type': 'application/json'},
-                timeout=30
-            )
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
-            return {"error": str(e)}
+from prometheus_obfuscator import (
+    AsyncPrometheusObfuscatorClient,
+    FallbackEngine,
+    HealthMonitor,
+    PresetRegistry,
+    ResultCache,
+    preflight,
+)
+
+# Initialize the shared obfuscator client
+# Close it from your bot's close(): await obfuscator.close()
+# Minify (and Weak while the API is down) is done locally by the fallback engine
+obfuscator = AsyncPrometheusObfuscatorClient(
+    "http://localhost:3000",
+    cache=ResultCache.from_config(),
+    fallback=FallbackEngine.from_config()
+)
+preset_registry = PresetRegistry.from_config(obfuscator)
 
-# Initialize the obfuscator client
-obfuscator = PrometheusObfuscatorClient("http://localhost:3000")
+# Polls /health in the background; commands only read its latest snapshot.
+# It starts with the first command, or call health_monitor.start() from your
+# bot's setup_hook and await health_monitor.stop() from close().
+health_monitor = HealthMonitor.from_config(obfuscator)
 
 # Add these commands to your existing bot
 
@@ -64,8 +46,11 @@ async def obfuscate_lua(ctx, preset="Medium"):
     Attach a .lua file to your message
     """
     
-    # Check if API is running
-    if not obfuscator.health_check():
+    # Check if API is running (presets the fallback engine can do work without it)
+    health_monitor.start()
+    served_locally = (obfuscator.policy.fallback_enabled and obfuscator.fallback is not None
+                      and obfuscator.fallback.supports(preset))
+    if not served_locally and not health_monitor.snapshot().online:
         embed = discord.Embed(
             title="âŒ API Offline",
             description="The obfuscation API is not running. Please contact an administrator.",
@@ -111,7 +96,7 @@ async def obfuscate_lua(ctx, preset="Medium"):
         return
     
     # Validate preset
-    valid_presets = obfuscator.get_presets()
+    valid_presets = await preset_registry.get()
     if preset not in valid_presets:
         embed = discord.Embed(
             title="âŒ Invalid Preset",
@@ -134,8 +119,19 @@ async def obfuscate_lua(ctx, preset="Medium"):
         file_content = await attachment.read()
         lua_code = file_content.decode('utf-8')
         
+        # Catch syntax errors locally instead of spending an API call on them
+        report = preflight(lua_code, preset)
+        if not report.ok:
+            error_embed = discord.Embed(
+                title="âŒ Lua Syntax Error",
+                description=report.error,
+                color=discord.Color.red()
+            )
+            await processing_msg.edit(embed=error_embed)
+            return
+        
         # Obfuscate
-        result = obfuscator.obfuscate_code(lua_code, preset)
+        result = await obfuscator.obfuscate_code(lua_code, preset)
         
         if "error" in result:
             # Error occurred
@@ -191,7 +187,7 @@ async def obfuscate_lua(ctx, preset="Medium"):
 async def show_presets(ctx):
     """Show available obfuscation presets"""
     
-    presets = obfuscator.get_presets()
+    presets = await preset_registry.get()
     
     embed = discord.Embed(
         title="ðŸ”§ Available Obfuscation Presets",
@@ -221,17 +217,32 @@ async def show_presets(ctx):
 async def obfuscator_status(ctx):
     """Check obfuscation API status"""
     
-    if obfuscator.health_check():
+    health_monitor.start()
+    health = health_monitor.snapshot()
+    if health.online:
         embed = discord.Embed(
             title="âœ… Obfuscator Online",
             description="The Prometheus Obfuscator API is running and ready!",
             color=discord.Color.green()
         )
         embed.add_field(name="API URL", value=obfuscator.base_url, inline=False)
+        if health.p50_ms is not None:
+            embed.add_field(
+                name="Latency",
+                value=f"p50 {health.p50_ms:.0f}ms / p95 {health.p95_ms:.0f}ms",
+                inline=False
+            )
+        if obfuscator.cache is not None:
+            stats = obfuscator.cache.stats()
+            embed.add_field(
+                name="Result Cache",
+                value=f"{stats['memory_hits'] + stats['disk_hits']} hits / {stats['misses']} misses",
+                inline=False
+            )
     else:
         embed = discord.Embed(
             title="âŒ Obfuscator Offline",
-            description="The obfuscation API is not responding.",
+            description=f"The obfuscation API is not responding: {health.last_error}",
             color=discord.Color.red()
         )
         embed.add_field(
@@ -255,7 +266,7 @@ async def obfuscator_status(ctx):
    - Or use Docker: docker-compose up prometheus-api
 
 2. Install Python dependencies:
-   - pip install requests discord.py
+   - pip install aiohttp discord.py
 
 3. Copy the commands above into your Discord bot
 
@@ -3,56 +3,447 @@
 Complete Discord bot integration example for Prometheus Obfuscator API
 
 This is a full Discord bot that uses the Prometheus Obfuscator API to obfuscate Lua files.
-Replace 'YOUR_BOT_TOKEN' with your actual Discord bot token.
+Set PROMETHEUS_BOT_TOKEN in prometheus_config.py (or replace 'YOUR_BOT_TOKEN'
+below) with your actual Discord bot token.
 
 Requirements:
-pip install discord.py requests aiohttp
+pip install discord.py aiohttp
 """
 
+import asyncio
+import functools
+import time
+from typing import List, Optional, Tuple
+
 import discord
+from discord import app_commands
 from discord.ext import commands
-import requests
-import aiohttp
-import asyncio
-import io
-import os
-from typing import Optional
+
+from prometheus_obfuscator import (
+    AdmissionController,
+    AdmissionDecision,
+    AsyncPrometheusObfuscatorClient,
+    Delivery,
+    FallbackEngine,
+    HealthMonitor,
+    JobScheduler,
+    JobStore,
+    JobSupersededError,
+    MetricsServer,
+    PipelineMetrics,
+    PresetRegistry,
+    QueueFullError,
+    QuotaManager,
+    ResponseScheduler,
+    ResultCache,
+    ShardAssignment,
+    StoredJob,
+    SubmissionIndex,
+    build_result_zip,
+    collect_sources,
+    preflight,
+    prepare_delivery,
+    run_batch,
+    upload_limit,
+    validate_utf8,
+)
+from prometheus_obfuscator.batch import MAX_ARCHIVE_SIZE, MAX_FILE_SIZE
+from prometheus_obfuscator.config import get_api_urls, get_bot_token, get_setting
 
 # Configuration
-API_BASE_URL = "http://localhost:3000"  # Change this if your API is hosted elsewhere
-BOT_TOKEN = "YOUR_BOT_TOKEN"  # Replace with your Discord bot token
+# PROMETHEUS_API_URL / PROMETHEUS_API_URLS from prometheus_config.py, if present
+API_BASE_URLS = get_api_urls("http://localhost:3000")  # Change this if your API is hosted elsewhere
+BOT_TOKEN = get_bot_token("YOUR_BOT_TOKEN")  # Set PROMETHEUS_BOT_TOKEN in prometheus_config.py, or replace this
 
-class PrometheusObfuscatorBot(commands.Bot):
-    def __init__(self):
+class PrometheusObfuscatorBot(commands.AutoShardedBot):
+    def __init__(self, assignment: Optional[ShardAssignment] = None):
+        # All shards in this process unless shard_runner.py assigned a range
+        self.assignment = assignment or ShardAssignment(None, None, 0)
         intents = discord.Intents.default()
-        intents.message_content = True
-        super().__init__(command_prefix='!', intents=intents)
+        # Only the ! commands need the privileged message content intent,
+        # the slash commands work without it
+        intents.message_content = get_setting('PROMETHEUS_PREFIX_COMMANDS', True)
+        super().__init__(
+            command_prefix='!',
+            intents=intents,
+            shard_ids=self.assignment.shard_ids,
+            shard_count=self.assignment.shard_count
+        )
+        
+        # One pooled client for the whole bot
+        self.result_cache = ResultCache.from_config()
+        # Minify (and Weak while the API is down) is done locally by the fallback engine
+        self.obfuscator = AsyncPrometheusObfuscatorClient(
+            API_BASE_URLS,
+            cache=self.result_cache,
+            fallback=FallbackEngine.from_config()
+        )
+        self.preset_registry = PresetRegistry.from_config(self.obfuscator)
+        self.health_monitor = HealthMonitor.from_config(self.obfuscator)
+        self.scheduler = JobScheduler.from_config()
+        # Queue, downgrade or reject jobs per guild policy when the API is saturated
+        self.admission = AdmissionController.from_config(self.scheduler)
+        # Paces sends/edits per channel and merges queue position updates
+        self.responder = ResponseScheduler.from_config()
+        # Journal of unfinished jobs, replayed after a restart (if configured)
+        self.job_store = JobStore.from_config()
+        self._replay_task = None
+        # Recent submissions per user, to recognize edited versions of a script
+        self.submissions = SubmissionIndex.from_config()
+        # Token bucket quotas per user and guild, charged before downloading
+        self.quotas = QuotaManager.from_config()
+        
+        # Pipeline metrics, served on /metrics if enabled in prometheus_config.py
+        self.metrics = PipelineMetrics()
+        self.metrics.add_gauge('obfuscator_jobs_queued', "Jobs waiting for a worker slot", lambda: self.scheduler.queued)
+        self.metrics.add_gauge('obfuscator_jobs_running', "Jobs running against the API", lambda: self.scheduler.running)
+        self.metrics.add_gauge('obfuscator_jobs_running_heavy', "Heavy jobs running against the API",
+                               lambda: self.scheduler.running_heavy)
+        self.metrics.add_gauge('obfuscator_status_updates_dropped', "Status edits superseded before being sent",
+                               lambda: self.responder.dropped)
+        self.metrics.add_gauge('obfuscator_shard_latency_seconds', "Gateway heartbeat latency per shard",
+                               lambda: {(str(shard_id),): latency for shard_id, latency in self.latencies},
+                               labels=('shard',))
+        self.metrics.add_gauge('obfuscator_shard_guilds', "Guilds per shard", self._guilds_per_shard,
+                               labels=('shard',))
+        # One port per shard process: PROMETHEUS_METRICS_PORT + process index
+        self.metrics_server = MetricsServer.from_config(self.metrics, port_offset=self.assignment.process_index)
+    
+    def _guilds_per_shard(self):
+        counts = {(str(shard_id),): 0 for shard_id in self.shards}
+        for guild in self.guilds:
+            counts[(str(guild.shard_id),)] = counts.get((str(guild.shard_id),), 0) + 1
+        return counts
         
     async def setup_hook(self):
         """Called when the bot is starting up"""
         print(f"ðŸ¤– {self.user} is starting up...")
         
-        # Check if API is available
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{API_BASE_URL}/health") as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        print(f"âœ… API is available: {data['message']}")
-                    else:
-                        print(f"âš ï¸ API returned status {response.status}")
-        except Exception as e:
-            print(f"âŒ Cannot connect to API: {e}")
+        # Check if API is available, then keep checking in the background
+        health = await self.health_monitor.check_now()
+        if health.online:
+            print(f"âœ… API is available: {health.message}")
+        else:
+            print(f"âŒ Cannot connect to API: {health.last_error}")
             print("ðŸ’¡ Make sure the Prometheus API is running on http://localhost:3000")
+        self.health_monitor.start()
+        
+        # Register the slash commands with Discord (once per bot, not per
+        # shard process: the first process does it)
+        if self.assignment.process_index == 0:
+            try:
+                synced = await self.tree.sync()
+                print(f"âœ… Synced {len(synced)} slash commands")
+            except discord.HTTPException as e:
+                print(f"âŒ Could not sync slash commands: {e}")
+        
+        if self.metrics_server is not None:
+            await self.metrics_server.start()
+            print(f"ðŸ“Š Metrics available on http://{self.metrics_server.host}:{self.metrics_server.port}/metrics")
+        
+        # Finish the jobs that were queued or running when the bot last stopped
+        if self.job_store is not None:
+            # Other shard processes replay the jobs of their own guilds
+            loop = asyncio.get_running_loop()
+            unfinished = await loop.run_in_executor(None, self.job_store.unfinished)
+            jobs = [job for job in unfinished if self.assignment.owns(job.guild_id)]
+            if jobs:
+                print(f"ðŸ”„ Replaying {len(jobs)} unfinished job(s)")
+                self._replay_task = asyncio.create_task(replay_jobs(jobs))
+    
+    async def close(self):
+        """Close the API session before shutting down"""
+        await self.health_monitor.stop()
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
+        await self.obfuscator.close()
+        if self.result_cache is not None:
+            self.result_cache.close()
+        # Jobs still in the journal are replayed on the next start
+        if self.job_store is not None:
+            self.job_store.close()
+        # Quotas survive the restart if PROMETHEUS_QUOTA_STATE_PATH is set
+        self.quotas.close()
+        await super().close()
+    
+    async def on_ready(self):
+        print(f"ðŸš€ {self.user} is now online!")
+        print(f"ðŸ“Š Connected to {len(self.guilds)} servers on {len(self.shards)} shard(s)")
 
-bot = PrometheusObfuscatorBot()
+# Built by create_bot(), not on import: the bot opens the result cache, job
+# journal and quota state, which the shard_runner.py supervisor must not hold
+bot: Optional[PrometheusObfuscatorBot] = None
 
-@bot.event
-async def on_ready():
-    print(f"ðŸš€ {bot.user} is now online!")
-    print(f"ðŸ“Š Connected to {len(bot.guilds)} servers")
+async def check_request(filename: str, size: int, preset: str, user_id, guild_id
+                        ) -> Tuple[Optional[discord.Embed], Optional[AdmissionDecision]]:
+    """
+    Validate a single-file request, run it through admission control and
+    charge it to the user's and guild's quotas
+    
+    Shared by !obfuscate and /obfuscate.
+    
+    Returns:
+        (error embed, None) if the request is refused, else (None, decision)
+    """
+    
+    # Check file extension
+    if not filename.lower().endswith('.lua'):
+        embed = discord.Embed(
+            title="âŒ Invalid File Type",
+            description="Please attach a `.lua` file!",
+            color=discord.Color.red()
+        )
+        return embed, None
+    
+    # Check file size (40KB limit)
+    if size > 40000:
+        embed = discord.Embed(
+            title="âŒ File Too Large",
+            description="File size must be under 40KB!",
+            color=discord.Color.red()
+        )
+        return embed, None
+    
+    # Validate preset
+    valid_presets = await bot.preset_registry.get()
+    if preset not in valid_presets:
+        embed = discord.Embed(
+            title="âŒ Invalid Preset",
+            description=f"Valid presets: {', '.join(valid_presets)}",
+            color=discord.Color.red()
+        )
+        return embed, None
+    
+    # Keep the wait bounded while the API is saturated, per the guild's policy
+    decision = bot.admission.decide(preset, guild_id)
+    bot.metrics.admission.inc(preset=preset, action=decision.action)
+    if decision.action == 'reject':
+        bot.metrics.record_error(preset, 'rejected')
+        embed = discord.Embed(
+            title="âŒ Too Busy",
+            description=decision.message,
+            color=discord.Color.red()
+        )
+        return embed, None
+    
+    # Charge the preset that will run, before anything is downloaded
+    quota = bot.quotas.take(user_id, guild_id, decision.preset)
+    if not quota.allowed:
+        bot.metrics.record_error(decision.preset, 'quota')
+        embed = discord.Embed(
+            title="âŒ Quota Exceeded",
+            description=quota.message,
+            color=discord.Color.red()
+        )
+        return embed, None
+    return None, decision
 
-@bot.command(name='obfuscate', aliases=['obf'])
+async def obfuscate_attachment(attachment, decision: AdmissionDecision, user_id, guild,
+                               on_position=None, journal: Optional[Tuple[int, int]] = None,
+                               charged: bool = True) -> Tuple[discord.Embed, Optional[Delivery]]:
+    """
+    Download, check, queue and obfuscate one attachment
+    
+    Shared by !obfuscate and /obfuscate.
+    
+    Args:
+        attachment: The .lua attachment (already validated by check_request)
+        decision: Admission decision, its preset is used
+        user_id: Requesting user, for the per-user queue limit
+        guild: Guild of the request, None in DMs
+        on_position: Called with the queue position while the job waits
+        journal: (channel ID, message ID) the result goes to; the job is
+            journaled under the message ID, which the caller finishes in
+            the job store once the result is delivered
+        charged: Whether check_request charged the job to the quotas
+            (replayed jobs were not)
+    
+    Returns:
+        The result embed and the files to upload (None on failure);
+        the caller must close the delivery
+    
+    A job rejected before it reaches the API (bad encoding, syntax error,
+    full queue, replaced by a newer version) gets its quota charge back.
+    """
+    
+    preset = decision.preset
+    
+    def refund_quota():
+        if charged:
+            bot.quotas.refund(user_id, guild.id if guild else None, preset)
+    
+    try:
+        # Download file content (kept as bytes, only validated as UTF-8)
+        with bot.metrics.time('download'):
+            file_content = await attachment.read()
+        validate_utf8(file_content)
+        
+        # Reject sources the obfuscator would fail on, without an API call
+        report = preflight(file_content, preset)
+        if not report.ok:
+            bot.metrics.record_error(preset, 'syntax')
+            refund_quota()
+            error_embed = discord.Embed(
+                title="âŒ Lua Syntax Error",
+                description=f"`{attachment.filename}`: {report.error}",
+                color=discord.Color.red()
+            )
+            return error_embed, None
+        
+        # Journal the job so it survives a restart (SQLite commits run in a
+        # worker thread, like the result cache's disk tier)
+        loop = asyncio.get_running_loop()
+        if journal is not None and bot.job_store is not None:
+            channel_id, message_id = journal
+            await loop.run_in_executor(
+                None, bot.job_store.add, message_id, channel_id, message_id, user_id, guild.id if guild else None,
+                attachment.filename, preset, file_content, decision.message
+            )
+        
+        # An edited version of a script the user sent recently takes over the
+        # queue slot of the older version if that one is still waiting
+        resubmission = bot.submissions.record(user_id, attachment.filename, file_content)
+        if resubmission is not None:
+            bot.metrics.resubmissions.inc(outcome='flagged')
+        
+        submitted_at = time.perf_counter()
+        
+        async def run_job():
+            started_at = time.perf_counter()
+            if journal is not None and bot.job_store is not None:
+                await loop.run_in_executor(None, bot.job_store.mark_running, journal[1])
+            bot.metrics.stage_seconds.observe(started_at - submitted_at, stage='queue')
+            with bot.metrics.time('api'):
+                job_result = await bot.obfuscator.obfuscate_stream(file_content, attachment.filename, preset)
+            # Only real API round trips say how long the preset takes
+            if 'error' not in job_result and not job_result.get('cached') and not job_result.get('fallback'):
+                bot.admission.record(preset, time.perf_counter() - started_at)
+            return job_result
+        
+        # Send to API once a worker slot is free
+        result = await bot.scheduler.submit(
+            run_job,
+            user_id=user_id,
+            guild_id=guild.id if guild else None,
+            on_position=on_position,
+            heavy=report.heavy,
+            key=attachment.filename,
+            replaces=resubmission.filename if resubmission is not None else None
+        )
+        
+        if "error" in result:
+            bot.metrics.record_error(preset, 'api')
+            error_embed = discord.Embed(
+                title="âŒ Obfuscation Failed",
+                description=f"Error: {result['error']}",
+                color=discord.Color.red()
+            )
+            return error_embed, None
+        
+        # Success embed
+        success_embed = discord.Embed(
+            title="âœ… Obfuscation Complete!",
+            description=f"Successfully obfuscated with **{preset}** preset",
+            color=discord.Color.green()
+        )
+        success_embed.add_field(
+            name="Original File",
+            value=attachment.filename,
+            inline=True
+        )
+        success_embed.add_field(
+            name="Preset Used",
+            value=preset,
+            inline=True
+        )
+        success_embed.add_field(
+            name="Size Change",
+            value=f"{len(file_content)} â†’ {result['size']} bytes",
+            inline=True
+        )
+        if decision.message:
+            success_embed.add_field(name="âš ï¸ Preset Downgraded", value=decision.message, inline=False)
+        if resubmission is not None:
+            success_embed.add_field(name="ðŸ”„ Resubmission", value=resubmission.describe(), inline=False)
+        if result.get('fallback'):
+            success_embed.set_footer(text="Obfuscated by the built-in engine")
+        
+        bot.metrics.record_success(preset, len(file_content), result['size'], result.get('cached', False))
+        
+        # The obfuscated code was streamed into a temporary file. It goes out
+        # raw, zipped or in parts, decided from the size before uploading
+        # (compressing a large output is done off the event loop)
+        delivery = await loop.run_in_executor(
+            None, prepare_delivery, result['file'], result['size'], f"obfuscated_{attachment.filename}",
+            upload_limit(guild.filesize_limit if guild else None)
+        )
+        note = delivery.describe()
+        if note:
+            success_embed.add_field(name="ðŸ“‹ Delivery", value=note, inline=False)
+        return success_embed, delivery
+    
+    except QueueFullError as e:
+        bot.metrics.record_error(preset, 'queue_full')
+        refund_quota()
+        error_embed = discord.Embed(
+            title="âŒ Too Busy",
+            description=str(e),
+            color=discord.Color.red()
+        )
+    
+    except JobSupersededError:
+        bot.metrics.resubmissions.inc(outcome='replaced')
+        refund_quota()
+        error_embed = discord.Embed(
+            title="ðŸ”„ Replaced",
+            description=f"`{attachment.filename}` was replaced by a newer version before it started",
+            color=discord.Color.orange()
+        )
+    
+    except UnicodeDecodeError:
+        bot.metrics.record_error(preset, 'encoding')
+        refund_quota()
+        error_embed = discord.Embed(
+            title="âŒ File Encoding Error",
+            description="Could not read the file. Make sure it's a valid text file.",
+            color=discord.Color.red()
+        )
+    
+    except Exception as e:
+        bot.metrics.record_error(preset, type(e).__name__)
+        error_embed = discord.Embed(
+            title="âŒ Error",
+            description=f"An error occurred: {str(e)}",
+            color=discord.Color.red()
+        )
+    return error_embed, None
+
+async def finish_response(processing_msg, embed: discord.Embed, delivery: Optional[Delivery] = None):
+    """
+    Replace a processing message with the final embed and files
+
+    The embed and the (first) file go out in one edit, extra parts of a
+    split result follow as messages. All calls are paced per channel.
+    """
+    
+    channel = processing_msg.channel
+    route = channel.id
+    if delivery is None:
+        await bot.responder.send(route, lambda: processing_msg.edit(embed=embed), replaces=processing_msg.id)
+        return
+    
+    # Uploading straight from the temporary file(s)
+    with delivery, bot.metrics.time('upload'):
+        (filename, part), *rest = delivery.parts
+        await bot.responder.send(
+            route,
+            lambda: processing_msg.edit(embed=embed, attachments=[discord.File(part, filename=filename)]),
+            replaces=processing_msg.id
+        )
+        for filename, part in rest:
+            await bot.responder.send(route, lambda: channel.send(file=discord.File(part, filename=filename)))
+
+@commands.command(name='obfuscate', aliases=['obf'])
 async def obfuscate_command(ctx, preset: str = "Medium"):
     """
     Obfuscate a Lua file
@@ -70,112 +461,257 @@ async def obfuscate_command(ctx, preset: str = "Medium"):
             description="Please attach a `.lua` file to obfuscate!",
             color=discord.Color.red()
         )
-        await ctx.send(embed=embed)
+        await bot.responder.send(ctx.channel.id, lambda: ctx.send(embed=embed))
         return
     
     attachment = ctx.message.attachments[0]
+    error_embed, decision = await check_request(attachment.filename, attachment.size, preset,
+                                                ctx.author.id, ctx.guild.id if ctx.guild else None)
+    if error_embed is not None:
+        await bot.responder.send(ctx.channel.id, lambda: ctx.send(embed=error_embed))
+        return
     
-    # Check file extension
-    if not attachment.filename.lower().endswith('.lua'):
-        embed = discord.Embed(
-            title="âŒ Invalid File Type",
-            description="Please attach a `.lua` file!",
-            color=discord.Color.red()
-        )
-        await ctx.send(embed=embed)
+    # Send processing message
+    processing_embed = discord.Embed(
+        title="ðŸ”„ Processing...",
+        description=f"Obfuscating `{attachment.filename}` with **{decision.preset}** preset...",
+        color=discord.Color.orange()
+    )
+    processing_msg = await bot.responder.send(ctx.channel.id, lambda: ctx.send(embed=processing_embed))
+    
+    async def show_queue_position(position):
+        if position:
+            embed = discord.Embed(
+                title="ðŸ”„ Queued...",
+                description=f"`{attachment.filename}` is **#{position}** in the queue",
+                color=discord.Color.orange()
+            )
+        else:
+            embed = processing_embed
+        # Only the latest position is sent if edits pile up
+        bot.responder.update(ctx.channel.id, processing_msg.id, lambda: processing_msg.edit(embed=embed))
+    
+    embed, delivery = await obfuscate_attachment(attachment, decision, ctx.author.id, ctx.guild,
+                                                 on_position=show_queue_position,
+                                                 journal=(ctx.channel.id, processing_msg.id))
+    await finish_response(processing_msg, embed, delivery)
+    if bot.job_store is not None:
+        await asyncio.get_running_loop().run_in_executor(None, bot.job_store.finish, processing_msg.id)
+
+class StoredAttachment:
+    """A journaled source standing in for the original attachment on replay"""
+    
+    def __init__(self, job: StoredJob):
+        self.filename = job.filename
+        self.size = len(job.source)
+        self._source = job.source
+    
+    async def read(self) -> bytes:
+        return self._source
+
+async def replay_job(job: StoredJob):
+    """Run a job journaled before a restart and deliver its result"""
+    
+    try:
+        channel = bot.get_channel(job.channel_id) or await bot.fetch_channel(job.channel_id)
+        try:
+            processing_msg = await channel.fetch_message(job.message_id)
+        except discord.NotFound:
+            # The processing message was deleted, answer with a new one
+            embed = discord.Embed(
+                title="ðŸ”„ Processing...",
+                description=f"Resuming `{job.filename}` with **{job.preset}** preset...",
+                color=discord.Color.orange()
+            )
+            processing_msg = await bot.responder.send(channel.id, lambda: channel.send(embed=embed))
+    except discord.HTTPException as e:
+        print(f"âŒ Dropping journaled job {job.id}: {e}")
+        await asyncio.get_running_loop().run_in_executor(None, bot.job_store.finish, job.id)
         return
     
-    # Check file size (40KB limit)
-    if attachment.size > 40000:
+    # Already admitted before the restart, so it skips admission control
+    decision = AdmissionDecision('admit', job.preset, 0.0, job.notice)
+    embed, delivery = await obfuscate_attachment(StoredAttachment(job), decision, job.user_id,
+                                                 getattr(channel, 'guild', None), charged=False)
+    await finish_response(processing_msg, embed, delivery)
+    await asyncio.get_running_loop().run_in_executor(None, bot.job_store.finish, job.id)
+
+async def replay_jobs(jobs: List[StoredJob]):
+    """
+    Replay journaled jobs
+    
+    Each user's jobs run one after another (the queue limits jobs per
+    user), different users in parallel. Identical sources are only
+    computed once, through the client's result cache.
+    """
+    
+    by_user = {}
+    for job in jobs:
+        by_user.setdefault(job.user_id, []).append(job)
+    
+    async def replay_user(user_jobs):
+        for job in user_jobs:
+            try:
+                await replay_job(job)
+            except Exception as e:
+                print(f"âŒ Replaying job {job.id} failed: {e}")
+    
+    await asyncio.gather(*(replay_user(user_jobs) for user_jobs in by_user.values()))
+
+@commands.command(name='obfuscate_batch', aliases=['obfbatch'])
+async def obfuscate_batch_command(ctx, preset: str = "Medium"):
+    """
+    Obfuscate several Lua files at once
+    
+    Usage: !obfuscate_batch [preset]
+    
+    Attach several .lua files and/or .zip archives of .lua files.
+    The results come back as one zip file with a manifest.json.
+    """
+    
+    if not ctx.message.attachments:
         embed = discord.Embed(
-            title="âŒ File Too Large",
-            description="File size must be under 40KB!",
+            title="âŒ No Files Attached",
+            description="Please attach `.lua` files or a `.zip` archive to obfuscate!",
             color=discord.Color.red()
         )
-        await ctx.send(embed=embed)
+        await bot.responder.send(ctx.channel.id, lambda: ctx.send(embed=embed))
         return
     
     # Validate preset
-    valid_presets = ["Weak", "Medium", "Strong", "Minify"]
+    valid_presets = await bot.preset_registry.get()
     if preset not in valid_presets:
         embed = discord.Embed(
             title="âŒ Invalid Preset",
             description=f"Valid presets: {', '.join(valid_presets)}",
             color=discord.Color.red()
         )
-        await ctx.send(embed=embed)
+        await bot.responder.send(ctx.channel.id, lambda: ctx.send(embed=embed))
         return
     
-    # Send processing message
+    decision = bot.admission.decide(preset, ctx.guild.id if ctx.guild else None)
+    bot.metrics.admission.inc(preset=preset, action=decision.action)
+    if decision.action == 'reject':
+        bot.metrics.record_error(preset, 'rejected')
+        embed = discord.Embed(
+            title="âŒ Too Busy",
+            description=decision.message,
+            color=discord.Color.red()
+        )
+        await bot.responder.send(ctx.channel.id, lambda: ctx.send(embed=embed))
+        return
+    preset = decision.preset
+    
     processing_embed = discord.Embed(
         title="ðŸ”„ Processing...",
-        description=f"Obfuscating `{attachment.filename}` with **{preset}** preset...",
+        description=f"Obfuscating {len(ctx.message.attachments)} attachment(s) with **{preset}** preset...",
         color=discord.Color.orange()
     )
-    processing_msg = await ctx.send(embed=processing_embed)
+    processing_msg = await bot.responder.send(ctx.channel.id, lambda: ctx.send(embed=processing_embed))
+    files = []
+    charged = 0
     
     try:
-        # Download file content
-        file_content = await attachment.read()
-        lua_code = file_content.decode('utf-8')
+        # Download attachments, skipping the content of oversized ones
+        attachments = []
+        for attachment in ctx.message.attachments:
+            limit = MAX_ARCHIVE_SIZE if attachment.filename.lower().endswith('.zip') else MAX_FILE_SIZE
+            if attachment.size > limit:
+                attachments.append((attachment.filename, None))
+            else:
+                attachments.append((attachment.filename, await attachment.read()))
+        files = collect_sources(attachments)
         
-        # Send to API
-        async with aiohttp.ClientSession() as session:
-            data = {
-                'code': lua_code,
-                'preset': preset
-            }
-            
-            async with session.post(f"{API_BASE_URL}/obfuscate-text", json=data) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    
-                    # Create obfuscated file
-                    obfuscated_content = result['obfuscatedCode']
-                    obfuscated_file = io.BytesIO(obfuscated_content.encode('utf-8'))
-                    
-                    # Success embed
-                    success_embed = discord.Embed(
-                        title="âœ… Obfuscation Complete!",
-                        description=f"Successfully obfuscated with **{preset}** preset",
-                        color=discord.Color.green()
-                    )
-                    success_embed.add_field(
-                        name="Original File", 
-                        value=attachment.filename, 
-                        inline=True
-                    )
-                    success_embed.add_field(
-                        name="Preset Used", 
-                        value=preset, 
-                        inline=True
-                    )
-                    
-                    # Send result
-                    await processing_msg.edit(embed=success_embed)
-                    await ctx.send(
-                        file=discord.File(
-                            obfuscated_file, 
-                            filename=f"obfuscated_{attachment.filename}"
-                        )
-                    )
-                    
-                else:
-                    error_data = await response.json()
-                    error_embed = discord.Embed(
-                        title="âŒ Obfuscation Failed",
-                        description=f"Error: {error_data.get('error', 'Unknown error')}",
-                        color=discord.Color.red()
-                    )
-                    await processing_msg.edit(embed=error_embed)
-                    
-    except UnicodeDecodeError:
+        # Every Lua file queued is charged as one job, archive members included
+        queued = [f for f in files if f.error is None]
+        if queued:
+            quota = bot.quotas.take(ctx.author.id, ctx.guild.id if ctx.guild else None, preset,
+                                    count=len(queued))
+            if not quota.allowed:
+                bot.metrics.record_error(preset, 'quota')
+                error_embed = discord.Embed(
+                    title="âŒ Quota Exceeded",
+                    description=quota.message,
+                    color=discord.Color.red()
+                )
+                await finish_response(processing_msg, error_embed)
+                return
+            charged = len(queued)
+        
+        async def show_queue_position(position):
+            if position:
+                embed = discord.Embed(
+                    title="ðŸ”„ Queued...",
+                    description=f"Your batch is **#{position}** in the queue",
+                    color=discord.Color.orange()
+                )
+            else:
+                embed = processing_embed
+            bot.responder.update(ctx.channel.id, processing_msg.id, lambda: processing_msg.edit(embed=embed))
+        
+        # The whole batch is one (heavy) job in the queue; inside it, files
+        # are sent with bounded parallelism
+        await bot.scheduler.submit(
+            lambda: run_batch(bot.obfuscator, files, preset),
+            user_id=ctx.author.id,
+            guild_id=ctx.guild.id if ctx.guild else None,
+            on_position=show_queue_position,
+            heavy=True
+        )
+        # Files turned away before reaching the API (encoding, syntax) cost nothing
+        unsent = sum(1 for f in queued if not f.sent)
+        if unsent:
+            bot.quotas.refund(ctx.author.id, ctx.guild.id if ctx.guild else None, preset, count=unsent)
+        
+        succeeded = sum(1 for f in files if f.ok)
+        failed = [f for f in files if not f.ok]
+        if not succeeded:
+            error_embed = discord.Embed(
+                title="âŒ Obfuscation Failed",
+                description="\n".join(f"`{f.name}`: {f.error}" for f in failed[:10]),
+                color=discord.Color.red()
+            )
+            await finish_response(processing_msg, error_embed)
+            return
+        
+        summary_embed = discord.Embed(
+            title="âœ… Batch Complete!" if not failed else "âš ï¸ Batch Partially Complete",
+            description=f"Obfuscated **{succeeded}** of **{len(files)}** file(s) with **{preset}** preset",
+            color=discord.Color.green() if not failed else discord.Color.orange()
+        )
+        if failed:
+            lines = [f"`{f.name}`: {f.error}" for f in failed[:10]]
+            if len(failed) > 10:
+                lines.append(f"...and {len(failed) - 10} more (see manifest.json)")
+            summary_embed.add_field(name="Failed", value="\n".join(lines)[:1024], inline=False)
+        if decision.message:
+            summary_embed.add_field(name="âš ï¸ Preset Downgraded", value=decision.message, inline=False)
+        
+        # Zipping every output (and splitting the zip if it does not fit) is
+        # done off the event loop, like the single-file delivery
+        loop = asyncio.get_running_loop()
+        result_zip = await loop.run_in_executor(None, build_result_zip, files, preset)
+        size = result_zip.seek(0, 2)
+        result_zip.seek(0)
+        # Already compressed, so it is only split if it does not fit
+        delivery = await loop.run_in_executor(
+            None, functools.partial(prepare_delivery, result_zip, size, "obfuscated_batch.zip",
+                                    upload_limit(ctx.guild.filesize_limit if ctx.guild else None), compress=False)
+        )
+        note = delivery.describe()
+        if note:
+            summary_embed.add_field(name="ðŸ“‹ Delivery", value=note, inline=False)
+        await finish_response(processing_msg, summary_embed, delivery)
+        
+    except QueueFullError as e:
+        if charged:
+            bot.quotas.refund(ctx.author.id, ctx.guild.id if ctx.guild else None, preset, count=charged)
         error_embed = discord.Embed(
-            title="âŒ File Encoding Error",
-            description="Could not read the file. Make sure it's a valid text file.",
+            title="âŒ Too Busy",
+            description=str(e),
             color=discord.Color.red()
         )
-        await processing_msg.edit(embed=error_embed)
+        await finish_response(processing_msg, error_embed)
         
     except Exception as e:
         error_embed = discord.Embed(
@@ -183,74 +719,87 @@ async def obfuscate_command(ctx, preset: str = "Medium"):
             description=f"An error occurred: {str(e)}",
             color=discord.Color.red()
         )
-        await processing_msg.edit(embed=error_embed)
+        await finish_response(processing_msg, error_embed)
+    
+    finally:
+        # Outputs not packed into the zip (e.g. after an error) are released here
+        for batch_file in files:
+            if batch_file.output is not None and not batch_file.output.closed:
+                batch_file.output.close()
 
-@bot.command(name='presets')
+async def build_presets_embed() -> discord.Embed:
+    """The preset list shown by !presets and /presets"""
+    
+    presets = await bot.preset_registry.get()
+    
+    embed = discord.Embed(
+        title="ðŸ”§ Available Presets",
+        color=discord.Color.blue()
+    )
+    
+    preset_descriptions = {
+        "Minify": "Basic minification without obfuscation",
+        "Weak": "Light obfuscation with VM and constant arrays",
+        "Medium": "Moderate obfuscation with string encryption",
+        "Strong": "Heavy obfuscation with multiple VM layers"
+    }
+    
+    for preset in presets:
+        description = preset_descriptions.get(preset, "No description available")
+        embed.add_field(
+            name=preset,
+            value=description,
+            inline=False
+        )
+    
+    return embed
+
+@commands.command(name='presets')
 async def presets_command(ctx):
     """Show available obfuscation presets"""
     
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"{API_BASE_URL}/presets") as response:
-                if response.status == 200:
-                    data = await response.json()
-                    presets = data['presets']
-                    
-                    embed = discord.Embed(
-                        title="ðŸ”§ Available Presets",
-                        color=discord.Color.blue()
-                    )
-                    
-                    preset_descriptions = {
-                        "Minify": "Basic minification without obfuscation",
-                        "Weak": "Light obfuscation with VM and constant arrays",
-                        "Medium": "Moderate obfuscation with string encryption",
-                        "Strong": "Heavy obfuscation with multiple VM layers"
-                    }
-                    
-                    for preset in presets:
-                        description = preset_descriptions.get(preset, "No description available")
-                        embed.add_field(
-                            name=preset,
-                            value=description,
-                            inline=False
-                        )
-                    
-                    await ctx.send(embed=embed)
-                else:
-                    await ctx.send("âŒ Could not fetch presets from API")
-                    
-    except Exception as e:
-        await ctx.send(f"âŒ Error fetching presets: {str(e)}")
+    await ctx.send(embed=await build_presets_embed())
 
-@bot.command(name='api_status', aliases=['status'])
-async def api_status_command(ctx):
-    """Check API server status"""
+def build_status_embed() -> discord.Embed:
+    """The API status shown by !status and /status"""
     
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"{API_BASE_URL}/health") as response:
-                if response.status == 200:
-                    data = await response.json()
-                    embed = discord.Embed(
-                        title="âœ… API Status",
-                        description=data['message'],
-                        color=discord.Color.green()
-                    )
-                    embed.add_field(name="URL", value=API_BASE_URL, inline=False)
-                    await ctx.send(embed=embed)
-                else:
-                    embed = discord.Embed(
-                        title="âš ï¸ API Status",
-                        description=f"API returned status {response.status}",
-                        color=discord.Color.orange()
-                    )
-                    await ctx.send(embed=embed)
-                    
-    except Exception as e:
+    health = bot.health_monitor.snapshot()
+    if health.online:
+        embed = discord.Embed(
+            title="âœ… API Status",
+            description=health.message,
+            color=discord.Color.green()
+        )
+        embed.add_field(name="URL", value=", ".join(API_BASE_URLS), inline=False)
+        if len(API_BASE_URLS) > 1:
+            instances = bot.obfuscator.balancer.stats()
+            embed.add_field(
+                name="Instances",
+                value="\n".join(
+                    f"{'ejected' if instance['ejected'] else 'up'}: {instance['url']} "
+                    f"({instance['outstanding']} in flight)"
+                    for instance in instances
+                ),
+                inline=False
+            )
+        if health.p50_ms is not None:
+            embed.add_field(
+                name="Latency",
+                value=f"p50 {health.p50_ms:.0f}ms / p95 {health.p95_ms:.0f}ms / p99 {health.p99_ms:.0f}ms",
+                inline=False
+            )
+            embed.add_field(name="Availability", value=f"{health.availability:.0%}", inline=True)
+        if bot.result_cache is not None:
+            stats = bot.result_cache.stats()
+            embed.add_field(
+                name="Result Cache",
+                value=f"{stats['memory_hits'] + stats['disk_hits']} hits / {stats['misses']} misses",
+                inline=False
+            )
+    else:
         embed = discord.Embed(
             title="âŒ API Offline",
-            description=f"Cannot connect to API: {str(e)}",
+            description=f"Cannot connect to API: {health.last_error}",
             color=discord.Color.red()
         )
         embed.add_field(
@@ -258,9 +807,116 @@ async def api_status_command(ctx):
             value="Make sure the Prometheus API is running on http://localhost:3000",
             inline=False
         )
-        await ctx.send(embed=embed)
+    return embed
+
+@commands.command(name='api_status', aliases=['status'])
+async def api_status_command(ctx):
+    """Check API server status"""
+    
+    await ctx.send(embed=build_status_embed())
+
+# Slash commands: a job costs one deferred response and one follow-up
+# (plus one per extra part of a split result), and they work without the
+# message content intent
+
+async def preset_autocomplete(interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+    """Preset choices from the cached registry"""
+    presets = await bot.preset_registry.get()
+    return [
+        app_commands.Choice(name=preset, value=preset)
+        for preset in presets
+        if current.lower() in preset.lower()
+    ][:25]
+
+@app_commands.command(name='obfuscate', description="Obfuscate a Lua file")
+@app_commands.describe(file="The .lua file to obfuscate", preset="Obfuscation preset")
+@app_commands.autocomplete(preset=preset_autocomplete)
+async def obfuscate_slash(interaction: discord.Interaction, file: discord.Attachment, preset: str = "Medium"):
+    """Obfuscate a Lua file"""
+    
+    # Acknowledge right away, the job may wait in the queue
+    await interaction.response.defer(thinking=True)
+    
+    error_embed, decision = await check_request(file.filename, file.size, preset, interaction.user.id,
+                                                interaction.guild_id)
+    if error_embed is not None:
+        await interaction.followup.send(embed=error_embed)
+        return
+    
+    embed, delivery = await obfuscate_attachment(file, decision, interaction.user.id, interaction.guild)
+    if delivery is None:
+        await interaction.followup.send(embed=embed)
+        return
+    
+    # The embed goes out with the (first) file in a single follow-up
+    with delivery, bot.metrics.time('upload'):
+        (filename, part), *rest = delivery.parts
+        await interaction.followup.send(embed=embed, file=discord.File(part, filename=filename))
+        for filename, part in rest:
+            await interaction.followup.send(file=discord.File(part, filename=filename))
+
+@app_commands.command(name='presets', description="Show available obfuscation presets")
+async def presets_slash(interaction: discord.Interaction):
+    """Show available obfuscation presets"""
+    
+    # The registry may have to ask the API first
+    await interaction.response.defer()
+    await interaction.followup.send(embed=await build_presets_embed())
 
-@bot.command(name='help_obfuscator', aliases=['obf_help'])
+@app_commands.command(name='status', description="Check API server status")
+async def status_slash(interaction: discord.Interaction):
+    """Check API server status"""
+    
+    # Read from the health monitor's snapshot, so no need to defer
+    await interaction.response.send_message(embed=build_status_embed())
+
+@commands.command(name='admission')
+@commands.guild_only()
+async def admission_command(ctx, policy: str = None):
+    """
+    Show or set what happens to jobs from this server while the API is busy
+    
+    Usage: !admission [queue|downgrade|reject|default]
+    """
+    
+    if policy is not None:
+        if not ctx.author.guild_permissions.manage_guild:
+            embed = discord.Embed(
+                title="âŒ Missing Permission",
+                description="You need the **Manage Server** permission to change the policy.",
+                color=discord.Color.red()
+            )
+            await ctx.send(embed=embed)
+            return
+        try:
+            bot.admission.set_policy(ctx.guild.id, None if policy == 'default' else policy.lower())
+        except ValueError as e:
+            embed = discord.Embed(
+                title="âŒ Invalid Policy",
+                description=str(e),
+                color=discord.Color.red()
+            )
+            await ctx.send(embed=embed)
+            return
+    
+    embed = discord.Embed(
+        title="ðŸ”§ Admission Policy",
+        description=f"Policy for this server: **{bot.admission.policy_for(ctx.guild.id)}**",
+        color=discord.Color.blue()
+    )
+    embed.add_field(
+        name="Applies when",
+        value=f"the expected time to a result is over {bot.admission.latency_budget:.0f}s",
+        inline=False
+    )
+    embed.add_field(
+        name="Policies",
+        value="`queue`: wait for a slot\n`downgrade`: run Strong as Medium\n`reject`: turn the job away",
+        inline=False
+    )
+    await ctx.send(embed=embed)
+
+@commands.command(name='help_obfuscator', aliases=['obf_help'])
 async def help_command(ctx):
     """Show help for obfuscator commands"""
     
@@ -276,6 +932,12 @@ async def help_command(ctx):
         inline=False
     )
     
+    embed.add_field(
+        name="!obfuscate_batch [preset]",
+        value="Obfuscate several .lua files or .zip archives at once\nExample: `!obfuscate_batch Strong`",
+        inline=False
+    )
+    
     embed.add_field(
         name="!presets",
         value="Show available obfuscation presets",
@@ -288,6 +950,18 @@ async def help_command(ctx):
         inline=False
     )
     
+    embed.add_field(
+        name="/obfuscate, /presets, /status",
+        value="Slash command versions, with preset autocompletion",
+        inline=False
+    )
+    
+    embed.add_field(
+        name="!admission [policy]",
+        value="Show or set (Manage Server) what happens to jobs while the API is busy",
+        inline=False
+    )
+    
     embed.add_field(
         name="ðŸ“‹ Usage",
         value="1. Upload a .lua file\n2. Use `!obfuscate [preset]`\n3. Download the obfuscated result",
@@ -296,10 +970,32 @@ async def help_command(ctx):
     
     await ctx.send(embed=embed)
 
+PREFIX_COMMANDS = [
+    obfuscate_command, obfuscate_batch_command, presets_command, api_status_command, admission_command, help_command
+]
+SLASH_COMMANDS = [obfuscate_slash, presets_slash, status_slash]
+
+def create_bot(assignment: Optional[ShardAssignment] = None) -> PrometheusObfuscatorBot:
+    """
+    Build the bot and register its commands
+    
+    The command handlers use the bot built last, so build one per process.
+    
+    Args:
+        assignment: Shards to run, from the environment set by shard_runner.py when omitted
+    """
+    global bot
+    bot = PrometheusObfuscatorBot(assignment or ShardAssignment.from_env())
+    for command in PREFIX_COMMANDS:
+        bot.add_command(command)
+    for command in SLASH_COMMANDS:
+        bot.tree.add_command(command)
+    return bot
+
 if __name__ == "__main__":
     if BOT_TOKEN == "YOUR_BOT_TOKEN":
-        print("âŒ Please set your Discord bot token in the BOT_TOKEN variable!")
+        print("âŒ Please set PROMETHEUS_BOT_TOKEN in prometheus_config.py or the BOT_TOKEN variable!")
         print("ðŸ’¡ Get a token from: https://discord.com/developers/applications")
     else:
         print("ðŸ¤– Starting Discord bot...")
-        bot.run(BOT_TOKEN)
+        create_bot().run(BOT_TOKEN)
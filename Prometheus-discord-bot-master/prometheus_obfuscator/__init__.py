@@ -0,0 +1,77 @@
+"""
+Python client package for the Prometheus Obfuscator API
+
+Shared by the Discord bot integrations and any other Python application.
+"""
+
+from .admission import AdmissionController, AdmissionDecision
+from .aio import FALLBACK_PRESETS, AsyncPrometheusObfuscatorClient
+from .analysis import SourceReport, preflight
+from .batch import BatchFile, build_result_zip, collect_sources, run_batch
+from .balancer import STRATEGIES, BalancingStrategy, LoadBalancer
+from .cache import ResultCache, source_key
+from .delivery import Delivery, prepare_delivery, upload_limit
+from .fallback import FallbackEngine
+from .health import HealthMonitor, HealthSnapshot
+from .incremental import Resubmission, SubmissionIndex
+from .metrics import MetricsServer, PipelineMetrics
+from .presets import PresetRegistry
+from .quotas import QuotaDecision, QuotaManager
+from .responder import ResponseScheduler
+from .scheduler import JobScheduler, JobSupersededError, QueueFullError
+from .sharding import ShardAssignment, ShardRunner, shard_for_guild
+from .singleflight import SingleFlight
+from .jobstore import JobStore, StoredJob
+from .lua_lexer import LuaSyntaxError
+from .streaming import JsonFieldStream, validate_utf8
+from .sync import PrometheusObfuscatorClient
+from .resilience import CircuitBreaker, CircuitOpenError, ResiliencePolicy, TransientError
+
+__all__ = [
+    "AdmissionController",
+    "AdmissionDecision",
+    "AsyncPrometheusObfuscatorClient",
+    "BalancingStrategy",
+    "BatchFile",
+    "CircuitBreaker",
+    "CircuitOpenError",
+    "Delivery",
+    "FALLBACK_PRESETS",
+    "FallbackEngine",
+    "HealthMonitor",
+    "HealthSnapshot",
+    "JobScheduler",
+    "JobStore",
+    "JobSupersededError",
+    "JsonFieldStream",
+    "LoadBalancer",
+    "LuaSyntaxError",
+    "MetricsServer",
+    "PipelineMetrics",
+    "PresetRegistry",
+    "PrometheusObfuscatorClient",
+    "QueueFullError",
+    "QuotaDecision",
+    "QuotaManager",
+    "ResiliencePolicy",
+    "Resubmission",
+    "ResponseScheduler",
+    "ResultCache",
+    "STRATEGIES",
+    "ShardAssignment",
+    "ShardRunner",
+    "SingleFlight",
+    "SourceReport",
+    "StoredJob",
+    "SubmissionIndex",
+    "TransientError",
+    "build_result_zip",
+    "collect_sources",
+    "preflight",
+    "prepare_delivery",
+    "run_batch",
+    "shard_for_guild",
+    "source_key",
+    "upload_limit",
+    "validate_utf8",
+]
@@ -0,0 +1,7 @@
+"""Entry point for `python -m prometheus_obfuscator`, see cli.py"""
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
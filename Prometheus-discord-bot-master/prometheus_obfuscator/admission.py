@@ -0,0 +1,153 @@
+"""
+Cost-aware admission control for obfuscation jobs
+
+Tracks how long each preset takes on the API and how busy the job scheduler
+is, and estimates the latency a new job would see. When that estimate is
+over the latency budget, the guild's policy decides what happens:
+
+- queue: the job waits like any other (the default)
+- downgrade: Strong runs as Medium instead, and the user is told so
+- reject: the job is turned away with an estimate of when to retry
+"""
+
+from typing import Dict, Hashable, NamedTuple, Optional
+
+from .config import get_setting
+from .scheduler import JobScheduler
+
+# Defaults, overridable from prometheus_config.py
+DEFAULT_POLICY = 'queue'
+DEFAULT_LATENCY_BUDGET = 60.0  # seconds from submission to result
+
+POLICIES = ('queue', 'downgrade', 'reject')
+
+# Cheaper preset used by the downgrade policy
+DOWNGRADES = {'Strong': 'Medium'}
+
+# Seconds per job assumed until real samples come in
+PRIOR_LATENCY = {'Minify': 0.2, 'Weak': 1.0, 'Medium': 3.0, 'Strong': 10.0}
+
+# Weight of the newest sample in the latency moving average
+LATENCY_ALPHA = 0.2
+
+
+class AdmissionDecision(NamedTuple):
+    """What to do with a job"""
+
+    action: str  # 'admit', 'downgrade' or 'reject'
+    preset: str  # preset to run with (differs from the requested one on downgrade)
+    estimated_seconds: float  # expected latency with that preset
+    message: Optional[str]  # notice for the user on downgrade/reject
+
+
+class AdmissionController:
+    """Decides per job whether to queue, downgrade or reject it"""
+
+    def __init__(
+        self,
+        scheduler: JobScheduler,
+        latency_budget: float = DEFAULT_LATENCY_BUDGET,
+        default_policy: str = DEFAULT_POLICY,
+        guild_policies: Optional[Dict[Hashable, str]] = None,
+    ):
+        """
+        Initialize the controller
+
+        Args:
+            scheduler: Scheduler the jobs go through, for its load
+            latency_budget: Expected seconds above which the policy applies
+            default_policy: Policy of guilds without their own
+            guild_policies: Policy per guild ID
+        """
+        self.scheduler = scheduler
+        self.latency_budget = latency_budget
+        self.default_policy = self._check_policy(default_policy)
+        self.guild_policies: Dict[Hashable, str] = {}
+        for guild_id, policy in (guild_policies or {}).items():
+            self.set_policy(guild_id, policy)
+        self._latency: Dict[str, float] = {}
+
+    @classmethod
+    def from_config(cls, scheduler: JobScheduler) -> "AdmissionController":
+        """Build the controller from prometheus_config.py"""
+        return cls(
+            scheduler,
+            latency_budget=get_setting('PROMETHEUS_ADMISSION_LATENCY_BUDGET', DEFAULT_LATENCY_BUDGET),
+            default_policy=get_setting('PROMETHEUS_ADMISSION_POLICY', DEFAULT_POLICY),
+            guild_policies=get_setting('PROMETHEUS_GUILD_ADMISSION_POLICIES', {}),
+        )
+
+    @staticmethod
+    def _check_policy(policy: str) -> str:
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown admission policy {policy!r}, use one of: {', '.join(POLICIES)}")
+        return policy
+
+    def policy_for(self, guild_id: Hashable) -> str:
+        return self.guild_policies.get(guild_id, self.default_policy)
+
+    def set_policy(self, guild_id: Hashable, policy: Optional[str]) -> None:
+        """Set a guild's policy, None goes back to the default"""
+        if policy is None:
+            self.guild_policies.pop(guild_id, None)
+        else:
+            self.guild_policies[guild_id] = self._check_policy(policy)
+
+    def record(self, preset: str, seconds: float) -> None:
+        """Record how long an API call for the preset took"""
+        previous = self._latency.get(preset)
+        if previous is None:
+            self._latency[preset] = seconds
+        else:
+            self._latency[preset] = previous + LATENCY_ALPHA * (seconds - previous)
+
+    def latency(self, preset: str) -> float:
+        """Observed (or assumed) seconds one job with the preset takes"""
+        if preset in self._latency:
+            return self._latency[preset]
+        return PRIOR_LATENCY.get(preset, PRIOR_LATENCY['Medium'])
+
+    def estimate(self, preset: str) -> float:
+        """
+        Expected seconds until a job submitted now has its result
+
+        Waiting jobs are assumed to cost the average of the known presets and
+        to drain `concurrency` at a time.
+        """
+        scheduler = self.scheduler
+        wait = 0.0
+        if scheduler.running >= scheduler.concurrency:
+            known = list(self._latency.values()) or list(PRIOR_LATENCY.values())
+            average = sum(known) / len(known)
+            # Our job starts after everyone queued ahead plus one running job
+            wait = (scheduler.queued / scheduler.concurrency + 1) * average
+        return wait + self.latency(preset)
+
+    def decide(self, preset: str, guild_id: Hashable = None) -> AdmissionDecision:
+        """
+        Decide how to handle a job
+
+        Args:
+            preset: Requested preset
+            guild_id: Guild the job comes from, for its policy
+
+        Returns:
+            The decision; on 'reject' the job must not be submitted
+        """
+        estimate = self.estimate(preset)
+        if estimate <= self.latency_budget:
+            return AdmissionDecision('admit', preset, estimate, None)
+
+        policy = self.policy_for(guild_id)
+        if policy == 'downgrade' and preset in DOWNGRADES:
+            cheaper = DOWNGRADES[preset]
+            return AdmissionDecision(
+                'downgrade', cheaper, self.estimate(cheaper),
+                f"The obfuscator is busy, so **{preset}** was downgraded to **{cheaper}** to keep it fast"
+            )
+        if policy == 'reject':
+            return AdmissionDecision(
+                'reject', preset, estimate,
+                f"The obfuscator is busy (about {estimate:.0f}s wait), please try again shortly"
+            )
+        return AdmissionDecision('admit', preset, estimate, None)
@@ -0,0 +1,480 @@
+"""
+Asyncio client for the Prometheus Obfuscator API
+
+Both Discord bot integrations share this client. It owns one long-lived
+aiohttp session, so every command reuses pooled keep-alive connections
+instead of opening a new TCP connection (and never blocks the event loop
+the way `requests` does).
+
+Obfuscation calls use the raw transport of the API when it has one: the
+source goes out as the request body and the obfuscated code comes back as
+plain (possibly gzip/zstd compressed) bytes, so neither side builds or
+parses JSON. Against an older API (404 on /obfuscate-raw) the client falls
+back to the JSON endpoints and tries again after RAW_RETRY_INTERVAL.
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence, Union
+
+import aiohttp
+
+from .balancer import Endpoint, LoadBalancer
+from .cache import ResultCache, source_key
+from .fallback import FallbackEngine
+from .resilience import CircuitOpenError, ResiliencePolicy, TransientError
+from .singleflight import SingleFlight
+from .streaming import CHUNK_SIZE, JsonFieldStream, copy_file, spool_file
+
+# Connection pool defaults
+DEFAULT_POOL_SIZE = 20
+DEFAULT_KEEPALIVE_TIMEOUT = 60
+
+# Presets the API ships with, used when /presets cannot be reached
+FALLBACK_PRESETS = ["Weak", "Medium", "Strong", "Minify"]
+
+# Gateway errors from a proxy in front of the API are worth retrying
+RETRYABLE_STATUSES = (502, 503, 504)
+
+# Raw transport, see /obfuscate-raw in src/api.ts
+RAW_PATH = '/obfuscate-raw'
+PRESET_HEADER = 'X-Preset'
+# Seconds before an API that did not have the raw endpoint is asked again
+RAW_RETRY_INTERVAL = 300.0
+
+
+class AsyncPrometheusObfuscatorClient:
+    """Async client for the Prometheus Obfuscator API"""
+
+    def __init__(
+        self,
+        base_url: Union[str, Sequence[str]] = "http://localhost:3000",
+        pool_size: int = DEFAULT_POOL_SIZE,
+        keepalive_timeout: float = DEFAULT_KEEPALIVE_TIMEOUT,
+        cache: Optional[ResultCache] = None,
+        policy: Optional[ResiliencePolicy] = None,
+        balancer: Optional[LoadBalancer] = None,
+        fallback: Optional[FallbackEngine] = None,
+        raw_transport: bool = True,
+    ):
+        """
+        Initialize the client
+
+        The session is created lazily on first use so the client can be
+        constructed outside of a running event loop (e.g. at import time).
+
+        Args:
+            base_url: The base URL of the API server, or a list of URLs of
+                several API instances to balance requests across
+            pool_size: Maximum number of pooled connections per API instance
+            keepalive_timeout: Seconds an idle connection is kept open
+            cache: Result cache consulted before calling the API
+            policy: Retry/timeout/circuit breaker policy, loaded from
+                prometheus_config.py when omitted
+            balancer: Endpoint selection for several URLs, loaded from
+                prometheus_config.py when omitted
+            fallback: Local engine for Minify, and for Weak while the API
+                is unreachable (if the policy allows fallbacks)
+            raw_transport: Use /obfuscate-raw when the API has it
+        """
+        urls = [base_url] if isinstance(base_url, str) else list(base_url)
+        self.balancer = balancer or LoadBalancer.from_config(urls)
+        self.base_urls = [endpoint.url for endpoint in self.balancer.endpoints]
+        self.base_url = self.base_urls[0]
+        self.pool_size = pool_size
+        self.keepalive_timeout = keepalive_timeout
+        self.cache = cache
+        self.policy = policy or ResiliencePolicy.from_config()
+        self.fallback = fallback
+        # Identical (source, preset) requests in flight share one API call
+        self.inflight = SingleFlight()
+        self.raw_transport = raw_transport
+        self._raw_unsupported_at: Optional[float] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> "AsyncPrometheusObfuscatorClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """The shared session, created on first access"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size * len(self.base_urls),
+                limit_per_host=self.pool_size,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self) -> None:
+        """Close the shared session and its pooled connections"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        if self.fallback is not None:
+            self.fallback.close()
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        build_form: Optional[Callable[[], aiohttp.FormData]] = None,
+        stream_key: Optional[str] = None,
+        raw_response: bool = False,
+        pinned: Optional[Endpoint] = None,
+        **kwargs,
+    ) -> Dict[str, Any]:
+        """
+        Send a request under the resilience policy and decode the JSON response or error
+
+        With pinned, every attempt goes to that instance and the balancer
+        neither picks it nor records the outcome (for health probes).
+
+        With stream_key, the string member of that name in a successful
+        response is decoded chunk by chunk into a spool file, returned as
+        'file' (positioned at 0) together with its 'size' in bytes. With
+        raw_response, a successful response body is returned the same way,
+        and a 404/405 is flagged 'raw_unsupported'.
+        """
+
+        async def attempt(timeout: float) -> Dict[str, Any]:
+            if build_form is not None:
+                # Multipart bodies cannot be replayed, so build one per attempt
+                kwargs['data'] = build_form()
+            # Each attempt picks an endpoint, so a retry can land on another instance
+            endpoint = pinned if pinned is not None else self.balancer.pick()
+            started = time.monotonic()
+            ok = False
+            try:
+                async with self.session.request(
+                    method, f"{endpoint.url}{path}", timeout=aiohttp.ClientTimeout(total=timeout), **kwargs
+                ) as response:
+                    if response.status in RETRYABLE_STATUSES:
+                        raise TransientError(
+                            f"API returned status {response.status}",
+                            trips_breaker=not self.balancer.has_alternative(endpoint)
+                        )
+                    if stream_key is not None and response.status == 200:
+                        data = await self._read_streamed(response, stream_key)
+                        ok = True
+                        return data
+                    if raw_response and response.status == 200:
+                        data = await self._read_raw(response)
+                        ok = True
+                        return data
+                    try:
+                        data = await response.json(content_type=None)
+                    except ValueError:
+                        data = {}
+                    ok = True
+                    if response.status != 200:
+                        error = {"error": data.get('error', f"API returned status {response.status}")}
+                        if raw_response and response.status in (404, 405):
+                            error['raw_unsupported'] = True
+                        return error
+                    return data
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # One dead instance should not open the circuit for all of them
+                raise TransientError(
+                    str(e) or e.__class__.__name__,
+                    trips_breaker=not self.balancer.has_alternative(endpoint)
+                ) from e
+            finally:
+                if pinned is None:
+                    self.balancer.release(endpoint, time.monotonic() - started, ok)
+
+        try:
+            return await self.policy.call(path, attempt)
+        except (TransientError, CircuitOpenError) as e:
+            # 'unavailable' tells callers the API was not reached at all
+            return {"error": str(e), "unavailable": True}
+
+    async def _read_streamed(self, response: aiohttp.ClientResponse, stream_key: str) -> Dict[str, Any]:
+        """Parse a JSON response, decoding stream_key straight into a spool file"""
+        sink = spool_file()
+        parser = JsonFieldStream(stream_key, sink)
+        try:
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                parser.feed(chunk)
+            data = parser.close()
+        except ValueError as e:
+            sink.close()
+            return {"error": f"Invalid API response: {e}"}
+        if not parser.found:
+            sink.close()
+            return {"error": f"API response has no {stream_key}"}
+        sink.seek(0)
+        data['file'] = sink
+        data['size'] = parser.streamed_bytes
+        return data
+
+    async def _read_raw(self, response: aiohttp.ClientResponse) -> Dict[str, Any]:
+        """Copy a raw response body (already decompressed by aiohttp) into a spool file"""
+        sink = spool_file()
+        size = 0
+        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+            size += sink.write(chunk)
+        sink.seek(0)
+        return {'success': True, 'preset': response.headers.get(PRESET_HEADER), 'file': sink, 'size': size}
+
+    async def _send_raw(
+        self,
+        data: bytes,
+        preset: str,
+        send_json: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> Dict[str, Any]:
+        """
+        Send the source to /obfuscate-raw, or with send_json if the API does not have it
+
+        Returns:
+            The result, with 'file' and 'size' if the raw transport was used
+        """
+        if self.raw_transport and (self._raw_unsupported_at is None
+                                   or time.monotonic() - self._raw_unsupported_at >= RAW_RETRY_INTERVAL):
+            result = await self._request(
+                'POST',
+                RAW_PATH,
+                raw_response=True,
+                data=data,
+                headers={'Content-Type': 'application/octet-stream', PRESET_HEADER: preset}
+            )
+            if not result.get('raw_unsupported'):
+                self._raw_unsupported_at = None
+                return result
+            self._raw_unsupported_at = time.monotonic()
+        return await send_json()
+
+    async def health_check(self, endpoint: Optional[Endpoint] = None) -> Dict[str, Any]:
+        """
+        Check if the API server is running
+
+        Args:
+            endpoint: Instance to check (one of balancer.endpoints); by
+                default the balancer picks one like for any request
+
+        Returns:
+            Dict containing health status
+        """
+        return await self._request('GET', '/health', pinned=endpoint)
+
+    async def get_presets(self) -> Dict[str, Any]:
+        """
+        Get available obfuscation presets
+
+        Returns:
+            Dict containing available presets
+        """
+        result = await self._request('GET', '/presets')
+        if "error" in result and self.policy.fallback_enabled:
+            return {'presets': list(FALLBACK_PRESETS), 'fallback': True}
+        return result
+
+    async def obfuscate_code(self, lua_code: str, preset: str = "Medium") -> Dict[str, Any]:
+        """
+        Obfuscate Lua code directly
+
+        Args:
+            lua_code: The Lua code to obfuscate
+            preset: Obfuscation preset ("Weak", "Medium", "Strong", "Minify")
+
+        Returns:
+            Dict containing obfuscated code or error
+        """
+        data = {
+            'code': lua_code,
+            'preset': preset
+        }
+        async def send() -> Dict[str, Any]:
+            return _file_to_text(await self._send_raw(
+                lua_code.encode('utf-8'),
+                preset,
+                lambda: self._request('POST', '/obfuscate-text', json=data)
+            ))
+
+        return await self._obfuscate(source_key(lua_code, preset), preset, lua_code, send)
+
+    async def _obfuscate(
+        self,
+        key: str,
+        preset: str,
+        source: Union[str, bytes],
+        send: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> Dict[str, Any]:
+        """Serve from the cache, join an identical in-flight call, or call the API"""
+        if self.cache is not None:
+            cached = await self._cache_get(key)
+            if cached is not None:
+                return {'success': True, 'preset': preset, 'obfuscatedCode': cached, 'cached': True}
+
+        async def call() -> Dict[str, Any]:
+            result = await self._send_or_fallback(preset, source, send)
+            if self.cache is not None and "error" not in result:
+                await self._cache_put(key, result['obfuscatedCode'])
+            return result
+
+        # Every caller gets its own copy of the shared result
+        return dict(await self.inflight.do(key, call))
+
+    async def _send_or_fallback(
+        self,
+        preset: str,
+        source: Union[str, bytes],
+        send: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> Dict[str, Any]:
+        """Obfuscate locally for Minify, call the API otherwise and fall back if it is unreachable"""
+        if self.fallback is not None and self.fallback.runs_locally(preset):
+            return await self.fallback.obfuscate(source, preset)
+        result = await send()
+        if (result.get('unavailable') and self.fallback is not None
+                and self.policy.fallback_enabled and self.fallback.supports(preset)):
+            return await self.fallback.obfuscate(source, preset)
+        return result
+
+    async def _cache_get(self, key: str) -> Optional[str]:
+        """Memory lookups run inline, disk lookups in a worker thread"""
+        if not self.cache.has_disk:
+            return self.cache.get(key)
+        cached = self.cache.get_memory(key)
+        if cached is not None:
+            return cached
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.cache.get, key)
+
+    async def _cache_put(self, key: str, value: str) -> None:
+        if not self.cache.has_disk:
+            self.cache.put(key, value)
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.cache.put, key, value)
+
+    async def obfuscate_file(self, file_path: str, preset: str = "Medium") -> Dict[str, Any]:
+        """
+        Obfuscate a Lua file
+
+        Args:
+            file_path: Path to the .lua file to obfuscate
+            preset: Obfuscation preset ("Weak", "Medium", "Strong", "Minify")
+
+        Returns:
+            Dict containing obfuscated code or error
+        """
+        if not os.path.exists(file_path):
+            return {"error": f"File not found: {file_path}"}
+
+        if not file_path.lower().endswith('.lua'):
+            return {"error": "File must have .lua extension"}
+
+        loop = asyncio.get_running_loop()
+        content = await loop.run_in_executor(None, _read_bytes, file_path)
+        filename = os.path.basename(file_path)
+
+        def build_form() -> aiohttp.FormData:
+            form = aiohttp.FormData()
+            form.add_field('file', content, filename=filename, content_type='text/plain')
+            form.add_field('preset', preset)
+            return form
+
+        async def send() -> Dict[str, Any]:
+            return _file_to_text(await self._send_raw(
+                content,
+                preset,
+                lambda: self._request('POST', '/obfuscate', build_form=build_form)
+            ))
+
+        result = await self._obfuscate(source_key(content, preset), preset, content, send)
+        if "error" not in result:
+            result['originalFilename'] = filename
+        return result
+
+    async def obfuscate_stream(self, data: bytes, filename: str, preset: str = "Medium") -> Dict[str, Any]:
+        """
+        Obfuscate an uploaded file without building the result in memory
+
+        The source bytes are sent as-is and the obfuscated code is copied
+        (raw transport) or decoded from the JSON response (/obfuscate) chunk
+        by chunk into a temporary file.
+
+        Args:
+            data: The Lua source as UTF-8 bytes
+            filename: Original file name (must end with .lua)
+            preset: Obfuscation preset ("Weak", "Medium", "Strong", "Minify")
+
+        Returns:
+            Dict with 'file' (a binary file positioned at 0; close it when
+            done) and its 'size' in bytes, or an error
+        """
+        key = source_key(data, preset)
+        if self.cache is not None:
+            cached = await self._cache_get(key)
+            if cached is not None:
+                out = spool_file()
+                size = out.write(cached.encode('utf-8'))
+                out.seek(0)
+                return {
+                    'success': True,
+                    'preset': preset,
+                    'originalFilename': filename,
+                    'file': out,
+                    'size': size,
+                    'cached': True,
+                }
+
+        def build_form() -> aiohttp.FormData:
+            form = aiohttp.FormData()
+            form.add_field('file', data, filename=filename, content_type='text/plain')
+            form.add_field('preset', preset)
+            return form
+
+        async def call() -> Dict[str, Any]:
+            result = await self._send_or_fallback(
+                preset,
+                data,
+                lambda: self._send_raw(
+                    data,
+                    preset,
+                    lambda: self._request('POST', '/obfuscate', build_form=build_form, stream_key='obfuscatedCode')
+                )
+            )
+            if "error" in result:
+                return result
+            if 'file' not in result:
+                # Produced locally as text
+                code = result.pop('obfuscatedCode')
+                result['file'] = spool_file()
+                result['size'] = result['file'].write(code.encode('utf-8'))
+                result['file'].seek(0)
+                if self.cache is not None:
+                    await self._cache_put(key, code)
+            elif self.cache is not None:
+                # The cache keeps its own copy of the text
+                await self._cache_put(key, result['file'].read().decode('utf-8', 'replace'))
+            return result
+
+        shared = await self.inflight.do(('stream', key), call)
+        if "error" in shared:
+            return dict(shared)
+        # Coalesced callers share one spool file; everyone gets a private copy
+        result = dict(shared)
+        result['file'] = copy_file(shared['file'])
+        result['originalFilename'] = filename
+        return result
+
+
+def _file_to_text(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn a raw transport result into the 'obfuscatedCode' shape of the JSON endpoints"""
+    sink = result.pop('file', None)
+    if sink is not None:
+        with sink:
+            result['obfuscatedCode'] = sink.read().decode('utf-8', 'replace')
+        del result['size']
+    return result
+
+
+def _read_bytes(file_path: str) -> bytes:
+    with open(file_path, 'rb') as f:
+        return f.read()
@@ -0,0 +1,120 @@
+"""
+Pre-flight checks for Lua sources before they are sent to the API
+
+Catches the failures the obfuscator would only report after a full round
+trip (unterminated strings and comments, malformed numbers, unbalanced
+blocks) and estimates how expensive a job is from its token count, so the
+scheduler can keep big Strong jobs from taking every worker slot.
+
+The check is deliberately shallow: it only looks at block keywords, so
+Luau syntax the full parser in fallback.py does not know (type
+annotations, generics) is not rejected here.
+"""
+
+from typing import List, NamedTuple, Optional, Tuple, Union
+
+from .config import get_setting
+from .lua_lexer import LuaSyntaxError, Token, tokenize
+
+# Defaults, overridable from prometheus_config.py
+DEFAULT_HEAVY_COST = 30000
+
+# Relative work per token for each preset, Strong output is ~100x the input
+PRESET_COST = {
+    'Minify': 0.1,
+    'Weak': 1,
+    'Medium': 4,
+    'Strong': 12,
+}
+
+# Tokens after which `if` starts a Luau if-then-else expression, not a statement
+_EXPRESSION_OPS = frozenset({
+    '=', '(', ',', '{', '[', '+', '-', '*', '/', '//', '%', '^', '..', '==', '~=', '<', '<=',
+    '>', '>=', '#', '&', '|', '~', '<<', '>>', '+=', '-=', '*=', '/=', '//=', '%=', '^=', '..=',
+})
+_EXPRESSION_KEYWORDS = frozenset({'return', 'and', 'or', 'not', 'in'})
+
+
+class SourceReport(NamedTuple):
+    """Result of a pre-flight check"""
+
+    ok: bool
+    error: Optional[str]  # human readable, with the line number
+    tokens: int
+    lines: int
+    cost: float  # tokens weighted by preset
+    heavy: bool
+
+
+def check_blocks(tokens: List[Token]) -> None:
+    """
+    Check that every block opener has its `end` (or `until`)
+
+    Raises:
+        LuaSyntaxError: On a missing or unexpected `end`/`until`
+    """
+    stack: List[Tuple[str, int]] = []
+    previous: Optional[Token] = None
+    for token in tokens:
+        if token.kind == 'keyword':
+            word = token.text
+            if word in ('function', 'do', 'repeat'):
+                stack.append((word, token.line))
+            elif word == 'if' and not _starts_expression(previous):
+                stack.append((word, token.line))
+            elif word in ('end', 'until'):
+                expected = 'until' if word == 'until' else 'end'
+                if not stack:
+                    raise LuaSyntaxError(f"unexpected '{word}'", token.line)
+                opener, line = stack.pop()
+                if (opener == 'repeat') != (expected == 'until'):
+                    closer = 'until' if opener == 'repeat' else 'end'
+                    raise LuaSyntaxError(f"'{closer}' expected (to close '{opener}' at line {line}) near '{word}'",
+                                         token.line)
+        previous = token
+    if stack:
+        opener, line = stack[-1]
+        closer = 'until' if opener == 'repeat' else 'end'
+        raise LuaSyntaxError(f"'{closer}' expected (to close '{opener}' at line {line}) near <eof>",
+                             tokens[-1].line)
+
+
+def _starts_expression(previous: Optional[Token]) -> bool:
+    if previous is None:
+        return False
+    if previous.kind == 'op':
+        return previous.text in _EXPRESSION_OPS
+    return previous.kind == 'keyword' and previous.text in _EXPRESSION_KEYWORDS
+
+
+def preflight(source: Union[str, bytes], preset: str, heavy_cost: Optional[float] = None) -> SourceReport:
+    """
+    Check a source and estimate its cost
+
+    Args:
+        source: Lua source, bytes must be UTF-8
+        preset: Preset the job will use, for the cost estimate
+        heavy_cost: Cost from which a job counts as heavy
+            (PROMETHEUS_HEAVY_JOB_COST when omitted)
+
+    Returns:
+        The report; ok is False if the API would certainly reject the source
+    """
+    if heavy_cost is None:
+        heavy_cost = get_setting('PROMETHEUS_HEAVY_JOB_COST', DEFAULT_HEAVY_COST)
+    if isinstance(source, bytes):
+        source = source.decode('utf-8')
+    lines = source.count('\n') + 1
+
+    try:
+        tokens = tokenize(source)
+        check_blocks(tokens)
+    except LuaSyntaxError as e:
+        return SourceReport(ok=False, error=str(e), tokens=0, lines=lines, cost=0.0, heavy=False)
+
+    count = len(tokens) - 1  # without eof
+    if count == 0:
+        return SourceReport(ok=False, error="The file contains no Lua code", tokens=0, lines=lines,
+                            cost=0.0, heavy=False)
+    cost = count * PRESET_COST.get(preset, PRESET_COST['Medium'])
+    return SourceReport(ok=True, error=None, tokens=count, lines=lines, cost=cost, heavy=cost >= heavy_cost)
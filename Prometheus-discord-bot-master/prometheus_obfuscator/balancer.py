@@ -0,0 +1,183 @@
+"""
+Client-side load balancing across several Prometheus API instances
+
+Each request picks an endpoint with a pluggable strategy:
+
+- round_robin: endpoints take turns
+- least_outstanding: the endpoint with the fewest requests in flight
+- latency_weighted: random choice weighted by inverse observed latency
+
+Endpoints that fail several times in a row are ejected for a while and then
+get another chance; a failure right after that ejects them again.
+"""
+
+import itertools
+import random
+import time
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+from .config import get_setting
+
+# Defaults, overridable from prometheus_config.py
+DEFAULT_STRATEGY = 'round_robin'
+DEFAULT_EJECT_AFTER = 3
+DEFAULT_EJECT_DURATION = 30.0
+
+# Weight of the newest sample in the latency moving average
+LATENCY_ALPHA = 0.3
+
+
+class Endpoint:
+    """One API instance and its observed health"""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip('/')
+        self.outstanding = 0
+        self.latency: Optional[float] = None  # moving average in seconds
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    def available(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'url': self.url,
+            'outstanding': self.outstanding,
+            'latency_ms': None if self.latency is None else self.latency * 1000,
+            'requests': self.requests,
+            'failures': self.failures,
+            'ejected': not self.available(time.monotonic()),
+        }
+
+
+class BalancingStrategy:
+    """Picks one endpoint out of the available ones"""
+
+    def choose(self, endpoints: List[Endpoint]) -> Endpoint:
+        raise NotImplementedError
+
+
+class RoundRobinStrategy(BalancingStrategy):
+    def __init__(self):
+        self._counter = itertools.count()
+
+    def choose(self, endpoints: List[Endpoint]) -> Endpoint:
+        return endpoints[next(self._counter) % len(endpoints)]
+
+
+class LeastOutstandingStrategy(BalancingStrategy):
+    def choose(self, endpoints: List[Endpoint]) -> Endpoint:
+        fewest = min(endpoint.outstanding for endpoint in endpoints)
+        return random.choice([endpoint for endpoint in endpoints if endpoint.outstanding == fewest])
+
+
+class LatencyWeightedStrategy(BalancingStrategy):
+    def choose(self, endpoints: List[Endpoint]) -> Endpoint:
+        # Endpoints without samples yet get picked so they can be measured
+        unmeasured = [endpoint for endpoint in endpoints if endpoint.latency is None]
+        if unmeasured:
+            return random.choice(unmeasured)
+        weights = [1.0 / (max(endpoint.latency, 1e-3) * (endpoint.outstanding + 1)) for endpoint in endpoints]
+        return random.choices(endpoints, weights=weights)[0]
+
+
+STRATEGIES = {
+    'round_robin': RoundRobinStrategy,
+    'least_outstanding': LeastOutstandingStrategy,
+    'latency_weighted': LatencyWeightedStrategy,
+}
+
+
+class LoadBalancer:
+    """Tracks a set of endpoints and picks one per request"""
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        strategy: Union[str, BalancingStrategy] = DEFAULT_STRATEGY,
+        eject_after: int = DEFAULT_EJECT_AFTER,
+        eject_duration: float = DEFAULT_EJECT_DURATION,
+    ):
+        """
+        Initialize the balancer
+
+        Args:
+            urls: Base URLs of the API instances
+            strategy: Strategy name from STRATEGIES or a BalancingStrategy
+            eject_after: Consecutive failures before an endpoint is ejected
+            eject_duration: Seconds an ejected endpoint is skipped
+        """
+        if not urls:
+            raise ValueError("At least one API URL is required")
+        if isinstance(strategy, str):
+            if strategy not in STRATEGIES:
+                raise ValueError(f"Unknown strategy {strategy!r}, use one of: {', '.join(STRATEGIES)}")
+            strategy = STRATEGIES[strategy]()
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.strategy = strategy
+        self.eject_after = eject_after
+        self.eject_duration = eject_duration
+
+    @classmethod
+    def from_config(cls, urls: Sequence[str]) -> "LoadBalancer":
+        """Build the balancer from prometheus_config.py"""
+        return cls(
+            urls,
+            strategy=get_setting('PROMETHEUS_LB_STRATEGY', DEFAULT_STRATEGY),
+            eject_after=get_setting('PROMETHEUS_LB_EJECT_AFTER', DEFAULT_EJECT_AFTER),
+            eject_duration=get_setting('PROMETHEUS_LB_EJECT_DURATION', DEFAULT_EJECT_DURATION),
+        )
+
+    def pick(self) -> Endpoint:
+        """
+        Choose an endpoint for the next request and count it as in flight
+
+        If every endpoint is ejected, the one returning soonest is used so
+        requests still have a chance to succeed.
+
+        Returns:
+            The chosen endpoint; pass it to release() when the request ends
+        """
+        now = time.monotonic()
+        available = [endpoint for endpoint in self.endpoints if endpoint.available(now)]
+        if available:
+            endpoint = available[0] if len(available) == 1 else self.strategy.choose(available)
+        else:
+            endpoint = min(self.endpoints, key=lambda e: e.ejected_until)
+        endpoint.outstanding += 1
+        endpoint.requests += 1
+        return endpoint
+
+    def release(self, endpoint: Endpoint, latency: float, ok: bool) -> None:
+        """
+        Record the outcome of a request
+
+        Args:
+            endpoint: Endpoint returned by pick()
+            latency: Seconds the request took
+            ok: False for connection errors, timeouts and gateway errors
+        """
+        endpoint.outstanding -= 1
+        if ok:
+            endpoint.consecutive_failures = 0
+            if endpoint.latency is None:
+                endpoint.latency = latency
+            else:
+                endpoint.latency += LATENCY_ALPHA * (latency - endpoint.latency)
+        else:
+            endpoint.failures += 1
+            endpoint.consecutive_failures += 1
+            if endpoint.consecutive_failures >= self.eject_after:
+                endpoint.ejected_until = time.monotonic() + self.eject_duration
+
+    def has_alternative(self, endpoint: Endpoint) -> bool:
+        """Whether another, non-ejected endpoint could serve a retry"""
+        now = time.monotonic()
+        return any(other is not endpoint and other.available(now) for other in self.endpoints)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Per-endpoint counters and health"""
+        return [endpoint.stats() for endpoint in self.endpoints]
@@ -0,0 +1,214 @@
+"""
+Batch obfuscation of several files and .zip archives
+
+Every attachment of a message (and every .lua file inside attached .zip
+archives) is obfuscated with bounded parallelism. The results come back as
+one zip file with a manifest.json describing the status of each file.
+"""
+
+import asyncio
+import io
+import json
+import posixpath
+import shutil
+import zipfile
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+
+from .aio import AsyncPrometheusObfuscatorClient
+from .analysis import preflight
+from .config import get_setting
+from .streaming import CHUNK_SIZE, spool_file, validate_utf8
+
+# Defaults, overridable from prometheus_config.py
+DEFAULT_CONCURRENCY = 2
+DEFAULT_MAX_FILES = 50
+MAX_FILE_SIZE = 40000  # the API rejects larger sources anyway
+MAX_ARCHIVE_SIZE = 8 * 1024 * 1024
+
+
+class BatchFile:
+    """One source file of a batch and, once processed, its outcome"""
+
+    def __init__(self, name: str, data: Optional[bytes], error: Optional[str] = None):
+        self.name = name
+        self.data = data
+        self.error = error
+        self.output: Optional[BinaryIO] = None
+        self.output_size = 0
+        self.cached = False
+        self.sent = False  # passed the local checks and went to the API
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.output is not None
+
+    def manifest_entry(self) -> Dict[str, Any]:
+        entry = {
+            'file': self.name,
+            'status': 'ok' if self.ok else 'failed',
+            'input_bytes': len(self.data) if self.data is not None else None,
+        }
+        if self.ok:
+            entry['output_bytes'] = self.output_size
+            entry['cached'] = self.cached
+        else:
+            entry['error'] = self.error
+        return entry
+
+
+def _safe_name(name: str) -> str:
+    """Archive member name without absolute paths or parent references"""
+    parts = [part for part in posixpath.normpath(name.replace('\\', '/')).split('/') if part not in ('', '.', '..')]
+    return '/'.join(parts)
+
+
+def collect_sources(attachments: List[Tuple[str, Optional[bytes]]], max_files: Optional[int] = None) -> List[BatchFile]:
+    """
+    Expand attachments into the list of Lua files to obfuscate
+
+    Args:
+        attachments: (filename, content) pairs; .zip archives are unpacked,
+            content None marks an attachment too large to download
+        max_files: Files accepted per batch, the rest are reported as skipped
+            (PROMETHEUS_BATCH_MAX_FILES when omitted)
+
+    Returns:
+        BatchFile entries; entries with an error are reported but not sent
+    """
+    if max_files is None:
+        max_files = get_setting('PROMETHEUS_BATCH_MAX_FILES', DEFAULT_MAX_FILES)
+    files: List[BatchFile] = []
+    names = set()
+    accepted = 0
+
+    def add(name: str, data: Optional[bytes], error: Optional[str] = None) -> None:
+        nonlocal accepted
+        # Keep names unique so outputs do not overwrite each other in the zip
+        stem, ext = posixpath.splitext(name)
+        counter = 2
+        while name in names:
+            name = f"{stem}_{counter}{ext}"
+            counter += 1
+        names.add(name)
+        if error is None:
+            if accepted >= max_files:
+                error = f"Skipped, a batch holds at most {max_files} files"
+            else:
+                accepted += 1
+        files.append(BatchFile(name, data, error))
+
+    for filename, content in attachments:
+        lower = filename.lower()
+        if content is None:
+            add(filename, None, "File is too large")
+        elif lower.endswith('.lua'):
+            if len(content) > MAX_FILE_SIZE:
+                add(filename, None, "File size must be under 40KB")
+            else:
+                add(filename, content)
+        elif lower.endswith('.zip'):
+            _collect_archive(filename, content, add)
+        else:
+            add(filename, None, "Not a .lua or .zip file")
+    return files
+
+
+def _collect_archive(filename: str, content: bytes, add) -> None:
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(content))
+    except zipfile.BadZipFile:
+        add(filename, None, "Not a valid zip archive")
+        return
+
+    with archive:
+        for info in archive.infolist():
+            if info.is_dir() or not info.filename.lower().endswith('.lua'):
+                continue
+            name = f"{filename[:-4]}/{_safe_name(info.filename)}"
+            # Check the declared size before inflating anything
+            if info.file_size > MAX_FILE_SIZE:
+                add(name, None, "File size must be under 40KB")
+                continue
+            with archive.open(info) as member:
+                data = member.read(MAX_FILE_SIZE + 1)
+            if len(data) > MAX_FILE_SIZE:
+                add(name, None, "File size must be under 40KB")
+            else:
+                add(name, data)
+
+
+async def run_batch(
+    client: AsyncPrometheusObfuscatorClient,
+    files: List[BatchFile],
+    preset: str,
+    concurrency: Optional[int] = None,
+) -> List[BatchFile]:
+    """
+    Obfuscate every valid file of a batch
+
+    Args:
+        client: Client used for the API calls
+        files: Files from collect_sources()
+        preset: Obfuscation preset for all files
+        concurrency: Files sent to the API at the same time
+            (PROMETHEUS_BATCH_CONCURRENCY when omitted)
+
+    Returns:
+        The same list, with outputs or errors filled in
+    """
+    if concurrency is None:
+        concurrency = get_setting('PROMETHEUS_BATCH_CONCURRENCY', DEFAULT_CONCURRENCY)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def process(batch_file: BatchFile) -> None:
+        try:
+            validate_utf8(batch_file.data)
+        except UnicodeDecodeError:
+            batch_file.error = "Not a valid UTF-8 text file"
+            return
+        report = preflight(batch_file.data, preset)
+        if not report.ok:
+            batch_file.error = f"Lua syntax error, {report.error}"
+            return
+        batch_file.sent = True
+        async with semaphore:
+            result = await client.obfuscate_stream(batch_file.data, posixpath.basename(batch_file.name), preset)
+        if "error" in result:
+            batch_file.error = result['error']
+        else:
+            batch_file.output = result['file']
+            batch_file.output_size = result['size']
+            batch_file.cached = result.get('cached', False)
+
+    await asyncio.gather(*(process(f) for f in files if f.error is None))
+    return files
+
+
+def build_result_zip(files: List[BatchFile], preset: str) -> BinaryIO:
+    """
+    Pack the outputs and a manifest.json into one zip file
+
+    Outputs are copied from their spool files chunk by chunk and closed.
+
+    Returns:
+        A binary file positioned at 0 holding the zip archive
+    """
+    out = spool_file()
+    with zipfile.ZipFile(out, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for batch_file in files:
+            if not batch_file.ok:
+                continue
+            name = posixpath.join(posixpath.dirname(batch_file.name), f"obfuscated_{posixpath.basename(batch_file.name)}")
+            with batch_file.output, archive.open(name, 'w') as member:
+                shutil.copyfileobj(batch_file.output, member, CHUNK_SIZE)
+
+        manifest = {
+            'preset': preset,
+            'succeeded': sum(1 for f in files if f.ok),
+            'failed': sum(1 for f in files if not f.ok),
+            'files': [f.manifest_entry() for f in files],
+        }
+        archive.writestr('manifest.json', json.dumps(manifest, indent=2))
+    out.seek(0)
+    return out
+
@@ -0,0 +1,214 @@
+"""
+Content-addressed cache for obfuscation results
+
+Results are keyed by a hash of the normalized Lua source plus the preset, so
+re-uploading the same script with the same preset never reaches the API.
+There are two tiers:
+
+- an in-memory LRU bounded by total bytes
+- an optional SQLite file on disk with TTL eviction
+"""
+
+import hashlib
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple, Union
+
+from .config import get_setting
+
+# Defaults, overridable from prometheus_config.py
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024  # 64MB of cached output in memory
+DEFAULT_TTL = 24 * 60 * 60  # 1 day on disk
+
+_UTF8_BOM = b'\xef\xbb\xbf'
+_TRAILING_WHITESPACE = b' \t\n\r\x0b\x0c'
+
+
+def normalize_source(lua_code: Union[str, bytes]) -> bytes:
+    """Normalize line endings, BOM and trailing whitespace of a Lua source"""
+    data = lua_code.encode('utf-8', 'surrogatepass') if isinstance(lua_code, str) else lua_code
+    if data.startswith(_UTF8_BOM):
+        data = data[len(_UTF8_BOM):]
+    return data.replace(b'\r\n', b'\n').replace(b'\r', b'\n').rstrip(_TRAILING_WHITESPACE)
+
+
+def source_key(lua_code: Union[str, bytes], preset: str) -> str:
+    """
+    Build the cache key for a source/preset pair
+
+    Text and its UTF-8 encoded bytes produce the same key.
+
+    Args:
+        lua_code: The Lua code to obfuscate, as text or UTF-8 bytes
+        preset: Obfuscation preset
+
+    Returns:
+        Hex digest identifying the (normalized source, preset) pair
+    """
+    digest = hashlib.sha256(preset.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(normalize_source(lua_code))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Two-tier (memory LRU + optional SQLite) cache of obfuscated code"""
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        disk_path: Optional[str] = None,
+        ttl: float = DEFAULT_TTL,
+    ):
+        """
+        Initialize the cache
+
+        Args:
+            max_bytes: Memory budget for cached results
+            disk_path: SQLite file for the disk tier, or None for memory only
+            ttl: Seconds a disk entry stays valid
+        """
+        self.max_bytes = max_bytes
+        self.disk_path = disk_path
+        self.ttl = ttl
+
+        self._memory: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if disk_path:
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)'
+            )
+            self._db.execute('CREATE INDEX IF NOT EXISTS results_expires ON results (expires)')
+            self._db.commit()
+
+    @classmethod
+    def from_config(cls) -> Optional["ResultCache"]:
+        """Build the cache from prometheus_config.py, or None if disabled"""
+        if not get_setting('PROMETHEUS_RESULT_CACHE_ENABLED', True):
+            return None
+        return cls(
+            max_bytes=get_setting('PROMETHEUS_RESULT_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES),
+            disk_path=get_setting('PROMETHEUS_RESULT_CACHE_PATH', None),
+            ttl=get_setting('PROMETHEUS_RESULT_CACHE_TTL', DEFAULT_TTL),
+        )
+
+    @property
+    def has_disk(self) -> bool:
+        """Whether lookups may touch the disk tier"""
+        return self._db is not None
+
+    def get_memory(self, key: str) -> Optional[str]:
+        """Look a key up in the memory tier only (never blocks on I/O)"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return entry[0]
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look a key up in memory, then on disk
+
+        Disk hits are promoted into the memory tier.
+
+        Args:
+            key: Key from source_key()
+
+        Returns:
+            The cached obfuscated code, or None on a miss
+        """
+        value = self.get_memory(key)
+        if value is not None:
+            return value
+
+        if self._db is not None:
+            with self._lock:
+                row = self._db.execute(
+                    'SELECT value FROM results WHERE key = ? AND expires > ?',
+                    (key, time.time()),
+                ).fetchone()
+            if row is not None:
+                self._put_memory(key, row[0])
+                with self._lock:
+                    self.disk_hits += 1
+                return row[0]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: str) -> None:
+        """
+        Store a result in every enabled tier
+
+        Args:
+            key: Key from source_key()
+            value: The obfuscated code
+        """
+        self._put_memory(key, value)
+
+        if self._db is not None:
+            now = time.time()
+            with self._lock:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO results (key, value, expires) VALUES (?, ?, ?)',
+                    (key, value, now + self.ttl),
+                )
+                self._db.execute('DELETE FROM results WHERE expires <= ?', (now,))
+                self._db.commit()
+
+    def _put_memory(self, key: str, value: str) -> None:
+        size = sys.getsizeof(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_bytes -= old[1]
+            self._memory[key] = (value, size)
+            self._memory_bytes += size
+
+            while self._memory_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted_size
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get hit/miss counters
+
+        Returns:
+            Dict with hit, miss and eviction counts and memory usage
+        """
+        with self._lock:
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+            }
+
+    def close(self) -> None:
+        """Close the disk tier"""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
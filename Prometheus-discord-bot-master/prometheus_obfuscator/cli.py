@@ -0,0 +1,182 @@
+"""
+Command-line bulk obfuscator
+
+    python -m prometheus_obfuscator obfuscate SRC_DIR -o OUT_DIR [--preset Strong] [-j 8]
+
+Every .lua file under SRC_DIR is obfuscated into the same relative path
+under OUT_DIR, in parallel over the pooled connections of the sync client.
+A manifest in OUT_DIR records the source hash and preset of every file
+written, so the next run skips files that did not change and a build only
+pays for what was edited.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .cache import source_key
+from .config import get_api_urls, get_setting
+from .sync import DEFAULT_POOL_SIZE, PrometheusObfuscatorClient
+
+MANIFEST_NAME = '.prometheus-manifest.json'
+MANIFEST_VERSION = 1
+
+
+def find_sources(src_dir: str, skip_dir: Optional[str] = None) -> Iterator[str]:
+    """
+    Walk a tree for .lua files, in a stable order
+
+    Args:
+        src_dir: Directory to walk
+        skip_dir: Directory not to descend into (e.g. an output directory
+            inside the source tree)
+
+    Yields:
+        Paths relative to src_dir, with forward slashes
+    """
+    skip = os.path.realpath(skip_dir) if skip_dir else None
+    for root, dirs, files in os.walk(src_dir):
+        dirs[:] = sorted(name for name in dirs if os.path.realpath(os.path.join(root, name)) != skip)
+        for name in sorted(files):
+            if name.lower().endswith('.lua'):
+                yield os.path.relpath(os.path.join(root, name), src_dir).replace(os.sep, '/')
+
+
+def load_manifest(path: str) -> Dict[str, str]:
+    """Relative path -> source key of the last successful run, empty if missing or unreadable"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get('version') != MANIFEST_VERSION:
+        return {}
+    return dict(data.get('files', {}))
+
+
+def save_manifest(path: str, files: Dict[str, str]) -> None:
+    """Write the manifest atomically, so an interrupted run never leaves it half-written"""
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(prefix='.manifest-', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'files': dict(sorted(files.items()))}, f, indent=1)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def plan(src_dir: str, out_dir: str, preset: str, manifest: Dict[str, str],
+         force: bool = False) -> Tuple[List[Tuple[str, str]], List[str]]:
+    """
+    Split the sources into files to obfuscate and unchanged files
+
+    Returns:
+        ([(relative path, source key)] to obfuscate, [relative paths] to skip)
+    """
+    todo = []
+    unchanged = []
+    for relative in find_sources(src_dir, skip_dir=out_dir):
+        with open(os.path.join(src_dir, relative), 'rb') as f:
+            key = source_key(f.read(), preset)
+        output = os.path.join(out_dir, relative)
+        if not force and manifest.get(relative) == key and os.path.exists(output):
+            unchanged.append(relative)
+        else:
+            todo.append((relative, key))
+    return todo, unchanged
+
+
+def obfuscate_tree(
+    client: PrometheusObfuscatorClient,
+    src_dir: str,
+    out_dir: str,
+    preset: str,
+    workers: int,
+    force: bool = False,
+    quiet: bool = False,
+) -> int:
+    """
+    Obfuscate the changed .lua files of a tree
+
+    Returns:
+        Number of files that failed
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    todo, unchanged = plan(src_dir, out_dir, preset, manifest, force)
+    if not quiet:
+        print(f"{len(todo)} file(s) to obfuscate with {preset}, {len(unchanged)} unchanged")
+
+    # Outputs of deleted sources would otherwise ship stale; failed files lose their entry below
+    current = set(unchanged) | {relative for relative, _ in todo}
+    for relative in set(manifest) - current:
+        output = os.path.join(out_dir, relative)
+        if os.path.exists(output):
+            os.remove(output)
+            if not quiet:
+                print(f"Removed {relative}, its source is gone")
+    manifest = {relative: key for relative, key in manifest.items() if relative in current}
+    keys = dict(todo)
+    by_path = {os.path.join(src_dir, relative): relative for relative, _ in todo}
+    failed = 0
+    try:
+        results = client.obfuscate_many(by_path, preset, workers=workers)
+        for done, (path, result) in enumerate(results, start=1):
+            relative = by_path[path]
+            if 'error' in result:
+                failed += 1
+                manifest.pop(relative, None)
+                print(f"[{done}/{len(todo)}] {relative}: {result['error']}", file=sys.stderr)
+                continue
+            output = os.path.join(out_dir, relative)
+            os.makedirs(os.path.dirname(output), exist_ok=True)
+            with open(output, 'w', encoding='utf-8', newline='') as f:
+                f.write(result['obfuscatedCode'])
+            manifest[relative] = keys[relative]
+            if not quiet:
+                print(f"[{done}/{len(todo)}] {relative}")
+    finally:
+        # Also on Ctrl+C, so the files done so far are skipped next time
+        save_manifest(manifest_path, manifest)
+
+    if not quiet:
+        print(f"Done: {len(todo) - failed} obfuscated, {len(unchanged)} unchanged, {failed} failed")
+    return failed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m prometheus_obfuscator',
+                                     description="Prometheus Obfuscator command-line client")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    obfuscate = commands.add_parser('obfuscate', help="Obfuscate the .lua files of a directory tree")
+    obfuscate.add_argument('src_dir', help="Directory with the .lua sources")
+    obfuscate.add_argument('-o', '--out-dir', required=True, help="Directory for the obfuscated files")
+    obfuscate.add_argument('--preset', default=get_setting('PROMETHEUS_DEFAULT_PRESET', "Medium"),
+                           help="Obfuscation preset (default: PROMETHEUS_DEFAULT_PRESET)")
+    obfuscate.add_argument('-j', '--jobs', type=int, default=DEFAULT_POOL_SIZE,
+                           help=f"Files obfuscated in parallel (default: {DEFAULT_POOL_SIZE})")
+    obfuscate.add_argument('--url', default=get_api_urls()[0], help="API URL (default: PROMETHEUS_API_URL)")
+    obfuscate.add_argument('--force', action='store_true', help="Obfuscate unchanged files too")
+    obfuscate.add_argument('-q', '--quiet', action='store_true', help="Only report failures")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.src_dir):
+        parser.error(f"not a directory: {args.src_dir}")
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+
+    with PrometheusObfuscatorClient(args.url, pool_size=args.jobs) as client:
+        try:
+            failed = obfuscate_tree(client, args.src_dir, args.out_dir, args.preset, args.jobs,
+                                    force=args.force, quiet=args.quiet)
+        except KeyboardInterrupt:
+            print("Interrupted", file=sys.stderr)
+            return 130
+    return 1 if failed else 0
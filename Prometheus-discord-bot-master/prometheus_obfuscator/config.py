@@ -0,0 +1,52 @@
+"""
+Settings loader for the Prometheus client package
+
+Values come from `prometheus_config.py` when it is importable (copy it next
+to your bot), otherwise the defaults passed by the caller are used.
+"""
+
+import os
+from typing import Any, List, Optional
+
+try:
+    import prometheus_config
+except ImportError:
+    prometheus_config = None
+
+
+def get_setting(name: str, default: Any) -> Any:
+    """
+    Read a setting from prometheus_config.py
+
+    Args:
+        name: Setting name, e.g. "PROMETHEUS_API_TIMEOUT"
+        default: Value used when the setting or the config file is missing
+
+    Returns:
+        The configured value or the default
+    """
+    return getattr(prometheus_config, name, default)
+
+
+def get_api_urls(default: str = "http://localhost:3000") -> List[str]:
+    """
+    Get the configured API instance URLs
+
+    Returns:
+        PROMETHEUS_API_URLS if it is not empty, else [PROMETHEUS_API_URL]
+    """
+    urls = get_setting('PROMETHEUS_API_URLS', None)
+    if urls:
+        return list(urls)
+    return [get_setting('PROMETHEUS_API_URL', default)]
+
+
+def get_bot_token(default: Optional[str] = None) -> Optional[str]:
+    """
+    Get the Discord bot token without importing the bot
+
+    Returns:
+        The DISCORD_BOT_TOKEN environment variable if set, else
+        PROMETHEUS_BOT_TOKEN
+    """
+    return os.environ.get('DISCORD_BOT_TOKEN') or get_setting('PROMETHEUS_BOT_TOKEN', default)
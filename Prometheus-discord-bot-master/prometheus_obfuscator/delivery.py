@@ -0,0 +1,173 @@
+"""
+Delivery of obfuscated output within Discord's upload limit
+
+Strong output can be ~100x the input, so a result does not always fit in one
+attachment. The delivery mode is picked from the byte size before anything
+is uploaded:
+
+- raw: the output fits and is sent as-is
+- zip: the output is compressed into one spool file, sent if that fits
+- chunked: the (compressed) output is split into numbered parts, one
+  message each, that are read straight from the spool file
+
+At most one encoded copy (the zip) exists next to the output, and it lives
+in a temporary file rather than in memory.
+"""
+
+import io
+import posixpath
+import shutil
+import zipfile
+from typing import BinaryIO, List, Optional, Tuple
+
+from .config import get_setting
+from .streaming import CHUNK_SIZE, spool_file
+
+# Defaults, overridable from prometheus_config.py
+DEFAULT_UPLOAD_LIMIT = 10 * 1024 * 1024  # Discord's limit for unboosted servers and DMs
+
+# Room left for the message payload next to the attachment
+UPLOAD_HEADROOM = 64 * 1024
+
+
+def upload_limit(guild_limit: Optional[int] = None) -> int:
+    """
+    Bytes one attachment may have
+
+    Args:
+        guild_limit: The server's limit (discord.Guild.filesize_limit), None in DMs
+
+    Returns:
+        PROMETHEUS_UPLOAD_LIMIT if set, else the server's limit or the default
+    """
+    configured = get_setting('PROMETHEUS_UPLOAD_LIMIT', None)
+    if configured:
+        return configured
+    return guild_limit or DEFAULT_UPLOAD_LIMIT
+
+
+class FileSlice(io.RawIOBase):
+    """Read-only view of a byte range of a file, so parts need no copies"""
+
+    def __init__(self, fp: BinaryIO, start: int, length: int):
+        super().__init__()
+        self._fp = fp
+        self._start = start
+        self._length = length
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._length
+        self._pos = max(0, min(offset, self._length))
+        return self._pos
+
+    def readinto(self, buffer) -> int:
+        count = min(len(buffer), self._length - self._pos)
+        if count <= 0:
+            return 0
+        # Other slices share the file, so always seek first
+        self._fp.seek(self._start + self._pos)
+        data = self._fp.read(count)
+        buffer[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+
+class Delivery:
+    """
+    The attachments for one result, one upload (message) per part
+
+    Closing it closes the output and the encoded copy; use it as a
+    context manager around the uploads.
+    """
+
+    def __init__(self, mode: str, parts: List[Tuple[str, BinaryIO]], size: int, files: List[BinaryIO]):
+        self.mode = mode  # 'raw', 'zip' or 'chunked'
+        self.parts = parts  # (filename, file positioned at 0)
+        self.size = size  # bytes uploaded over all parts
+        self._files = files
+
+    def describe(self) -> Optional[str]:
+        """A note for the user on how to use the upload, None for raw output"""
+        if self.mode == 'zip':
+            return f"Too large for one upload, sent compressed as `{self.parts[0][0]}`"
+        if self.mode == 'chunked':
+            joined = self.parts[0][0].rsplit('.', 1)[0]
+            return (
+                f"Too large for one upload, sent in {len(self.parts)} parts. "
+                f"Join them with `cat {joined}.* > {joined}` (or `copy /b` on Windows) "
+                f"or open the first part with 7-Zip"
+            )
+        return None
+
+    def close(self) -> None:
+        for fp in self._files:
+            fp.close()
+
+    def __enter__(self) -> "Delivery":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def prepare_delivery(
+    output: BinaryIO,
+    size: int,
+    filename: str,
+    limit: int,
+    compress: bool = True,
+) -> Delivery:
+    """
+    Pick how to upload an output and prepare its parts
+
+    Args:
+        output: The output, positioned at 0; owned by the delivery afterwards
+        size: Size of the output in bytes
+        filename: Attachment name for a raw upload
+        limit: Bytes one attachment may have (see upload_limit())
+        compress: Try a zip before splitting (off for outputs that are
+            already archives)
+
+    Returns:
+        The delivery; close it once the parts are uploaded
+    """
+    part_size = max(limit - UPLOAD_HEADROOM, CHUNK_SIZE)
+    if size <= part_size:
+        return Delivery('raw', [(filename, output)], size, [output])
+
+    files = [output]
+    payload, payload_size, payload_name = output, size, filename
+    if compress:
+        encoded = spool_file()
+        files.append(encoded)
+        with zipfile.ZipFile(encoded, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            with archive.open(filename, 'w') as member:
+                output.seek(0)
+                shutil.copyfileobj(output, member, CHUNK_SIZE)
+        payload_size = encoded.tell()
+        payload_name = posixpath.splitext(filename)[0] + '.zip'
+        encoded.seek(0)
+        payload = encoded
+        if payload_size <= part_size:
+            return Delivery('zip', [(payload_name, encoded)], payload_size, files)
+
+    parts: List[Tuple[str, BinaryIO]] = []
+    count = -(-payload_size // part_size)
+    for index in range(count):
+        start = index * part_size
+        part = FileSlice(payload, start, min(part_size, payload_size - start))
+        parts.append((f"{payload_name}.{index + 1:03d}", part))
+    return Delivery('chunked', parts, payload_size, files)
@@ -0,0 +1,563 @@
+"""
+Local, pure-Python obfuscation for the cheap presets
+
+Used when PROMETHEUS_FALLBACK_ENABLED is set and the API cannot be reached,
+and for every Minify request (there is nothing the API does for Minify that
+is worth an HTTP round trip):
+
+- Minify: comments and whitespace are stripped and local variables are
+  renamed to short names
+- Weak: Minify, plus all string constants are moved into one pool table
+  (stored as escaped bytes) and the script is wrapped in a function, like
+  the ConstantArray and WrapInFunction steps of the real Weak preset
+
+The work is CPU bound, so FallbackEngine runs it in a process pool instead
+of on the event loop.
+"""
+
+import asyncio
+import itertools
+import string
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterator, List, Optional, Set, Union
+
+from .config import get_setting
+from .lua_lexer import KEYWORDS, LuaSyntaxError, Token, string_value, tokenize
+
+# Defaults, overridable from prometheus_config.py
+DEFAULT_WORKERS = 2
+DEFAULT_LOCAL_MINIFY = True
+
+# Presets this module can produce
+LOCAL_PRESETS = ('Minify', 'Weak')
+
+# Keywords are treated as keywords only in Luau
+_LUAU_KEYWORDS = frozenset({'continue'})
+
+_BINARY_OPERATORS = frozenset({
+    '+', '-', '*', '/', '//', '%', '^', '..', '==', '~=', '<', '<=', '>', '>=',
+    '&', '|', '~', '<<', '>>',
+})
+_COMPOUND_ASSIGNMENTS = frozenset({'+=', '-=', '*=', '/=', '//=', '%=', '^=', '..='})
+
+# Pairs of adjacent characters that would lex differently without a space
+_MERGING_PAIRS = frozenset({
+    ('-', '-'), ('[', '['), ('[', '='), ('=', '='), ('<', '='), ('>', '='), ('~', '='),
+    ('<', '<'), ('>', '>'), ('/', '/'), (':', ':'), ('.', '.'),
+} | {('.', digit) for digit in string.digits})
+
+_WORD_CHARS = frozenset(string.ascii_letters + string.digits + '_')
+
+
+class _Binding:
+    """One local variable declaration"""
+
+    def __init__(self, name: str, fixed: bool = False):
+        self.name = name
+        self.slot = 0  # visible locals when it became visible; unique among visible ones
+        self.fixed = fixed  # keeps its name (implicit `self`)
+
+
+class _Resolver:
+    """
+    Recursive-descent walk over a Lua 5.1/Luau token stream
+
+    Nothing is built; the walk only records which name tokens refer to which
+    local declaration, which names are globals and where string literals
+    are used as values.
+    """
+
+    def __init__(self, tokens: List[Token]):
+        self.tokens = tokens
+        self.pos = 0
+        self.scopes: List[List[_Binding]] = []
+        self.depth = 0
+        self.locals: Dict[int, _Binding] = {}  # token index -> binding
+        self.globals: Set[str] = set()
+        self.strings: List[int] = []  # token indices of string values
+
+    # Token helpers
+
+    @property
+    def token(self) -> Token:
+        return self.tokens[self.pos]
+
+    def peek(self, offset: int = 1) -> Token:
+        return self.tokens[min(self.pos + offset, len(self.tokens) - 1)]
+
+    def check(self, text: str) -> bool:
+        token = self.token
+        return token.kind in ('op', 'keyword') and token.text == text
+
+    def check_keyword(self, word: str) -> bool:
+        # Luau-only keywords are plain names for the lexer
+        token = self.token
+        return token.text == word and token.kind == 'name'
+
+    def accept(self, text: str) -> bool:
+        if self.check(text):
+            self.pos += 1
+            return True
+        return False
+
+    def expect(self, text: str) -> None:
+        if not self.accept(text):
+            self.error(f"'{text}' expected")
+
+    def expect_name(self) -> int:
+        if self.token.kind != 'name':
+            self.error("<name> expected")
+        self.pos += 1
+        return self.pos - 1
+
+    def error(self, message: str) -> None:
+        token = self.token
+        near = token.text or '<eof>'
+        raise LuaSyntaxError(f"{message} near '{near}'", token.line)
+
+    # Scopes
+
+    def open_scope(self) -> None:
+        self.scopes.append([])
+
+    def close_scope(self) -> None:
+        self.depth -= len(self.scopes.pop())
+
+    def declare(self, index: int) -> _Binding:
+        binding = _Binding(self.tokens[index].text)
+        self.locals[index] = binding
+        return binding
+
+    def activate(self, binding: _Binding) -> None:
+        binding.slot = self.depth
+        self.scopes[-1].append(binding)
+        self.depth += 1
+
+    def reference(self, index: int) -> None:
+        name = self.tokens[index].text
+        for scope in reversed(self.scopes):
+            for binding in reversed(scope):
+                if binding.name == name:
+                    self.locals[index] = binding
+                    return
+        self.globals.add(name)
+
+    # Grammar
+
+    def chunk(self) -> None:
+        self.open_scope()
+        self.block()
+        if self.token.kind != 'eof':
+            self.error("'<eof>' expected")
+        self.close_scope()
+
+    def block_follows(self) -> bool:
+        token = self.token
+        return token.kind == 'eof' or (token.kind == 'keyword' and token.text in ('else', 'elseif', 'end', 'until'))
+
+    def block(self) -> None:
+        while not self.block_follows():
+            if self.check('return'):
+                self.pos += 1
+                if not self.block_follows() and not self.check(';'):
+                    self.expression_list()
+                self.accept(';')
+                if not self.block_follows():
+                    self.error("'end' expected")
+                return
+            self.statement()
+
+    def scoped_block(self) -> None:
+        self.open_scope()
+        self.block()
+        self.close_scope()
+
+    def statement(self) -> None:
+        if self.accept(';'):
+            return
+        if self.accept('if'):
+            self.expression()
+            self.expect('then')
+            self.scoped_block()
+            while self.accept('elseif'):
+                self.expression()
+                self.expect('then')
+                self.scoped_block()
+            if self.accept('else'):
+                self.scoped_block()
+            self.expect('end')
+        elif self.accept('while'):
+            self.expression()
+            self.expect('do')
+            self.scoped_block()
+            self.expect('end')
+        elif self.accept('do'):
+            self.scoped_block()
+            self.expect('end')
+        elif self.accept('for'):
+            self.for_statement()
+        elif self.accept('repeat'):
+            # Locals of the body are visible in the condition
+            self.open_scope()
+            self.block()
+            self.expect('until')
+            self.expression()
+            self.close_scope()
+        elif self.accept('function'):
+            self.reference(self.expect_name())
+            method = False
+            while self.accept('.'):
+                self.expect_name()
+            if self.accept(':'):
+                self.expect_name()
+                method = True
+            self.function_body(method)
+        elif self.accept('local'):
+            if self.accept('function'):
+                # Visible in its own body, so it can call itself
+                binding = self.declare(self.expect_name())
+                self.activate(binding)
+                self.function_body(False)
+            else:
+                bindings = [self.local_name()]
+                while self.accept(','):
+                    bindings.append(self.local_name())
+                if self.accept('='):
+                    self.expression_list()
+                # Only visible after the statement, `local x = x` reads the outer x
+                for binding in bindings:
+                    self.activate(binding)
+        elif self.accept('::'):
+            self.expect_name()
+            self.expect('::')
+        elif self.accept('goto'):
+            self.expect_name()
+        elif self.accept('break'):
+            pass
+        elif self.check_keyword('continue') and not self.continues_expression(self.peek()):
+            self.pos += 1
+        else:
+            self.expression_statement()
+
+    def continues_expression(self, token: Token) -> bool:
+        """Whether `continue` followed by token is a variable, not the Luau statement"""
+        if token.kind == 'string':
+            return True
+        return token.kind == 'op' and (token.text in ('(', '{', '.', '[', ':', '=', ',')
+                                       or token.text in _COMPOUND_ASSIGNMENTS)
+
+    def local_name(self) -> _Binding:
+        binding = self.declare(self.expect_name())
+        # Lua 5.4 attributes, e.g. <const>
+        if self.check('<') and self.peek().kind == 'name' and self.peek(2).text == '>':
+            self.pos += 3
+        return binding
+
+    def for_statement(self) -> None:
+        first = self.declare(self.expect_name())
+        if self.accept('='):
+            self.expression()
+            self.expect(',')
+            self.expression()
+            if self.accept(','):
+                self.expression()
+            bindings = [first]
+        else:
+            bindings = [first]
+            while self.accept(','):
+                bindings.append(self.declare(self.expect_name()))
+            self.expect('in')
+            self.expression_list()
+        self.expect('do')
+        self.open_scope()
+        for binding in bindings:
+            self.activate(binding)
+        self.block()
+        self.close_scope()
+        self.expect('end')
+
+    def function_body(self, method: bool) -> None:
+        self.open_scope()
+        if method:
+            self.activate(_Binding('self', fixed=True))
+        self.expect('(')
+        if not self.check(')'):
+            while True:
+                if self.accept('...'):
+                    break
+                self.activate(self.declare(self.expect_name()))
+                if not self.accept(','):
+                    break
+        self.expect(')')
+        self.block()
+        self.expect('end')
+        self.close_scope()
+
+    def expression_statement(self) -> None:
+        is_call = self.suffixed_expression()
+        if self.check('=') or self.check(','):
+            while self.accept(','):
+                self.suffixed_expression()
+            self.expect('=')
+            self.expression_list()
+        elif self.token.kind == 'op' and self.token.text in _COMPOUND_ASSIGNMENTS:
+            self.pos += 1
+            self.expression()
+        elif not is_call:
+            self.error("syntax error")
+
+    def expression_list(self) -> None:
+        self.expression()
+        while self.accept(','):
+            self.expression()
+
+    def expression(self) -> None:
+        while self.accept('not') or self.accept('-') or self.accept('#') or self.accept('~'):
+            pass
+        self.simple_expression()
+        while True:
+            token = self.token
+            if (token.kind == 'op' and token.text in _BINARY_OPERATORS) or \
+                    (token.kind == 'keyword' and token.text in ('and', 'or')):
+                self.pos += 1
+                while self.accept('not') or self.accept('-') or self.accept('#') or self.accept('~'):
+                    pass
+                self.simple_expression()
+            else:
+                return
+
+    def simple_expression(self) -> None:
+        token = self.token
+        if token.kind == 'number' or (token.kind == 'keyword' and token.text in ('nil', 'true', 'false')):
+            self.pos += 1
+        elif token.kind == 'string':
+            self.strings.append(self.pos)
+            self.pos += 1
+        elif self.accept('...'):
+            pass
+        elif self.check('{'):
+            self.table()
+        elif self.accept('function'):
+            self.function_body(False)
+        elif self.accept('if'):
+            # Luau if-then-else expression
+            self.expression()
+            self.expect('then')
+            self.expression()
+            while self.accept('elseif'):
+                self.expression()
+                self.expect('then')
+                self.expression()
+            self.expect('else')
+            self.expression()
+        else:
+            self.suffixed_expression()
+
+    def primary_expression(self) -> None:
+        if self.token.kind == 'name':
+            self.reference(self.pos)
+            self.pos += 1
+        elif self.accept('('):
+            self.expression()
+            self.expect(')')
+        else:
+            self.error("unexpected symbol")
+
+    def suffixed_expression(self) -> bool:
+        """Returns whether the expression ends in a call"""
+        self.primary_expression()
+        is_call = False
+        while True:
+            if self.accept('.'):
+                self.expect_name()
+                is_call = False
+            elif self.accept('['):
+                self.expression()
+                self.expect(']')
+                is_call = False
+            elif self.accept(':'):
+                self.expect_name()
+                self.call_arguments()
+                is_call = True
+            elif self.check('(') or self.check('{') or self.token.kind == 'string':
+                self.call_arguments()
+                is_call = True
+            else:
+                return is_call
+
+    def call_arguments(self) -> None:
+        token = self.token
+        if token.kind == 'string':
+            self.strings.append(self.pos)
+            self.pos += 1
+        elif self.check('{'):
+            self.table()
+        else:
+            self.expect('(')
+            if not self.check(')'):
+                self.expression_list()
+            self.expect(')')
+
+    def table(self) -> None:
+        self.expect('{')
+        while not self.check('}'):
+            if self.accept('['):
+                self.expression()
+                self.expect(']')
+                self.expect('=')
+                self.expression()
+            elif self.token.kind == 'name' and self.peek().kind == 'op' and self.peek().text == '=':
+                self.pos += 2  # the key is a field name, not a variable
+                self.expression()
+            else:
+                self.expression()
+            if not (self.accept(',') or self.accept(';')):
+                break
+        self.expect('}')
+
+
+def _short_names(excluded: Set[str]) -> Iterator[str]:
+    """a, b, ..., Z, _, aa, ab, ... skipping keywords and excluded names"""
+    first = string.ascii_letters + '_'
+    rest = first + string.digits
+    for length in itertools.count(1):
+        for head in first:
+            for tail in itertools.product(rest, repeat=length - 1):
+                name = head + ''.join(tail)
+                if name not in KEYWORDS and name not in _LUAU_KEYWORDS and name not in excluded:
+                    yield name
+
+
+def _needs_space(previous: str, text: str, previous_kind: str) -> bool:
+    if previous[-1] in _WORD_CHARS and text[0] in _WORD_CHARS:
+        return True
+    if previous_kind == 'number' and text[0] == '.':
+        return True
+    return (previous[-1], text[0]) in _MERGING_PAIRS
+
+
+def _escape_bytes(value: bytes) -> str:
+    return '"' + ''.join(f'\\{byte}' for byte in value) + '"'
+
+
+def obfuscate_source(source: str, preset: str) -> str:
+    """
+    Obfuscate Lua source with one of LOCAL_PRESETS
+
+    Runs in a worker process; it is a plain function so it can be pickled.
+
+    Raises:
+        LuaSyntaxError: If the source is not valid Lua
+        ValueError: For presets that are not in LOCAL_PRESETS
+    """
+    if preset not in LOCAL_PRESETS:
+        raise ValueError(f"Preset {preset} is not available locally")
+
+    tokens = tokenize(source)
+    resolver = _Resolver(tokens)
+    resolver.chunk()
+
+    # Generated names never equal a global, so renaming cannot capture one
+    names = _short_names(resolver.globals | {'self'})
+    pool_name = next(names) if preset == 'Weak' else None
+    slot_names: List[str] = []
+
+    replacements: Dict[int, str] = {}
+    for index, binding in resolver.locals.items():
+        if binding.fixed:
+            continue
+        while len(slot_names) <= binding.slot:
+            slot_names.append(next(names))
+        replacements[index] = slot_names[binding.slot]
+
+    pool: Dict[bytes, int] = {}
+    if pool_name is not None:
+        for index in resolver.strings:
+            value = string_value(tokens[index])
+            position = pool.setdefault(value, len(pool) + 1)
+            replacements[index] = f"({pool_name}[{position}])"
+
+    parts: List[str] = []
+    previous = ''
+    previous_kind = ''
+    for index, token in enumerate(tokens[:-1]):
+        text = replacements.get(index, token.text)
+        if previous and _needs_space(previous, text, previous_kind):
+            parts.append(' ')
+        parts.append(text)
+        previous = text
+        previous_kind = token.kind
+    body = ''.join(parts)
+
+    if pool_name is None:
+        return body
+    if pool:
+        constants = ','.join(_escape_bytes(value) for value in pool)
+        body = f"local {pool_name}={{{constants}}};{body}"
+    return f"return(function(...){body} end)(...)"
+
+
+class FallbackEngine:
+    """Runs obfuscate_source() in a process pool"""
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, local_minify: bool = DEFAULT_LOCAL_MINIFY):
+        """
+        Initialize the engine
+
+        The pool is started on first use.
+
+        Args:
+            workers: Worker processes
+            local_minify: Handle Minify locally even when the API is up
+        """
+        self.workers = workers
+        self.local_minify = local_minify
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @classmethod
+    def from_config(cls) -> "FallbackEngine":
+        """Build the engine from prometheus_config.py"""
+        return cls(
+            workers=get_setting('PROMETHEUS_FALLBACK_WORKERS', DEFAULT_WORKERS),
+            local_minify=get_setting('PROMETHEUS_LOCAL_MINIFY', DEFAULT_LOCAL_MINIFY),
+        )
+
+    def supports(self, preset: str) -> bool:
+        """Whether the preset can be produced locally"""
+        return preset in LOCAL_PRESETS
+
+    def runs_locally(self, preset: str) -> bool:
+        """Whether requests for the preset skip the API altogether"""
+        return self.local_minify and preset == 'Minify'
+
+    async def obfuscate(self, lua_code: Union[str, bytes], preset: str) -> Dict[str, Any]:
+        """
+        Obfuscate in a worker process
+
+        Returns:
+            Dict shaped like the API response (plus 'fallback': True) or error
+        """
+        if isinstance(lua_code, bytes):
+            try:
+                lua_code = lua_code.decode('utf-8')
+            except UnicodeDecodeError:
+                return {"error": "Not a valid UTF-8 text file"}
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        loop = asyncio.get_running_loop()
+        try:
+            code = await loop.run_in_executor(self._pool, obfuscate_source, lua_code, preset)
+        except LuaSyntaxError as e:
+            return {"error": f"Obfuscation failed: {e}"}
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); start a fresh pool next time
+            self.close()
+            return {"error": "Obfuscation failed: the local engine crashed"}
+        return {'success': True, 'preset': preset, 'obfuscatedCode': code, 'fallback': True}
+
+    def close(self) -> None:
+        """Shut the worker processes down"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,193 @@
+"""
+Background health monitor for the Prometheus Obfuscator API
+
+A single task polls /health on an interval and keeps a rolling window of
+results. Commands read the latest snapshot instead of calling /health
+themselves, so checking the API status adds no latency to a command.
+
+With several API instances, every check probes each of them directly
+(not through the load balancer, whose latency statistics the probes would
+skew); the API is online while at least one instance answers.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from .aio import AsyncPrometheusObfuscatorClient
+from .balancer import Endpoint
+from .config import get_setting
+
+# Defaults, overridable from prometheus_config.py
+DEFAULT_INTERVAL = 30
+DEFAULT_WINDOW = 60  # number of checks kept for percentiles
+
+
+class HealthSnapshot(NamedTuple):
+    """Latest known API status"""
+
+    online: bool
+    message: str
+    checked_at: Optional[float]  # time.time() of the last check, None before the first
+    latency_ms: Optional[float]
+    p50_ms: Optional[float]
+    p95_ms: Optional[float]
+    p99_ms: Optional[float]
+    availability: float  # share of successful instance checks in the window
+    instances_online: int  # instances that answered the last check
+    instances: int
+    consecutive_failures: int
+    last_error: Optional[str]
+    last_error_at: Optional[float]
+
+
+def percentile(sorted_values: List[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class HealthMonitor:
+    """Polls /health in the background and caches the result"""
+
+    def __init__(
+        self,
+        client: AsyncPrometheusObfuscatorClient,
+        interval: float = DEFAULT_INTERVAL,
+        window: int = DEFAULT_WINDOW,
+    ):
+        """
+        Initialize the monitor
+
+        Args:
+            client: Client used to call /health
+            interval: Seconds between checks
+            window: Number of recent checks used for latency percentiles
+        """
+        self.client = client
+        self.interval = interval
+        self._samples: Deque[Optional[float]] = deque(maxlen=window)  # latency or None on failure
+        self._task: Optional[asyncio.Task] = None
+        self._consecutive_failures = 0
+        self._last_error: Optional[str] = None
+        self._last_error_at: Optional[float] = None
+        # Optimistic until the first check so commands are not rejected at startup
+        self._snapshot = HealthSnapshot(
+            online=True,
+            message="Not checked yet",
+            checked_at=None,
+            latency_ms=None,
+            p50_ms=None,
+            p95_ms=None,
+            p99_ms=None,
+            availability=1.0,
+            instances_online=len(client.balancer.endpoints),
+            instances=len(client.balancer.endpoints),
+            consecutive_failures=0,
+            last_error=None,
+            last_error_at=None,
+        )
+
+    @classmethod
+    def from_config(cls, client: AsyncPrometheusObfuscatorClient) -> "HealthMonitor":
+        """Build the monitor from prometheus_config.py"""
+        return cls(client, interval=get_setting('PROMETHEUS_HEALTH_CHECK_INTERVAL', DEFAULT_INTERVAL))
+
+    def snapshot(self) -> HealthSnapshot:
+        """Latest status, without any I/O"""
+        return self._snapshot
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """
+        Start the polling task (no-op if it is already running)
+
+        If check_now() already ran, the first poll waits one interval.
+        """
+        if not self.running:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        """Stop the polling task"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _probe(self, endpoint: Endpoint) -> Tuple[Dict[str, Any], float]:
+        started = time.perf_counter()
+        result = await self.client.health_check(endpoint)
+        return result, (time.perf_counter() - started) * 1000
+
+    async def check_now(self) -> HealthSnapshot:
+        """
+        Call /health on every instance once and update the snapshot
+
+        Returns:
+            The updated snapshot
+        """
+        endpoints = self.client.balancer.endpoints
+        probes = await asyncio.gather(*(self._probe(endpoint) for endpoint in endpoints))
+        now = time.time()
+
+        latencies_now = []
+        message = None
+        errors = []
+        for endpoint, (result, latency_ms) in zip(endpoints, probes):
+            if "error" in result:
+                self._samples.append(None)
+                errors.append(result['error'] if len(endpoints) == 1 else f"{endpoint.url}: {result['error']}")
+            else:
+                self._samples.append(latency_ms)
+                latencies_now.append(latency_ms)
+                if message is None:
+                    message = result.get('message', 'ok')
+
+        online = bool(latencies_now)
+        if errors:
+            self._last_error = "; ".join(errors)
+            self._last_error_at = now
+        if online:
+            self._consecutive_failures = 0
+            if errors:
+                message = f"{message} ({len(latencies_now)} of {len(endpoints)} instances up)"
+        else:
+            self._consecutive_failures += 1
+            message = self._last_error
+
+        latencies = sorted(sample for sample in self._samples if sample is not None)
+        self._snapshot = HealthSnapshot(
+            online=online,
+            message=message,
+            checked_at=now,
+            latency_ms=sum(latencies_now) / len(latencies_now) if online else None,
+            p50_ms=percentile(latencies, 0.50),
+            p95_ms=percentile(latencies, 0.95),
+            p99_ms=percentile(latencies, 0.99),
+            availability=len(latencies) / len(self._samples),
+            instances_online=len(latencies_now),
+            instances=len(endpoints),
+            consecutive_failures=self._consecutive_failures,
+            last_error=self._last_error,
+            last_error_at=self._last_error_at,
+        )
+        return self._snapshot
+
+    async def _run(self) -> None:
+        if self._snapshot.checked_at is not None:
+            await asyncio.sleep(self.interval)
+        while True:
+            try:
+                await self.check_now()
+            except Exception as e:
+                print(f"Health check failed unexpectedly: {e}")
+            await asyncio.sleep(self.interval)
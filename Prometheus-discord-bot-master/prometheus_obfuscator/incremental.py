@@ -0,0 +1,237 @@
+"""
+Recognizing resubmissions of an edited script
+
+Developers often upload v1, v2, v3... of the same script with small
+changes. The result cache only helps for byte-identical sources, so every
+new version is a cold run. SubmissionIndex remembers each user's recent
+submissions as fingerprints of their top-level units (every top-level
+function, plus the statements between functions) and recognizes a new
+upload as an edited version of an earlier one, by filename or by the
+units the two have in common.
+
+The obfuscator presets transform the script as a whole (the VM presets
+wrap everything in one bytecode blob, Minify renames across functions),
+so the API cannot rebuild a result from per-unit pieces. A recognized
+resubmission is flagged instead, and takes over the queue slot of the
+previous version if that is still waiting (see JobScheduler.submit).
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Hashable, List, NamedTuple, Optional, Tuple, Union
+
+from .analysis import _starts_expression
+from .config import get_setting
+from .lua_lexer import LuaSyntaxError, Token, tokenize
+
+# Defaults, overridable from prometheus_config.py
+DEFAULT_THRESHOLD = 0.5  # share of units two versions must have in common
+DEFAULT_HISTORY = 10  # submissions remembered per user
+DEFAULT_MAX_AGE = 60 * 60  # seconds a submission is remembered
+
+# Users remembered at once, the least recently active are forgotten first
+MAX_USERS = 10000
+
+TOP_LEVEL = "(top level)"
+
+
+class Unit(NamedTuple):
+    """A top-level function, or the statements between two of them"""
+
+    label: str  # e.g. "function M.update", or TOP_LEVEL
+    digest: str
+    line: int
+
+
+class Resubmission(NamedTuple):
+    """A submission recognized as an edited version of an earlier one"""
+
+    filename: str  # of the earlier version
+    similarity: float  # share of units in common, 1.0 for an unchanged script
+    changed: List[str]  # labels of new or edited units
+    units: int  # units in the new version
+
+    def describe(self) -> str:
+        if not self.changed:
+            return f"Same code as `{self.filename}`"
+        shown = ', '.join(f"`{label}`" for label in self.changed[:5])
+        if len(self.changed) > 5:
+            shown += f" and {len(self.changed) - 5} more"
+        return f"Updated version of `{self.filename}`: {len(self.changed)} of {self.units} units changed ({shown})"
+
+
+def _digest(tokens: List[Token]) -> str:
+    # Tokens only, so whitespace, comments and line moves do not count as changes
+    digest = hashlib.sha256()
+    for token in tokens:
+        digest.update(token.kind.encode('ascii'))
+        digest.update(b'\0')
+        digest.update(token.text.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def split_units(source: Union[str, bytes]) -> List[Unit]:
+    """
+    Fingerprint the top-level units of a source
+
+    Raises:
+        LuaSyntaxError: If the source cannot be tokenized
+    """
+    if isinstance(source, bytes):
+        source = source.decode('utf-8')
+    tokens = tokenize(source)[:-1]  # without eof
+
+    units: List[Unit] = []
+    start = 0
+    depth = 0
+    function_start: Optional[int] = None
+    previous: Optional[Token] = None
+
+    def flush(end: int, label: str) -> None:
+        if end > start:
+            units.append(Unit(label, _digest(tokens[start:end]), tokens[start].line))
+
+    for index, token in enumerate(tokens):
+        if token.kind == 'keyword':
+            word = token.text
+            if word == 'function' and depth == 0 and not _starts_expression(previous):
+                # A function statement starts a unit of its own (with its `local`)
+                begin = index - 1 if previous is not None and previous.text == 'local' else index
+                flush(begin, TOP_LEVEL)
+                start = begin
+                function_start = index
+                depth += 1
+            elif word in ('function', 'do', 'repeat') or (word == 'if' and not _starts_expression(previous)):
+                depth += 1
+            elif word in ('end', 'until'):
+                depth -= 1
+                if depth == 0 and function_start is not None:
+                    name = []
+                    for part in tokens[function_start + 1:]:
+                        if part.text == '(':
+                            break
+                        name.append(part.text)
+                    flush(index + 1, f"function {''.join(name)}")
+                    start = index + 1
+                    function_start = None
+        previous = token
+    flush(len(tokens), TOP_LEVEL)
+    return units
+
+
+def similarity(old: List[Unit], new: List[Unit]) -> Tuple[float, List[str]]:
+    """
+    Compare two versions unit by unit
+
+    Returns:
+        (share of units in common, labels of the units of `new` not in `old`)
+    """
+    remaining = {}
+    for unit in old:
+        remaining[unit.digest] = remaining.get(unit.digest, 0) + 1
+    common = 0
+    changed = []
+    for unit in new:
+        if remaining.get(unit.digest):
+            remaining[unit.digest] -= 1
+            common += 1
+        elif unit.label not in changed:
+            changed.append(unit.label)
+    return common / max(len(old), len(new), 1), changed
+
+
+class _Submission(NamedTuple):
+    units: List[Unit]
+    recorded: float
+
+
+class SubmissionIndex:
+    """Each user's recent submissions, by filename and unit fingerprints"""
+
+    def __init__(
+        self,
+        threshold: float = DEFAULT_THRESHOLD,
+        history: int = DEFAULT_HISTORY,
+        max_age: float = DEFAULT_MAX_AGE,
+    ):
+        """
+        Initialize the index
+
+        Args:
+            threshold: Share of units a submission must have in common with an
+                earlier one to count as a new version of it
+            history: Submissions remembered per user
+            max_age: Seconds a submission is remembered
+        """
+        self.threshold = threshold
+        self.history = history
+        self.max_age = max_age
+        # user -> filename -> submission, both in least recently used order
+        self._users: "OrderedDict[Hashable, OrderedDict[str, _Submission]]" = OrderedDict()
+
+    @classmethod
+    def from_config(cls) -> "SubmissionIndex":
+        """Build the index from prometheus_config.py"""
+        return cls(
+            threshold=get_setting('PROMETHEUS_RESUBMISSION_THRESHOLD', DEFAULT_THRESHOLD),
+            history=get_setting('PROMETHEUS_RESUBMISSION_HISTORY', DEFAULT_HISTORY),
+            max_age=get_setting('PROMETHEUS_RESUBMISSION_MAX_AGE', DEFAULT_MAX_AGE),
+        )
+
+    def _recent(self, user_id: Hashable) -> "OrderedDict[str, _Submission]":
+        submissions = self._users.get(user_id)
+        if submissions is None:
+            return OrderedDict()
+        expired = time.monotonic() - self.max_age
+        for filename in [name for name, entry in submissions.items() if entry.recorded <= expired]:
+            del submissions[filename]
+        if not submissions:
+            del self._users[user_id]
+        return submissions
+
+    def record(self, user_id: Hashable, filename: str, source: Union[str, bytes]) -> Optional[Resubmission]:
+        """
+        Remember a submission and compare it with the user's earlier ones
+
+        The earlier submission with the same filename is compared first,
+        then the one with the most units in common (renamed versions such as
+        `script_v2.lua`).
+
+        Returns:
+            The match, or None if this is not a resubmission (or the
+            source cannot be tokenized)
+        """
+        try:
+            units = split_units(source)
+        except (LuaSyntaxError, UnicodeDecodeError):
+            return None
+
+        submissions = self._recent(user_id)
+        match = None
+        same_name = submissions.get(filename)
+        if same_name is not None:
+            score, changed = similarity(same_name.units, units)
+            if score >= self.threshold:
+                match = Resubmission(filename, score, changed, len(units))
+        if match is None:
+            for name, entry in submissions.items():
+                if name == filename:
+                    continue
+                score, changed = similarity(entry.units, units)
+                if score >= self.threshold and (match is None or score > match.similarity):
+                    match = Resubmission(name, score, changed, len(units))
+
+        submissions.pop(filename, None)
+        submissions[filename] = _Submission(units, time.monotonic())
+        while len(submissions) > self.history:
+            submissions.popitem(last=False)
+        self._users.pop(user_id, None)
+        self._users[user_id] = submissions
+        while len(self._users) > MAX_USERS:
+            self._users.popitem(last=False)
+        return match
+
+    def __len__(self) -> int:
+        return sum(len(submissions) for submissions in self._users.values())
@@ -0,0 +1,151 @@
+"""
+Durable journal of obfuscation jobs
+
+Every accepted job is written to a SQLite file (WAL mode) before it is
+queued and removed once its result was delivered. After a restart the
+journal holds exactly the jobs that were queued or running when the
+process stopped, with everything needed to run and deliver them again:
+the source, preset, and the channel and message to answer in.
+
+Every write commits, so call the methods from a worker thread in async
+code (e.g. loop.run_in_executor), as the client does for the result
+cache's disk tier. The connection is shared between threads under a lock.
+
+Replayed jobs go through the normal client, so a result that was already
+produced before the restart comes from the result cache (keep its disk
+tier enabled) instead of the API.
+"""
+
+import sqlite3
+import threading
+import time
+from typing import Hashable, List, NamedTuple, Optional
+
+from .cache import source_key
+from .config import get_setting
+
+# Defaults, overridable from prometheus_config.py
+DEFAULT_MAX_AGE = 60 * 60  # jobs older than this are not replayed
+
+
+class StoredJob(NamedTuple):
+    """A journaled job"""
+
+    id: int
+    channel_id: int
+    message_id: int  # message to put the result in (e.g. the processing message)
+    user_id: int
+    guild_id: Optional[int]
+    filename: str
+    preset: str
+    source_key: str
+    source: bytes
+    notice: Optional[str]  # e.g. the admission downgrade notice
+    state: str  # 'queued' or 'running'
+    created: float
+
+
+class JobStore:
+    """SQLite journal of unfinished jobs"""
+
+    def __init__(self, path: str, max_age: float = DEFAULT_MAX_AGE):
+        """
+        Open (or create) the journal
+
+        Args:
+            path: SQLite file
+            max_age: Seconds after which an unfinished job is dropped instead of replayed
+        """
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        # WAL with NORMAL sync survives process crashes, which is what jobs need
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'id INTEGER PRIMARY KEY, channel_id INTEGER NOT NULL, message_id INTEGER NOT NULL, '
+            'user_id INTEGER NOT NULL, guild_id INTEGER, filename TEXT NOT NULL, preset TEXT NOT NULL, '
+            'source_key TEXT NOT NULL, source BLOB NOT NULL, notice TEXT, '
+            "state TEXT NOT NULL DEFAULT 'queued', created REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    @classmethod
+    def from_config(cls) -> Optional["JobStore"]:
+        """Build the journal from prometheus_config.py, or None if disabled"""
+        path = get_setting('PROMETHEUS_JOB_STORE_PATH', None)
+        if not path:
+            return None
+        return cls(path, max_age=get_setting('PROMETHEUS_JOB_STORE_MAX_AGE', DEFAULT_MAX_AGE))
+
+    def add(
+        self,
+        job_id: int,
+        channel_id: int,
+        message_id: int,
+        user_id: Hashable,
+        guild_id: Optional[int],
+        filename: str,
+        preset: str,
+        source: bytes,
+        notice: Optional[str] = None,
+    ) -> None:
+        """
+        Journal a job before it is queued
+
+        Args:
+            job_id: Unique ID, e.g. the ID of the message the result goes in
+            channel_id: Channel to answer in
+            message_id: Message to put the result in
+            user_id: Requesting user
+            guild_id: Guild of the request, None in DMs
+            filename: Name of the uploaded file
+            preset: Preset the job runs with
+            source: The Lua source
+            notice: Note to show with the result
+        """
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO jobs (id, channel_id, message_id, user_id, guild_id, filename, '
+                'preset, source_key, source, notice, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (job_id, channel_id, message_id, user_id, guild_id, filename, preset,
+                 source_key(source, preset), source, notice, time.time()),
+            )
+            self._db.commit()
+
+    def mark_running(self, job_id: int) -> None:
+        with self._lock:
+            self._db.execute("UPDATE jobs SET state = 'running' WHERE id = ?", (job_id,))
+            self._db.commit()
+
+    def finish(self, job_id: int) -> None:
+        """Remove a job once its result (or error) was delivered"""
+        with self._lock:
+            self._db.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+            self._db.commit()
+
+    def unfinished(self) -> List[StoredJob]:
+        """
+        The jobs left over from the last run, oldest first
+
+        Jobs older than max_age are dropped from the journal.
+        """
+        with self._lock:
+            self._db.execute('DELETE FROM jobs WHERE created <= ?', (time.time() - self.max_age,))
+            self._db.commit()
+            rows = self._db.execute(
+                'SELECT id, channel_id, message_id, user_id, guild_id, filename, preset, source_key, '
+                'source, notice, state, created FROM jobs ORDER BY created'
+            ).fetchall()
+        return [StoredJob(*row[:8], bytes(row[8]), *row[9:]) for row in rows]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,237 @@
+"""
+Tokenizer for Lua 5.1 source with the Luau additions the API accepts
+
+Produces the significant tokens of a script (comments and whitespace are
+dropped) for the local fallback engine. Luau compound assignments (`+=`,
+`..=`, ...), `//` and the `\\x`, `\\z` and `\\u{}` string escapes are
+understood, type annotations are not.
+"""
+
+import re
+from typing import List, Match, NamedTuple
+
+KEYWORDS = frozenset({
+    'and', 'break', 'do', 'else', 'elseif', 'end', 'false', 'for', 'function', 'goto', 'if', 'in',
+    'local', 'nil', 'not', 'or', 'repeat', 'return', 'then', 'true', 'until', 'while',
+})
+
+# Longest first, so e.g. "..=" wins over ".." and "."
+OPERATORS = (
+    '...', '..=', '//=',
+    '..', '==', '~=', '<=', '>=', '//', '::', '+=', '-=', '*=', '/=', '%=', '^=', '<<', '>>',
+    '+', '-', '*', '/', '%', '^', '#', '&', '~', '|', '<', '>', '=',
+    '(', ')', '{', '}', '[', ']', ';', ':', ',', '.',
+)
+
+_NAME = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+_NUMBER = re.compile(
+    r'0[xX][0-9a-fA-F_]*(?:\.[0-9a-fA-F_]*)?(?:[pP][+-]?[0-9]+)?'
+    r'|0[bB][01_]+'
+    r'|(?:[0-9][0-9_]*\.?[0-9_]*|\.[0-9][0-9_]*)(?:[eE][+-]?[0-9]+)?'
+)
+_LONG_BRACKET = re.compile(r'\[(=*)\[')
+_WHITESPACE = re.compile(r'[ \t\r\n\f\v]+')
+_DIGITS = '0123456789'
+
+_SIMPLE_ESCAPES = {
+    'a': 7, 'b': 8, 'f': 12, 'n': 10, 'r': 13, 't': 9, 'v': 11,
+    '\\': 92, '"': 34, "'": 39, '\n': 10, '\r': 10,
+}
+
+
+class LuaSyntaxError(ValueError):
+    """The source could not be tokenized or parsed"""
+
+    def __init__(self, message: str, line: int):
+        super().__init__(f"line {line}: {message}")
+        self.message = message
+        self.line = line
+
+    def __reduce__(self):
+        # Raised in worker processes, so it has to survive pickling
+        return (self.__class__, (self.message, self.line))
+
+
+class Token(NamedTuple):
+    kind: str  # 'name', 'keyword', 'number', 'string', 'op' or 'eof'
+    text: str
+    line: int
+
+
+def tokenize(source: str) -> List[Token]:
+    """
+    Split Lua source into tokens
+
+    Returns:
+        The tokens, ending with an 'eof' token
+
+    Raises:
+        LuaSyntaxError: On unfinished strings/comments or malformed numbers
+    """
+    tokens: List[Token] = []
+    pos = 0
+    line = 1
+    n = len(source)
+    if source.startswith('#'):
+        # Shebang line
+        pos = source.find('\n')
+        pos = n if pos == -1 else pos
+
+    while pos < n:
+        char = source[pos]
+
+        match = _WHITESPACE.match(source, pos)
+        if match:
+            line += match.group().count('\n')
+            pos = match.end()
+            continue
+
+        if source.startswith('--', pos):
+            match = _LONG_BRACKET.match(source, pos + 2)
+            if match:
+                end = _find_long_end(source, match, line, "comment")
+            else:
+                end = source.find('\n', pos)
+                end = n if end == -1 else end
+            line += source.count('\n', pos, end)
+            pos = end
+            continue
+
+        match = _NAME.match(source, pos)
+        if match:
+            word = match.group()
+            tokens.append(Token('keyword' if word in KEYWORDS else 'name', word, line))
+            pos = match.end()
+            continue
+
+        if char in _DIGITS or (char == '.' and pos + 1 < n and source[pos + 1] in _DIGITS):
+            match = _NUMBER.match(source, pos)
+            end = match.end()
+            if end < n and (_NAME.match(source, end) or source[end] in _DIGITS or source[end] == '.'):
+                raise LuaSyntaxError(f"malformed number near {source[pos:end + 1]!r}", line)
+            tokens.append(Token('number', match.group(), line))
+            pos = end
+            continue
+
+        if char in '"\'':
+            end = _find_string_end(source, pos, line)
+            text = source[pos:end]
+            tokens.append(Token('string', text, line))
+            line += text.count('\n')
+            pos = end
+            continue
+
+        if char == '[':
+            match = _LONG_BRACKET.match(source, pos)
+            if match:
+                end = _find_long_end(source, match, line, "string")
+                text = source[pos:end]
+                tokens.append(Token('string', text, line))
+                line += text.count('\n')
+                pos = end
+                continue
+
+        for op in OPERATORS:
+            if source.startswith(op, pos):
+                tokens.append(Token('op', op, line))
+                pos += len(op)
+                break
+        else:
+            raise LuaSyntaxError(f"unexpected symbol {char!r}", line)
+
+    tokens.append(Token('eof', '', line))
+    return tokens
+
+
+def _find_long_end(source: str, match: Match[str], line: int, what: str) -> int:
+    closing = ']' + match.group(1) + ']'
+    end = source.find(closing, match.end())
+    if end == -1:
+        raise LuaSyntaxError(f"unfinished long {what}", line)
+    return end + len(closing)
+
+
+def _find_string_end(source: str, pos: int, line: int) -> int:
+    quote = source[pos]
+    i = pos + 1
+    n = len(source)
+    while i < n:
+        char = source[i]
+        if char == quote:
+            return i + 1
+        if char == '\\':
+            escape = source[i + 1:i + 2]
+            if escape == 'z':
+                match = _WHITESPACE.match(source, i + 2)
+                i = match.end() if match else i + 2
+            elif source.startswith('\r\n', i + 1):
+                i += 3
+            else:
+                i += 2
+            continue
+        if char == '\n':
+            break
+        i += 1
+    raise LuaSyntaxError("unfinished string", line)
+
+
+def string_value(token: Token) -> bytes:
+    """
+    Decode the value of a string token
+
+    Raises:
+        LuaSyntaxError: On invalid escape sequences
+    """
+    text = token.text
+    if text.startswith('['):
+        match = _LONG_BRACKET.match(text)
+        body = text[match.end():len(text) - len(match.group())]
+        # A newline right after the opening bracket is not part of the string
+        if body.startswith('\r\n'):
+            body = body[2:]
+        elif body.startswith('\n'):
+            body = body[1:]
+        return body.encode('utf-8')
+
+    body = text[1:-1]
+    out = bytearray()
+    i = 0
+    n = len(body)
+    while i < n:
+        char = body[i]
+        if char != '\\':
+            out += char.encode('utf-8')
+            i += 1
+            continue
+        i += 1
+        escape = body[i]
+        if escape in _SIMPLE_ESCAPES:
+            out.append(_SIMPLE_ESCAPES[escape])
+            i += 1
+            if escape == '\r' and body.startswith('\n', i):
+                i += 1
+        elif escape in _DIGITS:
+            digits = re.match(r'[0-9]{1,3}', body[i:]).group()
+            if int(digits) > 255:
+                raise LuaSyntaxError("decimal escape too large", token.line)
+            out.append(int(digits))
+            i += len(digits)
+        elif escape == 'x':
+            digits = body[i + 1:i + 3]
+            if not re.fullmatch(r'[0-9a-fA-F]{2}', digits):
+                raise LuaSyntaxError("hexadecimal digit expected", token.line)
+            out.append(int(digits, 16))
+            i += 3
+        elif escape == 'z':
+            # Skips the following whitespace, including line breaks
+            match = _WHITESPACE.match(body, i + 1)
+            i = match.end() if match else i + 1
+        elif escape == 'u':
+            match = re.match(r'\{([0-9a-fA-F]+)\}', body[i + 1:])
+            if not match or int(match.group(1), 16) > 0x10FFFF:
+                raise LuaSyntaxError("invalid unicode escape", token.line)
+            out += chr(int(match.group(1), 16)).encode('utf-8', 'surrogatepass')
+            i += 1 + match.end()
+        else:
+            raise LuaSyntaxError(f"invalid escape sequence '\\{escape}'", token.line)
+    return bytes(out)
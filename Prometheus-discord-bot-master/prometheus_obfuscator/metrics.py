@@ -0,0 +1,274 @@
+"""
+Metrics for the bot's obfuscation pipeline
+
+Counters and histograms are kept in memory and served in the Prometheus text
+exposition format on a local /metrics endpoint, so a Prometheus server (or a
+plain curl) can show where the time of an obfuscation goes:
+
+- obfuscator_stage_seconds{stage}: attachment download, queue wait, API call
+  and Discord upload
+- obfuscator_requests_total{preset,status}: finished obfuscations
+- obfuscator_input_bytes / obfuscator_output_bytes: script sizes
+- obfuscator_cache_total{result}: result cache hits and misses
+- obfuscator_errors_total{error_class}: failures by kind
+"""
+
+import bisect
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+
+from .config import get_setting
+
+# Defaults, overridable from prometheus_config.py
+DEFAULT_ENABLED = False
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 9108
+
+# Histogram buckets (upper bounds, +Inf is implicit)
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BYTES_BUCKETS = (1024, 4096, 16384, 40000, 131072, 524288, 2097152, 8388608)
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing count per label set"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(_Metric):
+    """
+    Current value read from a callback when the metrics are collected
+
+    With labels, the callback returns a dict of label values to value.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, func: Callable[[], Any], labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self.func = func
+
+    def _samples(self) -> List[str]:
+        if not self.label_names:
+            return [f"{self.name} {_format_value(self.func())}"]
+        return [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+            for key, value in sorted(self.func().items())
+        ]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = SECONDS_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> (per-bucket counts incl. +Inf, sum)
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def count(self, **labels: str) -> int:
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _format_labels(self.label_names + ('le',), key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total[0])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class PipelineMetrics:
+    """The metrics recorded by the obfuscation commands"""
+
+    def __init__(self):
+        self.stage_seconds = Histogram(
+            'obfuscator_stage_seconds', "Seconds spent per pipeline stage", ('stage',))
+        self.requests = Counter(
+            'obfuscator_requests_total', "Finished obfuscations by preset and status", ('preset', 'status'))
+        self.input_bytes = Histogram(
+            'obfuscator_input_bytes', "Size of submitted scripts", ('preset',), BYTES_BUCKETS)
+        self.output_bytes = Histogram(
+            'obfuscator_output_bytes', "Size of obfuscated scripts", ('preset',), BYTES_BUCKETS)
+        self.cache = Counter(
+            'obfuscator_cache_total', "Result cache lookups by result", ('result',))
+        self.errors = Counter(
+            'obfuscator_errors_total', "Failed obfuscations by error class", ('error_class',))
+        self.admission = Counter(
+            'obfuscator_admission_total', "Admission decisions by preset and action", ('preset', 'action'))
+        self.resubmissions = Counter(
+            'obfuscator_resubmissions_total', "Edited versions of earlier scripts by outcome", ('outcome',))
+        self._metrics: List[_Metric] = [
+            self.stage_seconds, self.requests, self.input_bytes,
+            self.output_bytes, self.cache, self.errors, self.admission,
+            self.resubmissions,
+        ]
+
+    def add_gauge(self, name: str, documentation: str, func: Callable[[], Any], labels: Sequence[str] = ()) -> None:
+        """Expose a value owned by another component, e.g. the queue depth"""
+        self._metrics.append(Gauge(name, documentation, func, labels))
+
+    @contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        """Record the duration of the block as one stage observation"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_seconds.observe(time.perf_counter() - start, stage=stage)
+
+    def record_success(self, preset: str, input_size: int, output_size: int, cached: bool) -> None:
+        self.requests.inc(preset=preset, status='ok')
+        self.input_bytes.observe(input_size, preset=preset)
+        self.output_bytes.observe(output_size, preset=preset)
+        self.cache.inc(result='hit' if cached else 'miss')
+
+    def record_error(self, preset: str, error_class: str) -> None:
+        self.requests.inc(preset=preset, status='error')
+        self.errors.inc(error_class=error_class)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    """Serves PipelineMetrics on GET /metrics"""
+
+    def __init__(self, metrics: PipelineMetrics, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        """
+        Initialize the server
+
+        Args:
+            metrics: Metrics to expose
+            host: Interface to listen on (local only by default)
+            port: TCP port to listen on
+        """
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    @classmethod
+    def from_config(cls, metrics: PipelineMetrics, port_offset: int = 0) -> Optional["MetricsServer"]:
+        """
+        Build the server from prometheus_config.py
+
+        Args:
+            metrics: Metrics to expose
+            port_offset: Added to the configured port, e.g. the shard
+                process index so each process gets its own port
+
+        Returns:
+            None if PROMETHEUS_METRICS_ENABLED is False
+        """
+        if not get_setting('PROMETHEUS_METRICS_ENABLED', DEFAULT_ENABLED):
+            return None
+        return cls(
+            metrics,
+            host=get_setting('PROMETHEUS_METRICS_HOST', DEFAULT_HOST),
+            port=get_setting('PROMETHEUS_METRICS_PORT', DEFAULT_PORT) + port_offset,
+        )
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        return web.Response(body=self.metrics.render().encode('utf-8'), headers={'Content-Type': CONTENT_TYPE})
+
+    async def start(self) -> None:
+        """Start listening (no-op if already started)"""
+        if self._runner is not None:
+            return
+        app = web.Application()
+        app.router.add_get('/metrics', self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def stop(self) -> None:
+        """Stop listening"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,101 @@
+"""
+In-memory preset registry implementing PROMETHEUS_CACHE_PRESETS
+
+The preset list is fetched from /presets once and served from memory. When
+PROMETHEUS_CACHE_DURATION expires, callers still get the cached list right
+away while a background task refreshes it. If the API cannot be reached the
+built-in preset list is used.
+"""
+
+import asyncio
+import time
+from typing import List, Optional
+
+from .aio import FALLBACK_PRESETS, AsyncPrometheusObfuscatorClient
+from .config import get_setting
+
+# Defaults, overridable from prometheus_config.py
+DEFAULT_CACHE_DURATION = 300
+# Failed refreshes are retried sooner than a full cache duration
+DEFAULT_RETRY_INTERVAL = 30
+
+
+class PresetRegistry:
+    """Cached list of the presets the API accepts"""
+
+    def __init__(
+        self,
+        client: AsyncPrometheusObfuscatorClient,
+        ttl: float = DEFAULT_CACHE_DURATION,
+        enabled: bool = True,
+    ):
+        """
+        Initialize the registry
+
+        Args:
+            client: Client used to fetch /presets
+            ttl: Seconds before the cached list is refreshed
+            enabled: False fetches the list on every call (no caching)
+        """
+        self.client = client
+        self.ttl = ttl
+        self.enabled = enabled
+        self._presets: List[str] = list(FALLBACK_PRESETS)
+        self._loaded = False
+        self._expires_at = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_config(cls, client: AsyncPrometheusObfuscatorClient) -> "PresetRegistry":
+        """Build the registry from prometheus_config.py"""
+        return cls(
+            client,
+            ttl=get_setting('PROMETHEUS_CACHE_DURATION', DEFAULT_CACHE_DURATION),
+            enabled=get_setting('PROMETHEUS_CACHE_PRESETS', True),
+        )
+
+    @property
+    def presets(self) -> List[str]:
+        """The current list without any I/O (built-in list until the first fetch)"""
+        return list(self._presets)
+
+    async def get(self) -> List[str]:
+        """
+        Get the preset list
+
+        Only the very first call (or every call with caching disabled) waits
+        for the API; afterwards an expired list triggers a background refresh.
+
+        Returns:
+            List of preset names
+        """
+        if not self.enabled or not self._loaded:
+            await self.refresh()
+        elif time.monotonic() >= self._expires_at:
+            self._schedule_refresh()
+        return self.presets
+
+    async def is_valid(self, preset: str) -> bool:
+        """Check a preset name against the cached list"""
+        return preset in await self.get()
+
+    async def refresh(self) -> List[str]:
+        """
+        Fetch /presets now
+
+        Returns:
+            The refreshed list, or the previous one if the fetch failed
+        """
+        result = await self.client.get_presets()
+        now = time.monotonic()
+        if "error" in result or result.get('fallback') or not result.get('presets'):
+            self._expires_at = now + min(self.ttl, DEFAULT_RETRY_INTERVAL)
+        else:
+            self._presets = list(result['presets'])
+            self._expires_at = now + self.ttl
+        self._loaded = True
+        return self.presets
+
+    def _schedule_refresh(self) -> None:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.ensure_future(self.refresh())
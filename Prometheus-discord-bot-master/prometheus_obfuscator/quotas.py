@@ -0,0 +1,290 @@
+"""
+Per-user and per-guild obfuscation quotas
+
+Every user and every guild has a token bucket of `quota` units that refills
+evenly over `period` seconds. A job costs its preset's weight (Strong more
+than Weak), and is charged against both the user's and the guild's bucket
+before it is queued (a single file before its attachment is even
+downloaded, a batch per Lua file it holds). A job that does not fit is
+refused with the exact time after which it would, so spamming
+`!obfuscate Strong` stops costing API capacity. A job that is rejected
+later without reaching the API (a syntax error, a full queue) is refunded.
+
+Buckets live in memory; with a state path they are loaded from SQLite on
+start and the units spent since then are merged into the file on close, so
+quotas survive restarts. Shard processes sharing the file only ever add
+their own spending to it, never overwrite what the others saved.
+"""
+
+import math
+import sqlite3
+import time
+from typing import Dict, Hashable, List, NamedTuple, Optional, Tuple
+
+from .config import get_setting
+
+# Defaults, overridable from prometheus_config.py
+DEFAULT_PERIOD = 600  # seconds for an empty bucket to refill
+DEFAULT_USER_QUOTA = 20
+DEFAULT_GUILD_QUOTA = 200
+DEFAULT_PRESET_WEIGHTS = {'Minify': 1, 'Weak': 1, 'Medium': 2, 'Strong': 4}
+
+# Full buckets are forgotten once more than this many are tracked
+MAX_BUCKETS = 100000
+
+
+class QuotaDecision(NamedTuple):
+    """Whether a job may run now"""
+
+    allowed: bool
+    retry_after: float  # seconds until the job would fit, 0 if allowed, inf if never
+    scope: Optional[str]  # 'user' or 'guild' when refused
+    message: Optional[str]  # for the user when refused
+
+
+class _Bucket:
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+
+def format_wait(seconds: float) -> str:
+    """Human readable wait, rounded up to the second (e.g. "3m 05s")"""
+    seconds = max(1, math.ceil(seconds))
+    minutes, seconds = divmod(seconds, 60)
+    if minutes >= 60:
+        hours, minutes = divmod(minutes, 60)
+        return f"{hours}h {minutes:02d}m"
+    if minutes:
+        return f"{minutes}m {seconds:02d}s"
+    return f"{seconds}s"
+
+
+class QuotaManager:
+    """Token bucket quotas keyed by user and guild"""
+
+    def __init__(
+        self,
+        user_quota: Optional[float] = DEFAULT_USER_QUOTA,
+        guild_quota: Optional[float] = DEFAULT_GUILD_QUOTA,
+        period: float = DEFAULT_PERIOD,
+        preset_weights: Optional[Dict[str, float]] = None,
+        guild_quotas: Optional[Dict[Hashable, Optional[float]]] = None,
+        state_path: Optional[str] = None,
+    ):
+        """
+        Initialize the quotas
+
+        Args:
+            user_quota: Units a user may spend per period, None for no limit
+            guild_quota: Units a guild may spend per period, None for no limit
+            period: Seconds for an empty bucket to refill completely
+            preset_weights: Units a job costs per preset (unknown presets
+                cost as much as Medium)
+            guild_quotas: Per-guild overrides of guild_quota
+            state_path: SQLite file the buckets are loaded from and saved
+                to, None to keep them in memory only
+        """
+        self.user_quota = user_quota
+        self.guild_quota = guild_quota
+        self.period = period
+        self.preset_weights = dict(DEFAULT_PRESET_WEIGHTS if preset_weights is None else preset_weights)
+        self.guild_quotas = dict(guild_quotas or {})
+        self.state_path = state_path
+        self._buckets: Dict[Tuple[str, Hashable], _Bucket] = {}
+        # Units spent (net of refunds) per bucket since the last save
+        self._spent: Dict[Tuple[str, Hashable], float] = {}
+        if state_path:
+            self._load()
+
+    @classmethod
+    def from_config(cls) -> "QuotaManager":
+        """Build the quotas from prometheus_config.py"""
+        return cls(
+            user_quota=get_setting('PROMETHEUS_USER_QUOTA', DEFAULT_USER_QUOTA),
+            guild_quota=get_setting('PROMETHEUS_GUILD_QUOTA', DEFAULT_GUILD_QUOTA),
+            period=get_setting('PROMETHEUS_QUOTA_PERIOD', DEFAULT_PERIOD),
+            preset_weights=get_setting('PROMETHEUS_QUOTA_PRESET_WEIGHTS', None),
+            guild_quotas=get_setting('PROMETHEUS_GUILD_QUOTAS', {}),
+            state_path=get_setting('PROMETHEUS_QUOTA_STATE_PATH', None),
+        )
+
+    def weight(self, preset: str) -> float:
+        return self.preset_weights.get(preset, self.preset_weights.get('Medium', 1))
+
+    def _quota(self, scope: str, key: Hashable) -> Optional[float]:
+        if scope == 'guild':
+            return self.guild_quotas.get(key, self.guild_quota)
+        return self.user_quota
+
+    def _scopes(self, user_id: Hashable, guild_id: Hashable) -> List[Tuple[str, Hashable, float]]:
+        """(scope, key, quota) of the buckets a job is charged against"""
+        scopes = []
+        for scope, key in (('user', user_id), ('guild', guild_id)):
+            if key is None:
+                continue  # DMs only count against the user
+            quota = self._quota(scope, key)
+            if quota is not None:
+                scopes.append((scope, key, quota))
+        return scopes
+
+    def _bucket(self, scope: str, key: Hashable, quota: float, now: float) -> _Bucket:
+        bucket = self._buckets.get((scope, key))
+        if bucket is None:
+            if len(self._buckets) >= MAX_BUCKETS:
+                # A bucket that refilled locally has refilled in the file too
+                for forgotten in self._forget_full(now):
+                    self._spent.pop(forgotten, None)
+            bucket = self._buckets[(scope, key)] = _Bucket(quota, now)
+        else:
+            bucket.tokens = min(quota, bucket.tokens + (now - bucket.updated) * quota / self.period)
+            bucket.updated = now
+        return bucket
+
+    def _forget_full(self, now: float) -> List[Tuple[str, Hashable]]:
+        """Drop the full buckets (a full bucket behaves exactly like a new one) and return their keys"""
+        forgotten = []
+        for (scope, key), bucket in list(self._buckets.items()):
+            quota = self._quota(scope, key)
+            if quota is None or bucket.tokens + (now - bucket.updated) * quota / self.period >= quota:
+                del self._buckets[(scope, key)]
+                forgotten.append((scope, key))
+        return forgotten
+
+    def take(self, user_id: Hashable, guild_id: Hashable, preset: str, count: int = 1) -> QuotaDecision:
+        """
+        Charge a job (or `count` jobs) if it fits both the user's and the guild's quota
+
+        Nothing is charged when the job is refused. A job costing more than a
+        whole quota (a big batch) is refused outright, it would never fit.
+
+        Args:
+            user_id: Requesting user
+            guild_id: Guild of the request, None in DMs
+            preset: Preset the job runs with, for its weight
+            count: Number of jobs, e.g. the files of a batch
+        """
+        now = time.monotonic()
+        cost = self.weight(preset) * count
+        charges = []
+        refused: Optional[Tuple[float, str]] = None
+        for scope, key, quota in self._scopes(user_id, guild_id):
+            if cost > quota:
+                whose = "your" if scope == 'user' else "this server's"
+                message = f"This request costs {cost:g} units, more than {whose} whole quota of {quota:g}"
+                return QuotaDecision(False, math.inf, scope, message)
+            bucket = self._bucket(scope, key, quota, now)
+            if bucket.tokens < cost:
+                wait = (cost - bucket.tokens) * self.period / quota
+                if refused is None or wait > refused[0]:
+                    refused = (wait, scope)
+            charges.append((scope, key, bucket))
+
+        if refused is not None:
+            wait, scope = refused
+            who = "You have" if scope == 'user' else "This server has"
+            message = f"{who} used up the obfuscation quota, try again in {format_wait(wait)}"
+            return QuotaDecision(False, wait, scope, message)
+        for scope, key, bucket in charges:
+            bucket.tokens -= cost
+            self._spent[(scope, key)] = self._spent.get((scope, key), 0) + cost
+        return QuotaDecision(True, 0.0, None, None)
+
+    def refund(self, user_id: Hashable, guild_id: Hashable, preset: str, count: int = 1) -> None:
+        """
+        Give back what take() charged for a job that never reached the API
+
+        For jobs refused after they were charged (a syntax error, a full
+        queue), so a rejected request does not cost quota. Buckets are never
+        refilled beyond their quota.
+        """
+        now = time.monotonic()
+        cost = self.weight(preset) * count
+        for scope, key, quota in self._scopes(user_id, guild_id):
+            bucket = self._bucket(scope, key, quota, now)
+            refunded = min(quota, bucket.tokens + cost) - bucket.tokens
+            bucket.tokens += refunded
+            self._spent[(scope, key)] = self._spent.get((scope, key), 0) - refunded
+
+    def remaining(self, user_id: Hashable, guild_id: Hashable) -> Dict[str, Tuple[float, float]]:
+        """scope -> (units left, quota) for the limited scopes of a user and guild"""
+        now = time.monotonic()
+        return {
+            scope: (self._bucket(scope, key, quota, now).tokens, quota)
+            for scope, key, quota in self._scopes(user_id, guild_id)
+        }
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.state_path)
+        db.execute(
+            'CREATE TABLE IF NOT EXISTS quota_buckets ('
+            'scope TEXT NOT NULL, key TEXT NOT NULL, tokens REAL NOT NULL, updated REAL NOT NULL, '
+            'PRIMARY KEY (scope, key))'
+        )
+        return db
+
+    def _load(self) -> None:
+        db = self._connect()
+        try:
+            rows = db.execute('SELECT scope, key, tokens, updated FROM quota_buckets').fetchall()
+        finally:
+            db.close()
+        # Saved with wall clock times, the buckets run on the monotonic clock
+        offset = time.monotonic() - time.time()
+        for scope, key, tokens, updated in rows:
+            key = int(key) if key.isdigit() else key  # Discord IDs
+            self._buckets[(scope, key)] = _Bucket(tokens, updated + offset)
+
+    def save(self) -> None:
+        """
+        Merge the units spent since the last save into the state file, if configured
+
+        Shard processes share the file, so each touched row is read, refilled
+        to now and charged this process's spending, all in one transaction;
+        rows this process did not touch are left alone. The merged values are
+        taken over in memory, so spending saved by other processes counts
+        here too.
+        """
+        if not self.state_path or not self._spent:
+            return
+        now = time.time()
+        offset = time.monotonic() - now
+        merged = []
+        db = self._connect()
+        try:
+            with db:
+                # Lock the file for writing before reading, so no other
+                # process saves in between
+                db.execute('BEGIN IMMEDIATE')
+                for (scope, key), spent in self._spent.items():
+                    quota = self._quota(scope, key)
+                    if quota is None:
+                        continue
+                    row = db.execute(
+                        'SELECT tokens, updated FROM quota_buckets WHERE scope = ? AND key = ?', (scope, str(key))
+                    ).fetchone()
+                    tokens = quota if row is None else min(quota, row[0] + (now - row[1]) * quota / self.period)
+                    tokens = min(quota, tokens - spent)
+                    if tokens >= quota:
+                        # A full bucket behaves exactly like a missing one
+                        db.execute('DELETE FROM quota_buckets WHERE scope = ? AND key = ?', (scope, str(key)))
+                    else:
+                        db.execute(
+                            'INSERT INTO quota_buckets (scope, key, tokens, updated) VALUES (?, ?, ?, ?) '
+                            'ON CONFLICT (scope, key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated',
+                            (scope, str(key), tokens, now)
+                        )
+                    merged.append((scope, key, tokens))
+        finally:
+            db.close()
+        self._spent.clear()
+        for scope, key, tokens in merged:
+            self._buckets[(scope, key)] = _Bucket(tokens, now + offset)
+
+    def close(self) -> None:
+        self.save()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
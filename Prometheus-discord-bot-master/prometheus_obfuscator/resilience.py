@@ -0,0 +1,269 @@
+"""
+Retry, deadline and circuit breaker policy for API calls
+
+Loads PROMETHEUS_MAX_RETRIES, PROMETHEUS_RETRY_DELAY, PROMETHEUS_API_TIMEOUT
+and PROMETHEUS_FALLBACK_ENABLED from prometheus_config.py. Every client call
+goes through ResiliencePolicy.call() (async) or call_sync() (blocking):
+
+- transient failures are retried with jittered exponential backoff
+- each endpoint has a total deadline that also bounds the retries
+- after repeated failures the circuit opens and calls fail immediately
+  until the reset timeout has passed
+"""
+
+import asyncio
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .config import get_setting
+
+# Defaults, overridable from prometheus_config.py
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_RETRY_DELAY = 1.0
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_MAX_DELAY = 10.0
+DEFAULT_ENDPOINT_DEADLINES = {
+    '/health': 5.0,
+    '/presets': 5.0,
+}
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30.0
+
+
+class TransientError(Exception):
+    """A failure worth retrying (connection error, timeout, 502/503/504)"""
+
+    def __init__(self, message: str, trips_breaker: bool = True):
+        super().__init__(message)
+        # False when the failure is local to one of several API instances
+        self.trips_breaker = trips_breaker
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the API while the circuit breaker is open"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"API unavailable, retrying in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Fails fast after consecutive failures, then lets one trial call through"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(
+        self,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        reset_timeout: float = DEFAULT_RESET_TIMEOUT,
+    ):
+        """
+        Initialize the breaker
+
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds to wait before allowing a trial call
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self._state = self.CLOSED
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """Current state, moving from open to half-open once the timeout passes"""
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._trial_running = False
+        return self._state
+
+    def before_call(self) -> bool:
+        """
+        Check whether a call may proceed
+
+        Returns:
+            True if the call is the half-open trial, which the caller must
+            end with record_success(), record_failure() or abort_call()
+
+        Raises:
+            CircuitOpenError: If the circuit is open or a trial is already running
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return False
+            if state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            retry_after = max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+            raise CircuitOpenError(retry_after)
+
+    def abort_call(self) -> None:
+        """Release a half-open trial that ended without a verdict (only call it from the trial)"""
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self) -> None:
+        """Close the circuit after a successful call"""
+        with self._lock:
+            self.failures = 0
+            self._state = self.CLOSED
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        """Count a failure and open the circuit once the threshold is reached"""
+        with self._lock:
+            self.failures += 1
+            if self._state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._trial_running = False
+
+
+class ResiliencePolicy:
+    """Retries, per-endpoint deadlines and a circuit breaker for one API"""
+
+    def __init__(
+        self,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        retry_delay: float = DEFAULT_RETRY_DELAY,
+        timeout: float = DEFAULT_TIMEOUT,
+        endpoint_deadlines: Optional[Dict[str, float]] = None,
+        fallback_enabled: bool = True,
+        breaker: Optional[CircuitBreaker] = None,
+        max_delay: float = DEFAULT_MAX_DELAY,
+    ):
+        """
+        Initialize the policy
+
+        Args:
+            max_retries: Retries after the first attempt
+            retry_delay: Base delay for the exponential backoff, in seconds
+            timeout: Deadline for endpoints without an explicit entry
+            endpoint_deadlines: Total deadline per endpoint path, in seconds
+            fallback_enabled: Whether callers may fall back to built-in behaviour
+            breaker: Circuit breaker shared by all endpoints
+            max_delay: Upper bound for a single backoff sleep
+        """
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+        self.endpoint_deadlines = dict(DEFAULT_ENDPOINT_DEADLINES if endpoint_deadlines is None else endpoint_deadlines)
+        self.fallback_enabled = fallback_enabled
+        self.breaker = breaker or CircuitBreaker()
+        self.max_delay = max_delay
+
+    @classmethod
+    def from_config(cls) -> "ResiliencePolicy":
+        """Build the policy from prometheus_config.py"""
+        return cls(
+            max_retries=get_setting('PROMETHEUS_MAX_RETRIES', DEFAULT_MAX_RETRIES),
+            retry_delay=get_setting('PROMETHEUS_RETRY_DELAY', DEFAULT_RETRY_DELAY),
+            timeout=get_setting('PROMETHEUS_API_TIMEOUT', DEFAULT_TIMEOUT),
+            endpoint_deadlines=get_setting('PROMETHEUS_ENDPOINT_DEADLINES', DEFAULT_ENDPOINT_DEADLINES),
+            fallback_enabled=get_setting('PROMETHEUS_FALLBACK_ENABLED', True),
+            breaker=CircuitBreaker(
+                failure_threshold=get_setting('PROMETHEUS_CIRCUIT_FAILURE_THRESHOLD', DEFAULT_FAILURE_THRESHOLD),
+                reset_timeout=get_setting('PROMETHEUS_CIRCUIT_RESET_TIMEOUT', DEFAULT_RESET_TIMEOUT),
+            ),
+        )
+
+    def deadline(self, endpoint: str) -> float:
+        """Total time budget for one call to an endpoint"""
+        return self.endpoint_deadlines.get(endpoint, self.timeout)
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff before retry number `attempt` (0-based)"""
+        return random.uniform(0, min(self.max_delay, self.retry_delay * (2 ** attempt)))
+
+    async def call(self, endpoint: str, attempt: Callable[[float], Awaitable[Any]]) -> Any:
+        """
+        Run an async call under the policy
+
+        Args:
+            endpoint: Endpoint path, used to pick the deadline
+            attempt: Coroutine function taking the per-attempt timeout; it
+                raises TransientError for failures that should be retried
+
+        Returns:
+            Whatever the successful attempt returned
+
+        Raises:
+            CircuitOpenError: If the circuit is open
+            TransientError: If every attempt failed or the deadline ran out
+        """
+        give_up_at = time.monotonic() + self.deadline(endpoint)
+        retry = 0
+        while True:
+            trial = self.breaker.before_call()
+            remaining = give_up_at - time.monotonic()
+            try:
+                result = await attempt(remaining)
+            except TransientError as e:
+                if e.trips_breaker:
+                    self.breaker.record_failure()
+                elif trial:
+                    # No verdict on the API as a whole, but the half-open trial must end
+                    self.breaker.abort_call()
+                delay = self._next_delay(retry, give_up_at)
+                if delay is None:
+                    raise
+                retry += 1
+                await asyncio.sleep(delay)
+            except BaseException:
+                # E.g. cancelled; other calls leave a trial running meanwhile alone
+                if trial:
+                    self.breaker.abort_call()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+
+    def call_sync(self, endpoint: str, attempt: Callable[[float], Any]) -> Any:
+        """Blocking version of call() for the synchronous client"""
+        give_up_at = time.monotonic() + self.deadline(endpoint)
+        retry = 0
+        while True:
+            trial = self.breaker.before_call()
+            remaining = give_up_at - time.monotonic()
+            try:
+                result = attempt(remaining)
+            except TransientError as e:
+                if e.trips_breaker:
+                    self.breaker.record_failure()
+                elif trial:
+                    # No verdict on the API as a whole, but the half-open trial must end
+                    self.breaker.abort_call()
+                delay = self._next_delay(retry, give_up_at)
+                if delay is None:
+                    raise
+                retry += 1
+                time.sleep(delay)
+            except BaseException:
+                # E.g. cancelled; other calls leave a trial running meanwhile alone
+                if trial:
+                    self.breaker.abort_call()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+
+    def _next_delay(self, retry: int, give_up_at: float) -> Optional[float]:
+        """Backoff before the next retry, or None if we should give up"""
+        if retry >= self.max_retries:
+            return None
+        delay = self.backoff(retry)
+        if time.monotonic() + delay >= give_up_at:
+            return None
+        return delay
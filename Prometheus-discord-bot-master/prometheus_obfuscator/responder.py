@@ -0,0 +1,170 @@
+"""
+Rate-limit-aware scheduling of chat responses
+
+Discord limits message sends and edits per channel (roughly 5 per 5
+seconds). Under bursts every job's processing message, queue position
+edits and result compete for that budget, and the library serializes the
+overflow behind 429 sleeps. The scheduler keeps a token bucket per route
+(e.g. channel) and paces calls itself:
+
+- status updates are merged per message: only the latest state of a
+  message is ever sent, intermediate ones are dropped
+- final responses go ahead of pending status updates, and cancel the
+  pending update of the message they replace
+
+It is not tied to discord.py, calls are plain coroutine factories.
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from .config import get_setting
+
+# Defaults, overridable from prometheus_config.py
+DEFAULT_RATE = 5  # calls per route...
+DEFAULT_PER = 5.0  # ...per this many seconds
+
+# Idle routes are forgotten once more than this many are tracked
+MAX_IDLE_ROUTES = 256
+
+Call = Callable[[], Awaitable[Any]]
+
+
+class _Route:
+    """Token bucket and pending status updates of one route"""
+
+    def __init__(self, rate: int):
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+        self.pending: Dict[Hashable, Call] = {}
+        self.urgent = 0  # final responses waiting for a token
+        self.task: Optional[asyncio.Task] = None
+        self.in_flight: Optional[Hashable] = None  # key of the update being sent
+        self.done = asyncio.Event()  # set when that update finished
+
+
+class ResponseScheduler:
+    """Paces responses per route and merges status updates"""
+
+    def __init__(self, rate: int = DEFAULT_RATE, per: float = DEFAULT_PER):
+        """
+        Initialize the scheduler
+
+        Args:
+            rate: Calls allowed per route in `per` seconds
+            per: Length of the rate window in seconds
+        """
+        self.rate = rate
+        self.per = per
+        self._routes: Dict[Hashable, _Route] = {}
+        self.sent = 0
+        self.dropped = 0  # status updates superseded before they were sent
+
+    @classmethod
+    def from_config(cls) -> "ResponseScheduler":
+        """Build the scheduler from prometheus_config.py"""
+        return cls(
+            rate=get_setting('PROMETHEUS_RESPONSE_RATE', DEFAULT_RATE),
+            per=get_setting('PROMETHEUS_RESPONSE_PER', DEFAULT_PER),
+        )
+
+    def _route(self, route: Hashable) -> _Route:
+        state = self._routes.get(route)
+        if state is None:
+            if len(self._routes) >= MAX_IDLE_ROUTES:
+                self._forget_idle()
+            state = self._routes[route] = _Route(self.rate)
+        return state
+
+    def _forget_idle(self) -> None:
+        # A route with a full bucket and nothing waiting or being sent behaves
+        # like a new one (a new one would not know to wait for the edit in flight)
+        for route, state in list(self._routes.items()):
+            self._refill(state)
+            if state.tokens >= self.rate and not state.pending and not state.urgent and state.in_flight is None:
+                del self._routes[route]
+
+    def _refill(self, state: _Route) -> None:
+        now = time.monotonic()
+        state.tokens = min(self.rate, state.tokens + (now - state.updated) * self.rate / self.per)
+        state.updated = now
+
+    async def _acquire(self, state: _Route, urgent: bool) -> None:
+        if urgent:
+            state.urgent += 1
+        try:
+            while True:
+                self._refill(state)
+                if state.tokens >= 1 and (urgent or not state.urgent):
+                    state.tokens -= 1
+                    return
+                # Wait for the next token (status updates re-check after
+                # the final responses ahead of them took theirs)
+                wait = max(0.0, (1 - state.tokens) * self.per / self.rate)
+                await asyncio.sleep(wait or self.per / self.rate)
+        finally:
+            if urgent:
+                state.urgent -= 1
+
+    async def send(self, route: Hashable, call: Call, replaces: Hashable = None) -> Any:
+        """
+        Run a final response as soon as the route's budget allows
+
+        Args:
+            route: Rate limit bucket, e.g. the channel ID
+            call: Makes the API call, e.g. `lambda: message.edit(...)`
+            replaces: Key of a status update this response makes obsolete
+
+        Returns:
+            The result of the call
+        """
+        state = self._route(route)
+        if replaces is not None:
+            if state.pending.pop(replaces, None) is not None:
+                self.dropped += 1
+            if state.in_flight == replaces:
+                # Never let a late status edit overwrite the final response
+                await state.done.wait()
+        await self._acquire(state, urgent=True)
+        self.sent += 1
+        return await call()
+
+    def update(self, route: Hashable, key: Hashable, call: Call) -> None:
+        """
+        Queue a status update, replacing any pending one with the same key
+
+        Args:
+            route: Rate limit bucket, e.g. the channel ID
+            key: What is being updated, e.g. the message ID
+            call: Makes the API call for this state
+        """
+        state = self._route(route)
+        if state.pending.pop(key, None) is not None:
+            self.dropped += 1
+        state.pending[key] = call
+        if state.task is None or state.task.done():
+            state.task = asyncio.create_task(self._flush(state))
+
+    async def _flush(self, state: _Route) -> None:
+        while state.pending:
+            await self._acquire(state, urgent=False)
+            if not state.pending:
+                # Everything was superseded by final responses meanwhile
+                state.tokens += 1
+                break
+            key = next(iter(state.pending))
+            call = state.pending.pop(key)
+            self.sent += 1
+            state.in_flight = key
+            state.done.clear()
+            try:
+                await call()
+            except Exception as e:
+                print(f"Status update failed: {e}")
+            finally:
+                state.in_flight = None
+                state.done.set()
+
+    def stats(self) -> Dict[str, int]:
+        return {'sent': self.sent, 'dropped': self.dropped, 'routes': len(self._routes)}
@@ -0,0 +1,302 @@
+"""
+Bounded, fair job scheduler for obfuscation commands
+
+At most `concurrency` jobs run against the API at once; the rest wait in a
+bounded queue. Waiting jobs are dispatched round-robin across guilds and,
+within a guild, across users, so one busy server or user cannot starve the
+others. A full queue rejects new jobs immediately instead of letting every
+request time out together.
+
+Jobs marked heavy (see analysis.preflight) may only take `max_heavy` of the
+slots, so a burst of big Strong jobs cannot hold up the small ones.
+
+A job can replace a waiting job of the same user (e.g. an older version of
+the same script): it takes over that job's place in the queue, and the
+replaced job never runs.
+"""
+
+import asyncio
+import itertools
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional
+
+from .config import get_setting
+
+# Defaults, overridable from prometheus_config.py
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_QUEUE = 50
+DEFAULT_MAX_PER_USER = 3
+DEFAULT_MAX_HEAVY = None  # half the concurrency, at least 1
+
+PositionCallback = Callable[[int], Awaitable[None]]
+
+
+class QueueFullError(Exception):
+    """Raised by submit() when a job cannot be queued"""
+
+    def __init__(self, message: str, scope: str):
+        super().__init__(message)
+        self.scope = scope  # "queue" or "user"
+
+
+class JobSupersededError(Exception):
+    """Raised by submit() for a waiting job that was replaced by a newer one"""
+
+
+class _Job:
+    __slots__ = ('id', 'key', 'func', 'user_id', 'guild_id', 'heavy', 'future', 'on_position', 'position')
+
+    def __init__(self, job_id: int, key: Hashable, func: Callable[[], Awaitable[Any]], user_id: Hashable,
+                 guild_id: Hashable, heavy: bool, on_position: Optional[PositionCallback]):
+        self.id = job_id
+        self.key = key
+        self.heavy = heavy
+        self.func = func
+        self.user_id = user_id
+        self.guild_id = guild_id
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.on_position = on_position
+        self.position = 0
+
+
+class JobScheduler:
+    """Runs submitted coroutines with bounded concurrency and fair queueing"""
+
+    def __init__(
+        self,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+        max_per_user: int = DEFAULT_MAX_PER_USER,
+        max_heavy: Optional[int] = DEFAULT_MAX_HEAVY,
+    ):
+        """
+        Initialize the scheduler
+
+        Args:
+            concurrency: Jobs allowed to run at the same time
+            max_queue: Jobs allowed to wait; more are rejected
+            max_per_user: Jobs one user may have queued or running
+            max_heavy: Heavy jobs allowed to run at the same time, half of
+                concurrency (at least 1) when omitted
+        """
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_per_user = max_per_user
+        self.max_heavy = max_heavy if max_heavy is not None else max(1, concurrency // 2)
+
+        # guild -> user -> waiting jobs, both levels rotated for round-robin
+        self._queues: "OrderedDict[Hashable, OrderedDict[Hashable, Deque[_Job]]]" = OrderedDict()
+        self._queued = 0
+        self._running = 0
+        self._running_heavy = 0
+        self._per_user: Dict[Hashable, int] = {}
+        self._ids = itertools.count(1)
+
+    @classmethod
+    def from_config(cls) -> "JobScheduler":
+        """Build the scheduler from prometheus_config.py"""
+        return cls(
+            concurrency=get_setting('PROMETHEUS_MAX_CONCURRENT_JOBS', DEFAULT_CONCURRENCY),
+            max_queue=get_setting('PROMETHEUS_MAX_QUEUE_DEPTH', DEFAULT_MAX_QUEUE),
+            max_per_user=get_setting('PROMETHEUS_MAX_JOBS_PER_USER', DEFAULT_MAX_PER_USER),
+            max_heavy=get_setting('PROMETHEUS_MAX_HEAVY_JOBS', DEFAULT_MAX_HEAVY),
+        )
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @property
+    def running_heavy(self) -> int:
+        return self._running_heavy
+
+    async def submit(
+        self,
+        func: Callable[[], Awaitable[Any]],
+        user_id: Hashable = None,
+        guild_id: Hashable = None,
+        on_position: Optional[PositionCallback] = None,
+        heavy: bool = False,
+        key: Hashable = None,
+        replaces: Hashable = None,
+    ) -> Any:
+        """
+        Run a job once a slot is free
+
+        Args:
+            func: Coroutine function doing the actual work
+            user_id: Submitting user, for per-user limits and fairness
+            guild_id: Guild the job came from, for fairness
+            on_position: Awaited with the queue position (1 = next) whenever it
+                changes while waiting, and with 0 when a waiting job starts
+            heavy: Counts against max_heavy while running
+            key: Identifies the job for a later `replaces`, e.g. the filename
+            replaces: Key of a waiting job of the same user and guild to
+                replace; this job takes its place in the queue
+
+        Returns:
+            Whatever func returned
+
+        Raises:
+            QueueFullError: If the queue or the user's share of it is full
+            JobSupersededError: If the job was replaced while waiting
+        """
+        previous = self._find_waiting(user_id, guild_id, replaces) if replaces is not None else None
+        job = _Job(next(self._ids), key, func, user_id, guild_id, heavy, on_position)
+        if previous is not None:
+            # Same user, so the per-user count and the queue depth stay as they are
+            jobs = self._queues[guild_id][user_id]
+            jobs[jobs.index(previous)] = job
+            job.position = previous.position
+            if job.position:
+                self._notify(job, job.position)
+            previous.future.set_exception(JobSupersededError("Replaced by a newer version"))
+            return await self._wait(job)
+
+        if self._per_user.get(user_id, 0) >= self.max_per_user:
+            raise QueueFullError(
+                f"You already have {self.max_per_user} obfuscations in progress", 'user'
+            )
+        # Heavy jobs may have to wait while slots are free, so check whether
+        # the job starts, not whether slots are taken
+        starts = self._running < self.concurrency and self._can_start(job)
+        if not starts and self._queued >= self.max_queue:
+            raise QueueFullError("The obfuscation queue is full, please try again shortly", 'queue')
+
+        self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+
+        if starts:
+            self._start(job)
+        else:
+            self._queues.setdefault(guild_id, OrderedDict()).setdefault(user_id, deque()).append(job)
+            self._queued += 1
+            self._notify_positions()
+        return await self._wait(job)
+
+    async def _wait(self, job: _Job) -> Any:
+        try:
+            return await asyncio.shield(job.future)
+        except asyncio.CancelledError:
+            self._cancel(job)
+            raise
+
+    def _find_waiting(self, user_id: Hashable, guild_id: Hashable, key: Hashable) -> Optional[_Job]:
+        users = self._queues.get(guild_id)
+        jobs = users.get(user_id) if users else None
+        return next((job for job in jobs if job.key == key), None) if jobs else None
+
+    def _can_start(self, job: _Job) -> bool:
+        return not job.heavy or self._running_heavy < self.max_heavy
+
+    def _start(self, job: _Job) -> None:
+        self._running += 1
+        if job.heavy:
+            self._running_heavy += 1
+        if job.position:
+            job.position = 0
+            self._notify(job, 0)
+        asyncio.ensure_future(self._run(job))
+
+    async def _run(self, job: _Job) -> None:
+        try:
+            result = await job.func()
+        except BaseException as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._running -= 1
+            if job.heavy:
+                self._running_heavy -= 1
+            self._release_user(job.user_id)
+            self._dispatch()
+
+    def _dispatch(self) -> None:
+        dispatched = False
+        while self._running < self.concurrency and self._queued:
+            job = self._pop_next()
+            if job is None:
+                break  # only heavy jobs wait and their slots are taken
+            self._start(job)
+            dispatched = True
+        if dispatched:
+            self._notify_positions()
+
+    def _pop_next(self) -> Optional[_Job]:
+        """Take the next job that may start, in round-robin order"""
+        for guild_id, users in self._queues.items():
+            for user_id, jobs in users.items():
+                job = next((job for job in jobs if self._can_start(job)), None)
+                if job is None:
+                    continue
+                jobs.remove(job)
+                self._queued -= 1
+
+                # Rotate: this user goes to the back of the guild, the guild to the back of the queue
+                del users[user_id]
+                if jobs:
+                    users[user_id] = jobs
+                del self._queues[guild_id]
+                if users:
+                    self._queues[guild_id] = users
+                return job
+        return None
+
+    def _order(self) -> List[_Job]:
+        """Waiting jobs in the order _pop_next() would dispatch them"""
+        guilds = [[deque(jobs) for jobs in users.values()] for users in self._queues.values()]
+        order = []
+        while guilds:
+            users = guilds.pop(0)
+            jobs = users.pop(0)
+            order.append(jobs.popleft())
+            if jobs:
+                users.append(jobs)
+            if users:
+                guilds.append(users)
+        return order
+
+    def _notify_positions(self) -> None:
+        for position, job in enumerate(self._order(), start=1):
+            if job.position != position:
+                job.position = position
+                self._notify(job, position)
+
+    def _notify(self, job: _Job, position: int) -> None:
+        if job.on_position is not None:
+            asyncio.ensure_future(_safe_callback(job.on_position, position))
+
+    def _cancel(self, job: _Job) -> None:
+        """Drop a job whose submitter went away before it started"""
+        users = self._queues.get(job.guild_id)
+        jobs = users.get(job.user_id) if users else None
+        if jobs is None or job not in jobs:
+            return  # already running; it finishes and releases its slot itself
+        jobs.remove(job)
+        self._queued -= 1
+        if not jobs:
+            del users[job.user_id]
+        if not users:
+            del self._queues[job.guild_id]
+        self._release_user(job.user_id)
+        self._notify_positions()
+
+    def _release_user(self, user_id: Hashable) -> None:
+        remaining = self._per_user.get(user_id, 0) - 1
+        if remaining > 0:
+            self._per_user[user_id] = remaining
+        else:
+            self._per_user.pop(user_id, None)
+
+
+async def _safe_callback(callback: PositionCallback, position: int) -> None:
+    try:
+        await callback(position)
+    except Exception as e:
+        print(f"Queue position update failed: {e}")
@@ -0,0 +1,250 @@
+"""
+Running the bot as several shard processes
+
+Discord splits a bot's guilds into shards; discord.py's AutoShardedBot runs
+any set of them in one process. ShardRunner spreads the shards over several
+OS processes, so gateway events and API responses are handled on all cores:
+
+- every process gets a contiguous range of shard IDs through environment
+  variables (see ShardAssignment.from_env)
+- processes are started staggered to respect Discord's identify rate limit,
+  and restarted with backoff when they crash
+- they share state through SQLite files in WAL mode: the disk tier of the
+  result cache and the job journal
+- each process serves its own /metrics on PROMETHEUS_METRICS_PORT plus its
+  process index
+"""
+
+import asyncio
+import multiprocessing
+import os
+import signal
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import aiohttp
+
+from .config import get_setting
+
+GATEWAY_BOT_URL = "https://discord.com/api/v10/gateway/bot"
+
+# Discord allows `max_concurrency` identifies per this many seconds
+IDENTIFY_INTERVAL = 5.0
+
+# Restart backoff for crashed processes
+RESTART_DELAY = 5.0
+MAX_RESTART_DELAY = 300.0
+
+_ENV_SHARD_IDS = 'PROMETHEUS_SHARD_IDS'
+_ENV_SHARD_COUNT = 'PROMETHEUS_SHARD_COUNT'
+_ENV_PROCESS_INDEX = 'PROMETHEUS_PROCESS_INDEX'
+
+
+def shard_for_guild(guild_id: Optional[int], shard_count: int) -> int:
+    """Shard receiving a guild's events (DMs go to shard 0)"""
+    if guild_id is None:
+        return 0
+    return (guild_id >> 22) % shard_count
+
+
+def split_shards(shard_count: int, processes: int) -> List[List[int]]:
+    """Split shard IDs into contiguous, nearly equal ranges, one per process"""
+    processes = max(1, min(processes, shard_count))
+    base, extra = divmod(shard_count, processes)
+    ranges = []
+    start = 0
+    for index in range(processes):
+        size = base + (1 if index < extra else 0)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return ranges
+
+
+class ShardAssignment(NamedTuple):
+    """The shards one process runs"""
+
+    shard_ids: Optional[List[int]]  # None: all shards (single process)
+    shard_count: Optional[int]  # None: as recommended by Discord
+    process_index: int
+
+    @classmethod
+    def from_env(cls) -> "ShardAssignment":
+        """The assignment passed by ShardRunner, or all shards when run directly"""
+        shard_ids = os.environ.get(_ENV_SHARD_IDS)
+        shard_count = os.environ.get(_ENV_SHARD_COUNT)
+        return cls(
+            shard_ids=[int(shard) for shard in shard_ids.split(',')] if shard_ids else None,
+            shard_count=int(shard_count) if shard_count else None,
+            process_index=int(os.environ.get(_ENV_PROCESS_INDEX, 0)),
+        )
+
+    def to_env(self) -> Dict[str, str]:
+        env = {_ENV_PROCESS_INDEX: str(self.process_index)}
+        if self.shard_ids is not None:
+            env[_ENV_SHARD_IDS] = ','.join(str(shard) for shard in self.shard_ids)
+        if self.shard_count is not None:
+            env[_ENV_SHARD_COUNT] = str(self.shard_count)
+        return env
+
+    def owns(self, guild_id: Optional[int]) -> bool:
+        """Whether this process receives the guild's events"""
+        if self.shard_ids is None or self.shard_count is None:
+            return True
+        return shard_for_guild(guild_id, self.shard_count) in self.shard_ids
+
+
+async def recommended_shards(token: str) -> Tuple[int, int]:
+    """
+    Ask Discord how many shards the bot should run
+
+    Returns:
+        (shard count, identify max_concurrency)
+    """
+    headers = {'Authorization': f"Bot {token}"}
+    async with aiohttp.ClientSession() as session:
+        async with session.get(GATEWAY_BOT_URL, headers=headers) as response:
+            response.raise_for_status()
+            data = await response.json()
+    return data['shards'], data.get('session_start_limit', {}).get('max_concurrency', 1)
+
+
+def _run_process(target: Callable[[], None], env: Dict[str, str]) -> None:
+    os.environ.update(env)
+    target()
+
+
+class ShardRunner:
+    """Starts and supervises one process per shard range"""
+
+    def __init__(
+        self,
+        target: Callable[[], None],
+        shard_count: int,
+        processes: int,
+        max_concurrency: int = 1,
+    ):
+        """
+        Initialize the runner
+
+        Args:
+            target: Picklable function that runs the bot, called in each
+                process after the shard assignment is in the environment
+            shard_count: Total number of shards
+            processes: Number of processes to spread them over
+            max_concurrency: Shards Discord lets identify at once
+        """
+        self.target = target
+        self.shard_count = shard_count
+        self.max_concurrency = max_concurrency
+        self.assignments = [
+            ShardAssignment(shard_ids, shard_count, index)
+            for index, shard_ids in enumerate(split_shards(shard_count, processes))
+        ]
+        # Spawned children import the bot fresh instead of inheriting state
+        self._context = multiprocessing.get_context('spawn')
+        self._processes: Dict[int, multiprocessing.process.BaseProcess] = {}
+        self._stopping = False
+
+    @classmethod
+    def from_config(
+        cls,
+        target: Callable[[], None],
+        token: str,
+        processes: Optional[int] = None,
+        shard_count: Optional[int] = None,
+    ) -> "ShardRunner":
+        """
+        Build the runner from prometheus_config.py
+
+        Args:
+            target: See __init__
+            token: Bot token, to ask Discord for the shard count
+            processes: Overrides PROMETHEUS_SHARD_PROCESSES
+            shard_count: Overrides PROMETHEUS_SHARD_COUNT
+
+        The shard count is asked from Discord when neither is set.
+        """
+        if shard_count is None:
+            shard_count = get_setting('PROMETHEUS_SHARD_COUNT', None)
+        max_concurrency = 1
+        if shard_count is None:
+            shard_count, max_concurrency = asyncio.run(recommended_shards(token))
+        if processes is None:
+            processes = get_setting('PROMETHEUS_SHARD_PROCESSES', None) or os.cpu_count() or 1
+        return cls(target, shard_count=shard_count, processes=processes, max_concurrency=max_concurrency)
+
+    def _start(self, assignment: ShardAssignment) -> None:
+        process = self._context.Process(
+            target=_run_process,
+            args=(self.target, assignment.to_env()),
+            name=f"shards-{assignment.process_index}",
+        )
+        process.start()
+        self._processes[assignment.process_index] = process
+        print(f"Started process {assignment.process_index} (pid {process.pid}) "
+              f"for shards {assignment.shard_ids[0]}-{assignment.shard_ids[-1]} of {self.shard_count}")
+
+    def _identify_delay(self, assignment: ShardAssignment) -> float:
+        # Time the process needs to identify all of its shards
+        batches = -(-len(assignment.shard_ids) // self.max_concurrency)
+        return batches * IDENTIFY_INTERVAL
+
+    def run(self) -> None:
+        """Start all processes and supervise them until interrupted"""
+        previous_handler = signal.signal(signal.SIGTERM, lambda *_: self.stop())
+        try:
+            for assignment in self.assignments:
+                if self._stopping:
+                    break
+                self._start(assignment)
+                # Let its shards identify before the next process starts
+                if assignment is not self.assignments[-1]:
+                    time.sleep(self._identify_delay(assignment))
+            self._supervise()
+        except KeyboardInterrupt:
+            self.stop()
+        finally:
+            self._shutdown()
+            signal.signal(signal.SIGTERM, previous_handler)
+
+    def _supervise(self) -> None:
+        delays = {assignment.process_index: RESTART_DELAY for assignment in self.assignments}
+        restart_at: Dict[int, float] = {}
+        while not self._stopping:
+            time.sleep(1)
+            for assignment in self.assignments:
+                index = assignment.process_index
+                process = self._processes.get(index)
+                if process is None or process.is_alive():
+                    continue
+                if process.exitcode == 0:
+                    # Clean exit (e.g. the bot was closed), do not restart
+                    print(f"Process {index} exited")
+                    del self._processes[index]
+                    continue
+                if index not in restart_at:
+                    print(f"Process {index} died with exit code {process.exitcode}, "
+                          f"restarting in {delays[index]:.0f}s")
+                    restart_at[index] = time.monotonic() + delays[index]
+                    delays[index] = min(delays[index] * 2, MAX_RESTART_DELAY)
+                elif time.monotonic() >= restart_at[index]:
+                    del restart_at[index]
+                    self._start(assignment)
+            if not self._processes:
+                break
+
+    def stop(self) -> None:
+        """Ask the supervisor to shut all processes down"""
+        self._stopping = True
+
+    def _shutdown(self) -> None:
+        # SIGINT lets bot.run() close the bot cleanly; unfinished jobs stay
+        # journaled either way
+        for process in self._processes.values():
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGINT)
+        for process in self._processes.values():
+            process.join(timeout=30)
+            if process.is_alive():
+                process.terminate()
+        self._processes.clear()
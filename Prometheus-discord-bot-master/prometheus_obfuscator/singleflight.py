@@ -0,0 +1,48 @@
+"""
+Single-flight deduplication of identical in-flight calls
+
+When several callers ask for the same key at the same time, only the first
+one runs the work; the others await the same task and get the same result.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.coalesced = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run func for key, or join the call already running for it
+
+        The shared work runs in its own task, so one caller giving up does
+        not cancel it for the others.
+
+        Args:
+            key: Identifies equivalent calls
+            func: Coroutine function doing the work
+
+        Returns:
+            The result of the (possibly shared) call
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._forget(key, task))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
@@ -0,0 +1,286 @@
+"""
+Streaming helpers for large obfuscation results
+
+Strong output can be ~100x the input, so the streaming path never holds the
+whole result in memory: the JSON response is parsed chunk by chunk and the
+`obfuscatedCode` string is decoded straight into a temporary file, which is
+then handed to discord.File as-is.
+"""
+
+import codecs
+import json
+import shutil
+import tempfile
+from typing import Any, BinaryIO, Dict, Optional
+
+# Bytes read from the API response / copied between files per step
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = b' \t\r\n'
+_SIMPLE_ESCAPES = {
+    ord('"'): b'"',
+    ord('\\'): b'\\',
+    ord('/'): b'/',
+    ord('b'): b'\b',
+    ord('f'): b'\f',
+    ord('n'): b'\n',
+    ord('r'): b'\r',
+    ord('t'): b'\t',
+}
+
+
+def validate_utf8(data: bytes, chunk_size: int = CHUNK_SIZE) -> None:
+    """
+    Check that data is valid UTF-8 without building a str of all of it
+
+    Raises:
+        UnicodeDecodeError: If the data is not valid UTF-8
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    view = memoryview(data)
+    for start in range(0, len(view), chunk_size):
+        decoder.decode(view[start:start + chunk_size])
+    decoder.decode(b'', final=True)
+
+
+def spool_file() -> BinaryIO:
+    """A temporary file for streamed output, deleted when closed"""
+    return tempfile.TemporaryFile()
+
+
+def copy_file(source: BinaryIO) -> BinaryIO:
+    """Copy a file into a new spool file, chunk by chunk, positioned at 0"""
+    target = spool_file()
+    source.seek(0)
+    shutil.copyfileobj(source, target, CHUNK_SIZE)
+    target.seek(0)
+    return target
+
+
+class JsonFieldStream:
+    """
+    Incremental parser for a flat JSON object
+
+    The string value of `stream_key` is decoded directly into `sink`; every
+    other member is collected and returned by close(). Nested values are
+    buffered and decoded as regular JSON (they are expected to be small).
+    """
+
+    # Parser states
+    _BEFORE_OBJECT = 0
+    _BEFORE_KEY = 1
+    _IN_KEY = 2
+    _AFTER_KEY = 3
+    _BEFORE_VALUE = 4
+    _IN_STRING = 5
+    _IN_SCALAR = 6
+    _IN_NESTED = 7
+    _AFTER_VALUE = 8
+    _DONE = 9
+
+    def __init__(self, stream_key: str, sink: BinaryIO):
+        """
+        Initialize the parser
+
+        Args:
+            stream_key: Member whose string value is written to sink
+            sink: Binary file receiving the decoded UTF-8 bytes
+        """
+        self.stream_key = stream_key
+        self.sink = sink
+        self.streamed_bytes = 0
+        self.found = False
+        self.fields: Dict[str, Any] = {}
+
+        self._state = self._BEFORE_OBJECT
+        self._key = bytearray()
+        self._value = bytearray()
+        self._streaming = False
+        self._escape = bytearray()  # incomplete escape carried across chunks
+        self._high_surrogate: Optional[int] = None
+        self._nested_depth = 0
+        self._nested_in_string = False
+        self._nested_escaped = False
+
+    def feed(self, chunk: bytes) -> None:
+        """
+        Parse the next chunk of the response body
+
+        Raises:
+            ValueError: If the body is not a JSON object
+        """
+        i = 0
+        n = len(chunk)
+        while i < n:
+            state = self._state
+            if state in (self._IN_KEY, self._IN_STRING):
+                i = self._feed_string(chunk, i)
+                continue
+
+            byte = chunk[i]
+            if state == self._IN_SCALAR:
+                if byte in b',}' or byte in _WHITESPACE:
+                    self._finish_value(json.loads(bytes(self._value)))
+                    continue  # re-read the delimiter in _AFTER_VALUE
+                self._value.append(byte)
+            elif state == self._IN_NESTED:
+                self._feed_nested(byte)
+            elif byte in _WHITESPACE:
+                pass
+            elif state == self._BEFORE_OBJECT:
+                self._expect(byte, b'{')
+                self._state = self._BEFORE_KEY
+            elif state == self._BEFORE_KEY:
+                if byte == ord('}') and not self.fields and not self.found:
+                    self._state = self._DONE
+                else:
+                    self._expect(byte, b'"')
+                    self._key.clear()
+                    self._state = self._IN_KEY
+            elif state == self._AFTER_KEY:
+                self._expect(byte, b':')
+                self._state = self._BEFORE_VALUE
+            elif state == self._BEFORE_VALUE:
+                self._value.clear()
+                if byte == ord('"'):
+                    self._streaming = self._key.decode('utf-8') == self.stream_key
+                    self.found = self.found or self._streaming
+                    self._state = self._IN_STRING
+                elif byte in b'{[':
+                    self._value.append(byte)
+                    self._nested_depth = 1
+                    self._state = self._IN_NESTED
+                else:
+                    self._value.append(byte)
+                    self._state = self._IN_SCALAR
+            elif state == self._AFTER_VALUE:
+                if byte == ord(','):
+                    self._state = self._BEFORE_KEY
+                else:
+                    self._expect(byte, b'}')
+                    self._state = self._DONE
+            else:
+                raise ValueError("Unexpected data after the end of the JSON object")
+            i += 1
+
+    def close(self) -> Dict[str, Any]:
+        """
+        Finish parsing
+
+        Returns:
+            All members except the streamed one
+
+        Raises:
+            ValueError: If the body ended before the object was complete
+        """
+        if self._state != self._DONE:
+            raise ValueError("Truncated JSON response")
+        return self.fields
+
+    def _expect(self, byte: int, expected: bytes) -> None:
+        if byte != expected[0]:
+            raise ValueError(f"Expected {expected.decode()!r} in JSON response, got {chr(byte)!r}")
+
+    def _finish_value(self, value: Any) -> None:
+        self.fields[self._key.decode('utf-8')] = value
+        self._state = self._AFTER_VALUE
+
+    def _write(self, data: bytes) -> None:
+        if self._state == self._IN_KEY:
+            self._key += data
+        elif self._streaming:
+            self.sink.write(data)
+            self.streamed_bytes += len(data)
+        else:
+            self._value += data
+
+    def _feed_string(self, chunk: bytes, i: int) -> int:
+        """Decode string content starting at i; returns the next index to parse"""
+        n = len(chunk)
+        while i < n:
+            if self._escape:
+                i = self._feed_escape(chunk, i)
+                continue
+
+            # Copy the longest run without quotes or backslashes in one go
+            quote = chunk.find(b'"', i)
+            backslash = chunk.find(b'\\', i)
+            stops = [pos for pos in (quote, backslash) if pos != -1]
+            stop = min(stops) if stops else n
+            if stop > i:
+                self._flush_surrogate()
+                self._write(chunk[i:stop])
+            if stop == n:
+                return n
+
+            if stop == backslash:
+                self._escape.append(ord('\\'))
+                i = stop + 1
+                continue
+
+            # Closing quote
+            self._flush_surrogate()
+            if self._state == self._IN_KEY:
+                self._state = self._AFTER_KEY
+            elif self._streaming:
+                self._streaming = False
+                self._state = self._AFTER_VALUE
+            else:
+                self._finish_value(self._value.decode('utf-8'))
+            return stop + 1
+        return n
+
+    def _feed_escape(self, chunk: bytes, i: int) -> int:
+        """Collect an escape sequence that may span chunks"""
+        n = len(chunk)
+        while i < n and (len(self._escape) < 2 or (self._escape[1] == ord('u') and len(self._escape) < 6)):
+            self._escape.append(chunk[i])
+            i += 1
+
+        escape = self._escape
+        if len(escape) < 2 or (escape[1] == ord('u') and len(escape) < 6):
+            return i  # wait for the next chunk
+
+        if escape[1] == ord('u'):
+            code = int(escape[2:6].decode('ascii'), 16)
+            if 0xD800 <= code <= 0xDBFF:
+                self._flush_surrogate()
+                self._high_surrogate = code
+            elif 0xDC00 <= code <= 0xDFFF and self._high_surrogate is not None:
+                combined = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+                self._high_surrogate = None
+                self._write(chr(combined).encode('utf-8'))
+            else:
+                self._flush_surrogate()
+                self._write(chr(code).encode('utf-8', 'replace'))
+        elif escape[1] in _SIMPLE_ESCAPES:
+            self._flush_surrogate()
+            self._write(_SIMPLE_ESCAPES[escape[1]])
+        else:
+            raise ValueError(f"Invalid escape \\{chr(escape[1])} in JSON response")
+        self._escape.clear()
+        return i
+
+    def _flush_surrogate(self) -> None:
+        """Write a high surrogate that was not followed by a low one"""
+        if self._high_surrogate is not None:
+            self._write(chr(self._high_surrogate).encode('utf-8', 'replace'))
+            self._high_surrogate = None
+
+    def _feed_nested(self, byte: int) -> None:
+        self._value.append(byte)
+        if self._nested_in_string:
+            if self._nested_escaped:
+                self._nested_escaped = False
+            elif byte == ord('\\'):
+                self._nested_escaped = True
+            elif byte == ord('"'):
+                self._nested_in_string = False
+        elif byte == ord('"'):
+            self._nested_in_string = True
+        elif byte in b'{[':
+            self._nested_depth += 1
+        elif byte in b'}]':
+            self._nested_depth -= 1
+            if self._nested_depth == 0:
+                self._finish_value(json.loads(bytes(self._value)))
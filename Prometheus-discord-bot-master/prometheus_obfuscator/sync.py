@@ -0,0 +1,267 @@
+"""
+Blocking client for the Prometheus Obfuscator API
+
+For scripts, build pipelines and CLIs. The client owns one requests
+Session whose connection pool keeps connections to the API alive between
+calls, so obfuscating hundreds of files does not pay a TCP handshake per
+file. obfuscate_many() runs files on a thread pool sharing that session.
+
+Like the async client, obfuscation calls use the raw transport
+(/obfuscate-raw) when the API has it and the JSON endpoints otherwise.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Set, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .aio import PRESET_HEADER, RAW_PATH, RAW_RETRY_INTERVAL
+from .resilience import CircuitOpenError, ResiliencePolicy, TransientError
+
+# Connection pool default, also the most worker threads obfuscate_many uses by default
+DEFAULT_POOL_SIZE = 8
+
+# Gateway errors from a proxy in front of the API are worth retrying
+RETRYABLE_STATUSES = (502, 503, 504)
+
+
+class PrometheusObfuscatorClient:
+    """Client for the Prometheus Obfuscator API"""
+
+    def __init__(
+        self,
+        base_url: str = "http://localhost:3000",
+        policy: Optional[ResiliencePolicy] = None,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        raw_transport: bool = True,
+    ):
+        """
+        Initialize the client
+
+        Args:
+            base_url: The base URL of the API server
+            policy: Retry/timeout/circuit breaker policy, loaded from
+                prometheus_config.py when omitted
+            pool_size: Keep-alive connections kept open to the API
+            raw_transport: Use /obfuscate-raw when the API has it
+        """
+        self.base_url = base_url.rstrip('/')
+        self.policy = policy or ResiliencePolicy.from_config()
+        self.pool_size = pool_size
+        self.raw_transport = raw_transport
+        self._raw_unsupported_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._session: Optional[requests.Session] = None
+
+    def __enter__(self) -> "PrometheusObfuscatorClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def session(self) -> requests.Session:
+        """The shared session, created on first access"""
+        with self._lock:
+            if self._session is None:
+                self._session = requests.Session()
+                self._mount(self.pool_size)
+            return self._session
+
+    def _mount(self, pool_size: int) -> None:
+        # Without a big enough pool, connections of concurrent calls are
+        # dropped after use instead of kept alive
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        self.pool_size = pool_size
+
+    def close(self) -> None:
+        """Close the session and its pooled connections"""
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    def _request(self, method: str, path: str, file_path: Optional[str] = None, raw_response: bool = False,
+                 **kwargs) -> Dict[str, Any]:
+        """
+        Send a request under the resilience policy and decode the JSON response or error
+
+        With raw_response, a successful response body is returned as
+        'obfuscatedCode', and a 404/405 is flagged 'raw_unsupported'.
+        """
+        session = self.session
+
+        def attempt(timeout: float) -> Dict[str, Any]:
+            try:
+                if file_path is not None:
+                    # Re-open the file per attempt so retries resend the whole body
+                    with open(file_path, 'rb') as f:
+                        kwargs['files'] = {'file': (os.path.basename(file_path), f, 'text/plain')}
+                        response = session.request(method, f"{self.base_url}{path}", timeout=timeout, **kwargs)
+                else:
+                    response = session.request(method, f"{self.base_url}{path}", timeout=timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                raise TransientError(str(e)) from e
+            if response.status_code in RETRYABLE_STATUSES:
+                raise TransientError(f"API returned status {response.status_code}")
+            if raw_response:
+                if response.status_code in (404, 405):
+                    return {"error": f"API returned status {response.status_code}", 'raw_unsupported': True}
+                if response.status_code == 200:
+                    # requests already undid any Content-Encoding
+                    return {
+                        'success': True,
+                        'preset': response.headers.get(PRESET_HEADER),
+                        'obfuscatedCode': response.content.decode('utf-8', 'replace'),
+                    }
+            response.raise_for_status()
+            return response.json()
+
+        try:
+            return self.policy.call_sync(path, attempt)
+        except (requests.RequestException, TransientError, CircuitOpenError) as e:
+            return {"error": str(e)}
+
+    def _send_raw(self, data: bytes, preset: str, send_json: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """Send the source to /obfuscate-raw, or with send_json if the API does not have it"""
+        if self.raw_transport and (self._raw_unsupported_at is None
+                                   or time.monotonic() - self._raw_unsupported_at >= RAW_RETRY_INTERVAL):
+            result = self._request(
+                'POST',
+                RAW_PATH,
+                raw_response=True,
+                data=data,
+                headers={'Content-Type': 'application/octet-stream', PRESET_HEADER: preset}
+            )
+            if not result.get('raw_unsupported'):
+                self._raw_unsupported_at = None
+                return result
+            self._raw_unsupported_at = time.monotonic()
+        return send_json()
+
+    def health_check(self) -> Dict[str, Any]:
+        """
+        Check if the API server is running
+
+        Returns:
+            Dict containing health status
+        """
+        return self._request('GET', '/health')
+
+    def get_presets(self) -> Dict[str, Any]:
+        """
+        Get available obfuscation presets
+
+        Returns:
+            Dict containing available presets
+        """
+        return self._request('GET', '/presets')
+
+    def obfuscate_file(self, file_path: str, preset: str = "Medium") -> Dict[str, Any]:
+        """
+        Obfuscate a Lua file
+
+        Args:
+            file_path: Path to the .lua file to obfuscate
+            preset: Obfuscation preset ("Weak", "Medium", "Strong", "Minify")
+
+        Returns:
+            Dict containing obfuscated code or error
+        """
+        if not os.path.exists(file_path):
+            return {"error": f"File not found: {file_path}"}
+
+        if not file_path.lower().endswith('.lua'):
+            return {"error": "File must have .lua extension"}
+
+        with open(file_path, 'rb') as f:
+            content = f.read()
+        result = self._send_raw(
+            content,
+            preset,
+            lambda: self._request('POST', '/obfuscate', file_path=file_path, data={'preset': preset})
+        )
+        if "error" not in result:
+            result['originalFilename'] = os.path.basename(file_path)
+        return result
+
+    def obfuscate_code(self, lua_code: str, preset: str = "Medium") -> Dict[str, Any]:
+        """
+        Obfuscate Lua code directly
+
+        Args:
+            lua_code: The Lua code to obfuscate
+            preset: Obfuscation preset ("Weak", "Medium", "Strong", "Minify")
+
+        Returns:
+            Dict containing obfuscated code or error
+        """
+        data = {
+            'code': lua_code,
+            'preset': preset
+        }
+
+        return self._send_raw(
+            lua_code.encode('utf-8'),
+            preset,
+            lambda: self._request(
+                'POST',
+                '/obfuscate-text',
+                json=data,
+                headers={'Content-Type': 'application/json'}
+            )
+        )
+
+    def obfuscate_many(
+        self,
+        paths: Iterable[str],
+        preset: str = "Medium",
+        workers: Optional[int] = None,
+    ) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Obfuscate many files in parallel over the pooled connections
+
+        At most `workers` files are in flight at a time; paths are consumed
+        lazily, so a generator over a large tree is fine.
+
+        Args:
+            paths: Paths of the .lua files
+            preset: Obfuscation preset for all files
+            workers: Parallel requests, pool_size when omitted (the pool
+                grows to match if more are asked for)
+
+        Yields:
+            (path, result) in completion order, results as from obfuscate_file()
+        """
+        workers = workers or self.pool_size
+        session = self.session
+        with self._lock:
+            if workers > self.pool_size and self._session is session:
+                self._mount(workers)
+
+        paths = iter(paths)
+        pending: Dict[Future, str] = {}
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='obfuscate')
+        try:
+            def fill() -> None:
+                for path in paths:
+                    pending[executor.submit(self.obfuscate_file, path, preset)] = path
+                    if len(pending) >= workers:
+                        break
+
+            fill()
+            while pending:
+                done: Set[Future]
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+                fill()
+        finally:
+            # Stopped early: do not start the files still waiting
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -4,111 +4,14 @@ Python client example for the Prometheus Obfuscator API
 
 This script demonstrates how to connect to the obfuscation API from Python.
 You can integrate this into your Discord bot or any other Python application.
+
+PrometheusObfuscatorClient lives in prometheus_obfuscator/sync.py and keeps its
+connections alive between calls; use obfuscate_many() for many files.
 """
 
-import requests
-import json
 import os
-from typing import Optional, Dict, Any
 
-class PrometheusObfuscatorClient:
-    """Client for the Prometheus Obfuscator API"""
-    
-    def __init__(self, base_url: str = "http://localhost:3000"):
-        """
-        Initialize the client
-        
-        Args:
-            base_url: The base URL of the API server
-        """
-        self.base_url = base_url.rstrip('/')
-        
-    def health_check(self) -> Dict[str, Any]:
-        """
-        Check if the API server is running
-        
-        Returns:
-            Dict containing health status
-        """
-        try:
-            response = requests.get(f"{self.base_url}/health")
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
-            return {"error": str(e)}
-    
-    def get_presets(self) -> Dict[str, Any]:
-        """
-        Get available obfuscation presets
-        
-        Returns:
-            Dict containing available presets
-        """
-        try:
-            response = requests.get(f"{self.base_url}/presets")
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
-            return {"error": str(e)}
-    
-    def obfuscate_file(self, file_path: str, preset: str = "Medium") -> Dict[str, Any]:
-        """
-        Obfuscate a Lua file
-        
-        Args:
-            file_path: Path to the .lua file to obfuscate
-            preset: Obfuscation preset ("Weak", "Medium", "Strong", "Minify")
-            
-        Returns:
-            Dict containing obfuscated code or error
-        """
-        if not os.path.exists(file_path):
-            return {"error": f"File not found: {file_path}"}
-        
-        if not file_path.lower().endswith('.lua'):
-            return {"error": "File must have .lua extension"}
-        
-        try:
-            with open(file_path, 'rb') as f:
-                files = {'file': (os.path.basename(file_path), f, 'text/plain')}
-                data = {'preset': preset}
-                
-                response = requests.post(
-                    f"{self.base_url}/obfuscate",
-                    files=files,
-                    data=data
-                )
-                response.raise_for_status()
-                return response.json()
-        except requests.RequestException as e:
-            return {"error": str(e)}
-    
-    def obfuscate_code(self, lua_code: str, preset: str = "Medium") -> Dict[str, Any]:
-        """
-        Obfuscate Lua code directly
-        
-        Args:
-            lua_code: The Lua code to obfuscate
-            preset: Obfuscation preset ("Weak", "Medium", "Strong", "Minify")
-            
-        Returns:
-            Dict containing obfuscated code or error
-        """
-        try:
-            data = {
-                'code': lua_code,
-                'preset': preset
-            }
-            
-            response = requests.post(
-                f"{self.base_url}/obfuscate-text",
-                json=data,
-                headers={'Content-Type': 'application/json'}
-            )
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
-            return {"error": str(e)}
+from prometheus_obfuscator import PrometheusObfuscatorClient
 
 
 def main():
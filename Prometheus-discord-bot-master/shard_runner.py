@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Run the Discord bot from discord_bot_integration.py as several shard processes
+
+For bots in thousands of servers: the shards are spread over one process per
+CPU core (or PROMETHEUS_SHARD_PROCESSES). Set PROMETHEUS_RESULT_CACHE_PATH
+and PROMETHEUS_JOB_STORE_PATH in prometheus_config.py so the processes share
+their results and job journal, and PROMETHEUS_BOT_TOKEN (or the
+DISCORD_BOT_TOKEN environment variable) for the token.
+
+Usage:
+    python shard_runner.py [--processes N] [--shard-count N]
+"""
+
+import argparse
+
+from prometheus_obfuscator import ShardRunner
+from prometheus_obfuscator.config import get_bot_token
+
+
+def run_bot():
+    """Runs in each shard process, which picks its shards up from the environment"""
+    import discord_bot_integration as integration
+    integration.create_bot().run(get_bot_token())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the obfuscator bot as several shard processes")
+    parser.add_argument('--processes', type=int, help="Shard processes to start (default: CPU cores)")
+    parser.add_argument('--shard-count', type=int, help="Total shards (default: as recommended by Discord)")
+    args = parser.parse_args()
+
+    # Not imported from discord_bot_integration, which the supervisor never loads
+    token = get_bot_token()
+    if not token:
+        print("Please set PROMETHEUS_BOT_TOKEN in prometheus_config.py (or DISCORD_BOT_TOKEN)!")
+        return
+
+    runner = ShardRunner.from_config(run_bot, token, processes=args.processes, shard_count=args.shard_count)
+    print(f"Running {runner.shard_count} shard(s) in {len(runner.assignments)} process(es)")
+    runner.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,8 @@ import cors from 'cors';
 import fs from 'fs';
 import path from 'path';
 import tmp from 'tmp';
+import util from 'util';
+import zlib from 'zlib';
 import '@colors/colors';
 import logger from './logger';
 import obfuscate from './obfuscate';
@@ -12,6 +14,14 @@ import obfuscate from './obfuscate';
 const app = express();
 const port = process.env.API_PORT || 3000;
 const MAX_SIZE = 40000; // 40kB max size
+const VALID_PRESETS = ['Weak', 'Medium', 'Strong', 'Minify'];
+
+// Raw transport: outputs smaller than this are sent uncompressed
+const COMPRESS_MIN_SIZE = 1024;
+const gzip = util.promisify(zlib.gzip);
+// zstd is only available in newer Node versions
+const zstd: ((data: Buffer) => Promise<Buffer>) | undefined =
+    typeof (zlib as any).zstdCompress === 'function' ? util.promisify((zlib as any).zstdCompress) : undefined;
 
 // Configure multer for file uploads
 const upload = multer({
@@ -152,6 +162,74 @@ app.post('/obfuscate-text', async (req, res) => {
     }
 });
 
+// Compress a raw response with the best encoding the client accepts
+async function encodeBody(acceptEncoding: string | undefined, body: Buffer): Promise<[Buffer, string | undefined]> {
+    if (!acceptEncoding || body.length < COMPRESS_MIN_SIZE) {
+        return [body, undefined];
+    }
+    const accepted = acceptEncoding.split(',').map((part) => part.split(';')[0].trim().toLowerCase());
+    if (zstd && accepted.includes('zstd')) {
+        return [await zstd(body), 'zstd'];
+    }
+    if (accepted.includes('gzip')) {
+        return [await gzip(body, { level: 1 }), 'gzip'];
+    }
+    return [body, undefined];
+}
+
+// Obfuscate raw bytes (no JSON on either side, for big outputs)
+// The Lua source is the request body, the preset comes in the X-Preset header
+// and the obfuscated code is returned as application/octet-stream
+app.post('/obfuscate-raw', express.raw({ type: 'application/octet-stream', limit: MAX_SIZE }), async (req, res) => {
+    try {
+        if (!Buffer.isBuffer(req.body) || req.body.length === 0) {
+            return res.status(400).json({ 
+                error: 'No code provided. Send the Lua source as an application/octet-stream body.' 
+            });
+        }
+
+        const preset = req.get('X-Preset') || 'Medium';
+        
+        if (!VALID_PRESETS.includes(preset)) {
+            return res.status(400).json({ 
+                error: `Invalid preset. Valid presets are: ${VALID_PRESETS.join(', ')}` 
+            });
+        }
+
+        // Create temporary file for the code
+        const inputFile = tmp.fileSync({ postfix: '.lua' });
+        fs.writeFileSync(inputFile.name, req.body);
+
+        logger.log(`Obfuscating raw code with ${preset} preset`);
+
+        // Obfuscate the file
+        const outputFile = await obfuscate(inputFile.name, preset);
+        
+        // Read the obfuscated content as bytes, it is sent as-is
+        const obfuscatedContent = fs.readFileSync(outputFile.name);
+        
+        // Clean up temporary files
+        inputFile.removeCallback();
+        outputFile.removeCallback();
+
+        const [body, encoding] = await encodeBody(req.get('Accept-Encoding'), obfuscatedContent);
+        res.set('Content-Type', 'application/octet-stream');
+        res.set('X-Preset', preset);
+        res.vary('Accept-Encoding');
+        if (encoding) {
+            res.set('Content-Encoding', encoding);
+        }
+        res.send(body);
+
+    } catch (error) {
+        logger.error(`Obfuscation failed: ${error}`);
+        res.status(500).json({ 
+            error: 'Obfuscation failed', 
+            details: error.toString() 
+        });
+    }
+});
+
 // Error handling middleware
 app.use((error: any, req: express.Request, res: express.Response, next: express.NextFunction) => {
     if (error instanceof multer.MulterError) {
@@ -161,6 +239,11 @@ app.use((error: any, req: express.Request, res: express.Response, next: express.
             });
         }
     }
+    if (error.type === 'entity.too.large') {
+        return res.status(400).json({ 
+            error: `Code too large. Maximum size is ${MAX_SIZE} bytes.` 
+        });
+    }
     
     logger.error(`API Error: ${error.message}`);
     res.status(500).json({ 
@@ -177,6 +260,7 @@ app.listen(port, () => {
     logger.log(`   GET  /presets - Get available presets`);
     logger.log(`   POST /obfuscate - Upload .lua file for obfuscation`);
     logger.log(`   POST /obfuscate-text - Send code directly for obfuscation`);
+    logger.log(`   POST /obfuscate-raw - Send raw code, get raw obfuscated code back`);
 });
 
 export default app;
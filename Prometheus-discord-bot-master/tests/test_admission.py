@@ -0,0 +1,103 @@
+"""Tests for cost-aware admission in prometheus_obfuscator.admission"""
+
+import asyncio
+import unittest
+
+from prometheus_obfuscator.admission import PRIOR_LATENCY, AdmissionController
+from prometheus_obfuscator.scheduler import JobScheduler
+
+
+class _BusyScheduler(JobScheduler):
+    """A scheduler reporting a fixed load"""
+
+    def __init__(self, running: int = 0, queued: int = 0, concurrency: int = 2):
+        super().__init__(concurrency=concurrency)
+        self._running = running
+        self._queued = queued
+
+
+class EstimateTest(unittest.TestCase):
+    def test_idle_scheduler_costs_one_job(self):
+        admission = AdmissionController(_BusyScheduler())
+        self.assertEqual(admission.estimate('Strong'), PRIOR_LATENCY['Strong'])
+        # Unknown presets are assumed to cost like Medium
+        self.assertEqual(admission.estimate('Custom'), PRIOR_LATENCY['Medium'])
+
+    def test_samples_replace_the_prior_as_a_moving_average(self):
+        admission = AdmissionController(_BusyScheduler())
+        admission.record('Strong', 20.0)
+        self.assertEqual(admission.latency('Strong'), 20.0)
+        admission.record('Strong', 30.0)
+        self.assertAlmostEqual(admission.latency('Strong'), 22.0)
+
+    def test_waiting_jobs_add_to_the_estimate(self):
+        admission = AdmissionController(_BusyScheduler(running=2, queued=4, concurrency=2))
+        admission.record('Weak', 1.0)
+        admission.record('Strong', 9.0)
+        # (4 queued / 2 slots + 1 running job) at the 5s average, then the job itself
+        self.assertAlmostEqual(admission.estimate('Weak'), 3 * 5.0 + 1.0)
+
+
+class DecideTest(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = _BusyScheduler(running=2, queued=20, concurrency=2)
+        self.admission = AdmissionController(
+            self.scheduler, latency_budget=30, guild_policies={1: 'downgrade', 2: 'reject'}
+        )
+
+    def test_jobs_within_budget_are_admitted(self):
+        self.scheduler._running = self.scheduler._queued = 0
+        for guild_id in (None, 1, 2):
+            decision = self.admission.decide('Strong', guild_id)
+            self.assertEqual((decision.action, decision.preset, decision.message), ('admit', 'Strong', None))
+
+    def test_queue_policy_admits_over_budget(self):
+        decision = self.admission.decide('Strong', guild_id=3)
+        self.assertEqual(decision.action, 'admit')
+        self.assertGreater(decision.estimated_seconds, 30)
+
+    def test_downgrade_policy_runs_strong_as_medium(self):
+        decision = self.admission.decide('Strong', guild_id=1)
+        self.assertEqual((decision.action, decision.preset), ('downgrade', 'Medium'))
+        self.assertEqual(decision.estimated_seconds, self.admission.estimate('Medium'))
+        self.assertIn('downgraded', decision.message)
+        # Nothing cheaper to fall back to
+        self.assertEqual(self.admission.decide('Medium', guild_id=1).action, 'admit')
+
+    def test_reject_policy_turns_the_job_away(self):
+        decision = self.admission.decide('Weak', guild_id=2)
+        self.assertEqual((decision.action, decision.preset), ('reject', 'Weak'))
+        self.assertIn(f"{decision.estimated_seconds:.0f}s", decision.message)
+
+    def test_policies_can_be_changed_and_validated(self):
+        self.admission.set_policy(3, 'reject')
+        self.assertEqual(self.admission.decide('Weak', guild_id=3).action, 'reject')
+        self.admission.set_policy(2, None)
+        self.assertEqual(self.admission.policy_for(2), 'queue')
+        with self.assertRaises(ValueError):
+            self.admission.set_policy(3, 'drop')
+        with self.assertRaises(ValueError):
+            AdmissionController(self.scheduler, default_policy='drop')
+
+
+class LiveSchedulerTest(unittest.TestCase):
+    def test_estimate_follows_the_scheduler_load(self):
+        async def run():
+            scheduler = JobScheduler(concurrency=1, max_queue=10)
+            admission = AdmissionController(scheduler, latency_budget=5, default_policy='reject')
+            self.assertEqual(admission.decide('Weak').action, 'admit')
+
+            release = asyncio.Event()
+            tasks = [asyncio.create_task(scheduler.submit(release.wait, user_id=user_id)) for user_id in (1, 2)]
+            await asyncio.sleep(0)
+            self.assertEqual(admission.decide('Weak').action, 'reject')
+
+            release.set()
+            await asyncio.gather(*tasks)
+            self.assertEqual(admission.decide('Weak').action, 'admit')
+
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+"""Tests for the result cache in prometheus_obfuscator.cache"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+from prometheus_obfuscator.cache import ResultCache, source_key
+
+
+class SourceKeyTest(unittest.TestCase):
+    def test_text_and_bytes_share_a_key(self):
+        self.assertEqual(source_key('print(1)', 'Weak'), source_key(b'print(1)', 'Weak'))
+
+    def test_line_endings_bom_and_trailing_whitespace_are_ignored(self):
+        self.assertEqual(
+            source_key('print(1)\nprint(2)\n', 'Weak'),
+            source_key(b'\xef\xbb\xbfprint(1)\r\nprint(2)  \r\n\r\n', 'Weak'),
+        )
+
+    def test_preset_is_part_of_the_key(self):
+        self.assertNotEqual(source_key('print(1)', 'Weak'), source_key('print(1)', 'Strong'))
+
+
+class MemoryTierTest(unittest.TestCase):
+    def test_evicts_least_recently_used_when_over_budget(self):
+        size = sys.getsizeof('a' * 100)
+        cache = ResultCache(max_bytes=size * 2)
+        cache.put('first', 'a' * 100)
+        cache.put('second', 'b' * 100)
+        # Touch 'first' so 'second' is the oldest entry
+        self.assertEqual(cache.get('first'), 'a' * 100)
+
+        cache.put('third', 'c' * 100)
+
+        self.assertIsNone(cache.get_memory('second'))
+        self.assertEqual(cache.get_memory('first'), 'a' * 100)
+        self.assertEqual(cache.get_memory('third'), 'c' * 100)
+        stats = cache.stats()
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(stats['entries'], 2)
+        self.assertLessEqual(stats['memory_bytes'], size * 2)
+
+    def test_replacing_a_key_does_not_count_it_twice(self):
+        cache = ResultCache(max_bytes=10_000)
+        cache.put('key', 'old')
+        cache.put('key', 'new')
+        self.assertEqual(cache.get('key'), 'new')
+        self.assertEqual(cache.stats()['memory_bytes'], sys.getsizeof('new'))
+
+    def test_value_larger_than_budget_is_not_kept(self):
+        cache = ResultCache(max_bytes=10)
+        cache.put('key', 'x' * 1000)
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(cache.stats()['misses'], 1)
+
+
+class DiskTierTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cache.sqlite3')
+
+    def _cache(self, **kwargs) -> ResultCache:
+        cache = ResultCache(disk_path=self.path, **kwargs)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_disk_hit_survives_a_restart_and_is_promoted(self):
+        self._cache().put('key', 'obfuscated')
+
+        cache = self._cache()
+        self.assertTrue(cache.has_disk)
+        self.assertIsNone(cache.get_memory('key'))
+        self.assertEqual(cache.get('key'), 'obfuscated')
+        self.assertEqual(cache.get_memory('key'), 'obfuscated')
+
+        stats = cache.stats()
+        self.assertEqual(stats['disk_hits'], 1)
+        self.assertEqual(stats['memory_hits'], 1)
+
+    def test_entry_evicted_from_memory_is_read_back_from_disk(self):
+        cache = self._cache(max_bytes=sys.getsizeof('a' * 100))
+        cache.put('first', 'a' * 100)
+        cache.put('second', 'b' * 100)
+        self.assertIsNone(cache.get_memory('first'))
+
+        self.assertEqual(cache.get('first'), 'a' * 100)
+        self.assertEqual(cache.stats()['disk_hits'], 1)
+
+    def test_expired_disk_entry_is_a_miss(self):
+        self._cache(ttl=-1).put('key', 'obfuscated')
+
+        cache = self._cache()
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(cache.stats()['misses'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
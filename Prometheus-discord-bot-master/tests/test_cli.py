@@ -0,0 +1,124 @@
+"""Tests for the incremental bulk obfuscator in prometheus_obfuscator.cli"""
+
+import os
+import tempfile
+import unittest
+
+from prometheus_obfuscator.cli import MANIFEST_NAME, load_manifest, obfuscate_tree, save_manifest
+
+
+class _FakeClient:
+    """Stands in for PrometheusObfuscatorClient.obfuscate_many"""
+
+    def __init__(self, interrupt_after=None):
+        self.requested = []  # source paths of every call
+        self.interrupt_after = interrupt_after
+
+    def obfuscate_many(self, paths, preset, workers=None):
+        paths = sorted(paths)
+        self.requested.append(paths)
+        for done, path in enumerate(paths):
+            if done == self.interrupt_after:
+                raise KeyboardInterrupt
+            with open(path, encoding='utf-8') as f:
+                code = f.read()
+            if 'FAIL' in code:
+                yield path, {'error': 'Obfuscation failed'}
+            else:
+                yield path, {'success': True, 'obfuscatedCode': f'-- {preset}\n{code}'}
+
+
+class ObfuscateTreeTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.src = os.path.join(directory.name, 'src')
+        self.out = os.path.join(directory.name, 'out')
+        self._write('main.lua', 'print("main")')
+        self._write('lib/util.lua', 'return {}')
+        self._write('README.md', 'not lua')
+
+    def _write(self, relative, code):
+        path = os.path.join(self.src, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(code)
+
+    def _run(self, client=None, preset='Medium', **kwargs):
+        client = client or _FakeClient()
+        failed = obfuscate_tree(client, self.src, self.out, preset, workers=2, quiet=True, **kwargs)
+        requested = [os.path.relpath(path, self.src).replace(os.sep, '/') for path in client.requested[0]]
+        return failed, requested
+
+    def _manifest(self):
+        return load_manifest(os.path.join(self.out, MANIFEST_NAME))
+
+    def test_second_run_only_obfuscates_changed_files(self):
+        self.assertEqual(self._run(), (0, ['lib/util.lua', 'main.lua']))
+        with open(os.path.join(self.out, 'lib', 'util.lua'), encoding='utf-8') as f:
+            self.assertEqual(f.read(), '-- Medium\nreturn {}')
+        self.assertEqual(sorted(self._manifest()), ['lib/util.lua', 'main.lua'])
+
+        self.assertEqual(self._run(), (0, []))
+
+        self._write('main.lua', 'print("edited")')
+        self._write('new.lua', 'print("new")')
+        self.assertEqual(self._run(), (0, ['main.lua', 'new.lua']))
+
+    def test_preset_change_force_and_missing_outputs_rerun(self):
+        self._run()
+        self.assertEqual(self._run(preset='Strong')[1], ['lib/util.lua', 'main.lua'])
+        self.assertEqual(self._run(preset='Strong', force=True)[1], ['lib/util.lua', 'main.lua'])
+
+        os.remove(os.path.join(self.out, 'main.lua'))
+        self.assertEqual(self._run(preset='Strong')[1], ['main.lua'])
+
+    def test_outputs_of_deleted_sources_are_removed(self):
+        self._run()
+        os.remove(os.path.join(self.src, 'main.lua'))
+
+        self.assertEqual(self._run(), (0, []))
+        self.assertFalse(os.path.exists(os.path.join(self.out, 'main.lua')))
+        self.assertEqual(list(self._manifest()), ['lib/util.lua'])
+
+    def test_failed_files_are_retried_next_time(self):
+        self._run()
+        self._write('main.lua', 'FAIL')
+        self.assertEqual(self._run(), (1, ['main.lua']))
+        self.assertNotIn('main.lua', self._manifest())
+        self.assertEqual(self._run(), (1, ['main.lua']))
+
+    def test_interrupted_run_keeps_the_finished_files(self):
+        with self.assertRaises(KeyboardInterrupt):
+            self._run(_FakeClient(interrupt_after=1))
+        self.assertEqual(list(self._manifest()), ['lib/util.lua'])
+        self.assertEqual(self._run(), (0, ['main.lua']))
+
+    def test_output_directory_inside_the_sources_is_skipped(self):
+        self.out = os.path.join(self.src, 'build')
+        self._run()
+        self.assertEqual(self._run(force=True)[1], ['lib/util.lua', 'main.lua'])
+
+
+class ManifestTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, MANIFEST_NAME)
+
+    def test_round_trip(self):
+        save_manifest(self.path, {'b.lua': 'key2', 'a.lua': 'key1'})
+        self.assertEqual(load_manifest(self.path), {'a.lua': 'key1', 'b.lua': 'key2'})
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), [MANIFEST_NAME])
+
+    def test_missing_corrupt_or_other_version_is_empty(self):
+        self.assertEqual(load_manifest(self.path), {})
+        for content in ('{not json', '[]', '{"version": 99, "files": {"a.lua": "key"}}'):
+            with self.subTest(content=content):
+                with open(self.path, 'w', encoding='utf-8') as f:
+                    f.write(content)
+                self.assertEqual(load_manifest(self.path), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
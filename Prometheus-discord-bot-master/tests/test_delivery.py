@@ -0,0 +1,91 @@
+"""Tests for large result delivery in prometheus_obfuscator.delivery"""
+
+import io
+import os
+import unittest
+import zipfile
+from unittest import mock
+
+from prometheus_obfuscator import delivery
+from prometheus_obfuscator.delivery import UPLOAD_HEADROOM, prepare_delivery, upload_limit
+from prometheus_obfuscator.streaming import CHUNK_SIZE, spool_file
+
+# Every part may hold CHUNK_SIZE bytes
+LIMIT = UPLOAD_HEADROOM + CHUNK_SIZE
+
+
+def _spool(data: bytes):
+    fp = spool_file()
+    fp.write(data)
+    fp.seek(0)
+    return fp
+
+
+def _prepare(data: bytes, **kwargs):
+    return prepare_delivery(_spool(data), len(data), 'script.lua', LIMIT, **kwargs)
+
+
+class PrepareDeliveryTest(unittest.TestCase):
+    def test_output_that_fits_is_sent_raw(self):
+        data = b'print(1)\n' * 100
+        with _prepare(data) as result:
+            self.assertEqual(result.mode, 'raw')
+            self.assertEqual([name for name, _ in result.parts], ['script.lua'])
+            self.assertEqual(result.parts[0][1].read(), data)
+            self.assertEqual(result.size, len(data))
+            self.assertIsNone(result.describe())
+
+    def test_compressible_output_is_zipped(self):
+        data = b'local x = "padding"\n' * 20000
+        with _prepare(data) as result:
+            self.assertEqual(result.mode, 'zip')
+            name, fp = result.parts[0]
+            self.assertEqual(name, 'script.zip')
+            self.assertLessEqual(result.size, CHUNK_SIZE)
+            with zipfile.ZipFile(io.BytesIO(fp.read())) as archive:
+                self.assertEqual(archive.read('script.lua'), data)
+            self.assertIn('`script.zip`', result.describe())
+
+    def test_incompressible_output_is_split_into_parts(self):
+        data = os.urandom(3 * CHUNK_SIZE)
+        with _prepare(data) as result:
+            self.assertEqual(result.mode, 'chunked')
+            names = [name for name, _ in result.parts]
+            self.assertEqual(names, ['script.zip.001', 'script.zip.002', 'script.zip.003', 'script.zip.004'])
+            parts = [fp.read() for _, fp in result.parts]
+            self.assertTrue(all(len(part) <= CHUNK_SIZE for part in parts))
+            self.assertEqual(sum(map(len, parts)), result.size)
+            # Joined parts are the zip of the output
+            with zipfile.ZipFile(io.BytesIO(b''.join(parts))) as archive:
+                self.assertEqual(archive.read('script.lua'), data)
+            self.assertIn('4 parts', result.describe())
+            self.assertIn('cat script.zip.* > script.zip', result.describe())
+
+    def test_uncompressed_parts_join_to_the_output(self):
+        data = os.urandom(2 * CHUNK_SIZE + 1)
+        with _prepare(data, compress=False) as result:
+            self.assertEqual(result.mode, 'chunked')
+            self.assertEqual(len(result.parts), 3)
+            # Parts share one file, so reading them out of order still works
+            (_, first), (_, second), (name, third) = result.parts
+            self.assertEqual(name, 'script.lua.003')
+            tail = third.read()
+            self.assertEqual(first.read() + second.read() + tail, data)
+
+    def test_closing_closes_the_output(self):
+        output = _spool(b'x')
+        prepare_delivery(output, 1, 'script.lua', LIMIT).close()
+        self.assertTrue(output.closed)
+
+
+class UploadLimitTest(unittest.TestCase):
+    def test_configured_limit_wins(self):
+        with mock.patch.object(delivery, 'get_setting', return_value=None):
+            self.assertEqual(upload_limit(), delivery.DEFAULT_UPLOAD_LIMIT)
+            self.assertEqual(upload_limit(25 * 1024 * 1024), 25 * 1024 * 1024)
+        with mock.patch.object(delivery, 'get_setting', return_value=1024):
+            self.assertEqual(upload_limit(25 * 1024 * 1024), 1024)
+
+
+if __name__ == '__main__':
+    unittest.main()
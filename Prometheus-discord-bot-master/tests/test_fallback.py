@@ -0,0 +1,176 @@
+"""Tests for the local fallback engine in prometheus_obfuscator.fallback"""
+
+import asyncio
+import os
+import unittest
+
+from prometheus_obfuscator.fallback import LOCAL_PRESETS, FallbackEngine, obfuscate_source
+from prometheus_obfuscator.lua_lexer import tokenize
+
+try:
+    from lupa import lua51
+except ImportError:
+    lua51 = None
+
+PRESETS_LUA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lua', 'presets.lua')
+
+SCRIPT = r'''
+-- Counter "class" with methods, closures and shadowing
+local Counter = {}
+Counter.__index = Counter
+
+function Counter.new(start)
+    local self = setmetatable({}, Counter)
+    self.value = start or 0
+    return self
+end
+
+function Counter:add(amount, ...)
+    local extra = select('#', ...)
+    self.value = self.value + amount + extra
+    return self
+end
+
+local function greet(name)
+    --[[ long
+         comment ]]
+    return "Hello, " .. name .. '!\n\t"quoted"\65\066'
+end
+
+local counter = Counter.new(1):add(2, nil, nil)
+print(counter.value, greet("world"))
+
+local x = 10
+do
+    local x = x + 1
+    print("inner", x)
+end
+print("outer", x)
+
+local total = 0
+for i = 1, 3 do
+    local x = i * 2
+    total = total + x
+end
+for key, value in pairs({only = [[long
+string]]}) do
+    print(key, value)
+end
+
+local n = 0
+repeat
+    local done = n >= 2
+    n = n + 1
+until done
+print(total, n, 1 .. 2, 2^-1, #"len", - -3)
+
+local function make()
+    local hidden = "captured"
+    return function() return hidden end
+end
+print(make()(), type(print), GLOBAL_VALUE == nil)
+'''
+
+
+def _run(code: str) -> str:
+    """Run Lua 5.1 code and return everything it printed"""
+    lua = lua51.LuaRuntime()
+    run = lua.eval(r'''function(code)
+        local out = {}
+        print = function(...)
+            local parts = {}
+            for i = 1, select('#', ...) do parts[i] = tostring((select(i, ...))) end
+            out[#out + 1] = table.concat(parts, '\t')
+        end
+        local chunk = assert(loadstring(code))
+        chunk()
+        return table.concat(out, '\n')
+    end''')
+    return run(code)
+
+
+class ObfuscateSourceTest(unittest.TestCase):
+    def test_minify_drops_comments_and_renames_locals(self):
+        output = obfuscate_source(SCRIPT, 'Minify')
+        self.assertNotIn('--', output)
+        self.assertNotIn('comment', output)
+        self.assertNotIn('    ', output)
+        self.assertLess(len(output), len(SCRIPT))
+        names = {token.text for token in tokenize(output) if token.kind == 'name'}
+        self.assertNotIn('counter', names)
+        self.assertNotIn('greet', names)
+        # Globals and fields keep their names
+        self.assertTrue({'setmetatable', 'print', 'GLOBAL_VALUE', 'value', 'add'} <= names)
+
+    def test_weak_pools_strings_and_wraps_in_a_function(self):
+        output = obfuscate_source(SCRIPT, 'Weak')
+        self.assertTrue(output.startswith('return(function(...)'))
+        self.assertTrue(output.endswith('end)(...)'))
+        self.assertNotIn('Hello', output)
+        self.assertNotIn('captured', output)
+
+    def test_syntax_error_is_reported(self):
+        with self.assertRaises(ValueError):
+            obfuscate_source('local = 1', 'Minify')
+
+    def test_other_presets_are_refused(self):
+        with self.assertRaises(ValueError):
+            obfuscate_source(SCRIPT, 'Strong')
+
+
+@unittest.skipIf(lua51 is None, "lupa is not installed")
+class ApiPresetTest(unittest.TestCase):
+    def test_local_presets_match_the_api_presets(self):
+        with open(PRESETS_LUA, encoding='utf-8') as f:
+            presets = lua51.LuaRuntime().execute(f.read())
+        for preset in LOCAL_PRESETS:
+            with self.subTest(preset=preset):
+                self.assertIsNotNone(presets[preset])
+                self.assertEqual(presets[preset].LuaVersion, 'Lua51')
+
+        steps = {step.Name: step.Settings for step in presets['Weak'].Steps.values()}
+        self.assertIn('WrapInFunction', steps)
+        self.assertTrue(steps['ConstantArray'].StringsOnly)
+        self.assertEqual(len(presets['Minify'].Steps), 0)
+
+    def test_output_behaves_like_the_source_on_lua51(self):
+        expected = _run(SCRIPT)
+        self.assertIn('Hello, world!', expected)
+        for preset in LOCAL_PRESETS:
+            with self.subTest(preset=preset):
+                self.assertEqual(_run(obfuscate_source(SCRIPT, preset)), expected)
+
+    def test_weak_passes_varargs_through(self):
+        output = obfuscate_source('local a, b = ...; return b, a, "x"', 'Weak')
+        function = lua51.LuaRuntime().eval(f'function(...) return assert(loadstring({output!r}))(...) end')
+        self.assertEqual(tuple(function(1, 2)), (2, 1, 'x'))
+
+
+class FallbackEngineTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = FallbackEngine(workers=1)
+        self.addCleanup(self.engine.close)
+
+    def test_response_is_shaped_like_the_api(self):
+        result = asyncio.run(self.engine.obfuscate(b'print("hi")', 'Weak'))
+        self.assertTrue(result['success'])
+        self.assertTrue(result['fallback'])
+        self.assertEqual(result['preset'], 'Weak')
+        self.assertEqual(result['obfuscatedCode'], obfuscate_source('print("hi")', 'Weak'))
+
+    def test_errors_are_returned(self):
+        result = asyncio.run(self.engine.obfuscate('print(', 'Minify'))
+        self.assertTrue(result['error'].startswith('Obfuscation failed:'))
+        result = asyncio.run(self.engine.obfuscate(b'\xff\xfe', 'Minify'))
+        self.assertEqual(result['error'], 'Not a valid UTF-8 text file')
+
+    def test_supported_presets(self):
+        self.assertTrue(self.engine.supports('Weak'))
+        self.assertFalse(self.engine.supports('Medium'))
+        self.assertTrue(self.engine.runs_locally('Minify'))
+        self.assertFalse(self.engine.runs_locally('Weak'))
+        self.assertFalse(FallbackEngine(local_minify=False).runs_locally('Minify'))
+
+
+if __name__ == '__main__':
+    unittest.main()
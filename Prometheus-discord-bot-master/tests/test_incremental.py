@@ -0,0 +1,100 @@
+"""Tests for resubmission detection in prometheus_obfuscator.incremental"""
+
+import unittest
+
+from prometheus_obfuscator.incremental import TOP_LEVEL, SubmissionIndex, similarity, split_units
+
+V1 = '''
+local Players = game:GetService("Players")
+
+local function greet(player)
+    if player then
+        print("Hello " .. player.Name)
+    end
+end
+
+function M.update(dt)
+    for i = 1, 10 do
+        repeat dt = dt - 1 until dt < 0
+    end
+    local f = function() return 1 end
+end
+
+Players.PlayerAdded:Connect(greet)
+'''
+
+# Same code, different whitespace and comments
+V1_REFORMATTED = V1.replace('    ', '\t').replace('local Players', '-- services\nlocal Players')
+
+V2 = V1.replace('"Hello "', '"Welcome "')
+
+
+class SplitUnitsTest(unittest.TestCase):
+    def test_top_level_functions_are_units(self):
+        units = split_units(V1)
+        self.assertEqual(
+            [unit.label for unit in units],
+            [TOP_LEVEL, 'function greet', 'function M.update', TOP_LEVEL],
+        )
+        self.assertEqual([unit.line for unit in units], [2, 4, 10, 17])
+
+    def test_formatting_does_not_change_fingerprints(self):
+        self.assertEqual(
+            [unit.digest for unit in split_units(V1)],
+            [unit.digest for unit in split_units(V1_REFORMATTED.encode('utf-8'))],
+        )
+
+    def test_similarity_names_the_changed_units(self):
+        score, changed = similarity(split_units(V1), split_units(V2))
+        self.assertEqual(score, 0.75)
+        self.assertEqual(changed, ['function greet'])
+        self.assertEqual(similarity(split_units(V1), split_units(V1)), (1.0, []))
+
+
+class SubmissionIndexTest(unittest.TestCase):
+    def test_same_filename_is_a_resubmission(self):
+        index = SubmissionIndex(threshold=0.5)
+        self.assertIsNone(index.record(1, 'script.lua', V1))
+
+        match = index.record(1, 'script.lua', V2)
+        self.assertEqual(match.filename, 'script.lua')
+        self.assertEqual(match.similarity, 0.75)
+        self.assertEqual(match.changed, ['function greet'])
+        self.assertEqual(
+            match.describe(), "Updated version of `script.lua`: 1 of 4 units changed (`function greet`)"
+        )
+        self.assertEqual(len(index), 1)
+
+    def test_renamed_version_is_recognized_by_its_units(self):
+        index = SubmissionIndex(threshold=0.5)
+        index.record(1, 'other.lua', 'print("unrelated")')
+        index.record(1, 'script_v1.lua', V1)
+
+        match = index.record(1, 'script_v2.lua', V1_REFORMATTED)
+        self.assertEqual(match.filename, 'script_v1.lua')
+        self.assertEqual(match.describe(), "Same code as `script_v1.lua`")
+
+    def test_unrelated_or_foreign_submissions_do_not_match(self):
+        index = SubmissionIndex(threshold=0.8)
+        index.record(1, 'script.lua', V1)
+        # Below the threshold
+        self.assertIsNone(index.record(1, 'script.lua', V2))
+        # Another user's upload of the same script
+        self.assertIsNone(index.record(2, 'script.lua', V1))
+        # Not Lua
+        self.assertIsNone(index.record(1, 'script.lua', 'print("unterminated'))
+
+    def test_old_submissions_are_forgotten(self):
+        index = SubmissionIndex(history=2)
+        for name in ('a.lua', 'b.lua', 'c.lua'):
+            index.record(1, name, f'print("{name}")')
+        self.assertEqual(len(index), 2)
+        self.assertIsNone(index.record(1, 'x.lua', 'print("a.lua")'))
+
+        expiring = SubmissionIndex(max_age=0)
+        expiring.record(1, 'script.lua', V1)
+        self.assertIsNone(expiring.record(1, 'script.lua', V1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+"""Tests for the job journal in prometheus_obfuscator.jobstore"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from prometheus_obfuscator import jobstore
+from prometheus_obfuscator.cache import source_key
+from prometheus_obfuscator.jobstore import JobStore
+
+
+class _Clock:
+    """Stands in for the time module, one second per call"""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def time(self) -> float:
+        self.now += 1
+        return self.now
+
+
+class JobStoreTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'jobs.sqlite3')
+        self.clock = _Clock()
+        patcher = mock.patch.object(jobstore, 'time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _open(self, **kwargs) -> JobStore:
+        store = JobStore(self.path, **kwargs)
+        self.addCleanup(store.close)
+        return store
+
+    def _add(self, store: JobStore, job_id: int, **kwargs) -> None:
+        fields = dict(channel_id=10, message_id=job_id + 100, user_id=1, guild_id=20,
+                      filename=f'{job_id}.lua', preset='Medium', source=b'print(%d)' % job_id)
+        fields.update(kwargs)
+        store.add(job_id, **fields)
+
+    def test_unfinished_jobs_survive_a_restart(self):
+        store = self._open()
+        self._add(store, 1, notice='Downgraded', preset='Strong')
+        self._add(store, 2, guild_id=None)
+        self._add(store, 3)
+        store.mark_running(1)
+        store.finish(3)
+        store.close()
+
+        jobs = self._open().unfinished()
+        self.assertEqual([job.id for job in jobs], [1, 2])
+
+        first, second = jobs
+        self.assertEqual(first.state, 'running')
+        self.assertEqual(first.notice, 'Downgraded')
+        self.assertEqual((first.channel_id, first.message_id, first.user_id, first.guild_id), (10, 101, 1, 20))
+        self.assertEqual(first.source, b'print(1)')
+        self.assertEqual(first.source_key, source_key(b'print(1)', 'Strong'))
+        self.assertEqual(second.state, 'queued')
+        self.assertIsNone(second.guild_id)
+        self.assertIsNone(second.notice)
+
+    def test_jobs_replay_oldest_first(self):
+        store = self._open()
+        for job_id in (3, 1, 2):
+            self._add(store, job_id)
+        self.assertEqual([job.id for job in store.unfinished()], [3, 1, 2])
+        self.assertEqual(len(store), 3)
+
+    def test_finished_jobs_leave_the_journal(self):
+        store = self._open()
+        self._add(store, 1)
+        store.mark_running(1)
+        store.finish(1)
+        self.assertEqual(store.unfinished(), [])
+        self.assertEqual(len(store), 0)
+
+    def test_stale_jobs_are_dropped_instead_of_replayed(self):
+        store = self._open(max_age=60)
+        self._add(store, 1)
+        self.clock.now += 30
+        self._add(store, 2)
+        self.clock.now += 40
+        self.assertEqual([job.id for job in store.unfinished()], [2])
+        self.assertEqual(len(store), 1)
+
+    def test_adding_a_job_again_replaces_it(self):
+        store = self._open()
+        self._add(store, 1, preset='Strong')
+        store.mark_running(1)
+        self._add(store, 1, preset='Medium')
+        (job,) = store.unfinished()
+        self.assertEqual((job.preset, job.state), ('Medium', 'queued'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+"""Tests for the token bucket quotas in prometheus_obfuscator.quotas"""
+
+import math
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from prometheus_obfuscator import quotas as quotas_module
+from prometheus_obfuscator.quotas import QuotaManager
+
+
+class TakeTest(unittest.TestCase):
+    def test_charges_user_and_guild_by_preset_weight(self):
+        quotas = QuotaManager(user_quota=10, guild_quota=20, preset_weights={'Weak': 1, 'Strong': 4})
+
+        self.assertTrue(quotas.take(1, 100, 'Strong').allowed)
+        self.assertTrue(quotas.take(1, 100, 'Weak', count=2).allowed)
+
+        remaining = quotas.remaining(1, 100)
+        self.assertAlmostEqual(remaining['user'][0], 4, places=2)
+        self.assertAlmostEqual(remaining['guild'][0], 14, places=2)
+
+    def test_refused_job_is_not_charged(self):
+        quotas = QuotaManager(user_quota=4, guild_quota=None, preset_weights={'Strong': 4})
+        self.assertTrue(quotas.take(1, None, 'Strong').allowed)
+
+        decision = quotas.take(1, None, 'Strong')
+        self.assertFalse(decision.allowed)
+        self.assertEqual(decision.scope, 'user')
+        self.assertGreater(decision.retry_after, 0)
+        self.assertLess(quotas.remaining(1, None)['user'][0], 0.01)
+
+    def test_guild_quota_is_shared_by_its_users(self):
+        quotas = QuotaManager(user_quota=10, guild_quota=3, preset_weights={'Weak': 1})
+        for user_id in (1, 2, 3):
+            self.assertTrue(quotas.take(user_id, 100, 'Weak').allowed)
+
+        decision = quotas.take(4, 100, 'Weak')
+        self.assertFalse(decision.allowed)
+        self.assertEqual(decision.scope, 'guild')
+        # Another server is not affected
+        self.assertTrue(quotas.take(4, 200, 'Weak').allowed)
+
+    def test_job_bigger_than_the_whole_quota_is_refused(self):
+        quotas = QuotaManager(user_quota=5, guild_quota=100, preset_weights={'Weak': 1})
+
+        decision = quotas.take(1, 100, 'Weak', count=6)
+        self.assertFalse(decision.allowed)
+        self.assertEqual(decision.retry_after, math.inf)
+        # Not even partly charged
+        self.assertEqual(quotas.remaining(1, 100)['user'][0], 5)
+        self.assertEqual(quotas.remaining(1, 100)['guild'][0], 100)
+
+    def test_refund_gives_back_the_charge_but_never_overfills(self):
+        quotas = QuotaManager(user_quota=4, guild_quota=None, preset_weights={'Strong': 4})
+        self.assertTrue(quotas.take(1, None, 'Strong').allowed)
+
+        quotas.refund(1, None, 'Strong')
+        self.assertTrue(quotas.take(1, None, 'Strong').allowed)
+        quotas.refund(1, None, 'Strong')
+        quotas.refund(1, None, 'Strong')
+        self.assertEqual(quotas.remaining(1, None)['user'][0], 4)
+
+    def test_buckets_refill_over_the_period(self):
+        clock = mock.Mock(monotonic=mock.Mock(return_value=1000.0))
+        with mock.patch.object(quotas_module, 'time', clock):
+            quotas = QuotaManager(user_quota=10, guild_quota=None, period=100, preset_weights={'Weak': 1})
+            self.assertTrue(quotas.take(1, None, 'Weak', count=10).allowed)
+
+            decision = quotas.take(1, None, 'Weak', count=4)
+            self.assertFalse(decision.allowed)
+            self.assertAlmostEqual(decision.retry_after, 40)
+
+            clock.monotonic.return_value = 1040.0
+            self.assertTrue(quotas.take(1, None, 'Weak', count=4).allowed)
+            # Never beyond the quota, however long it was idle
+            clock.monotonic.return_value = 5000.0
+            self.assertEqual(quotas.remaining(1, None)['user'][0], 10)
+
+    def test_unlimited_and_per_guild_quotas(self):
+        quotas = QuotaManager(user_quota=None, guild_quota=5, preset_weights={'Weak': 1},
+                              guild_quotas={100: None, 200: 50})
+        self.assertTrue(quotas.take(1, 100, 'Weak', count=1000).allowed)
+        self.assertTrue(quotas.take(1, 200, 'Weak', count=50).allowed)
+        self.assertFalse(quotas.take(1, 300, 'Weak', count=6).allowed)
+        # DMs only count against the (unlimited) user quota
+        self.assertTrue(quotas.take(1, None, 'Weak', count=1000).allowed)
+
+
+class PersistTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'quotas.db')
+
+    def _quotas(self) -> QuotaManager:
+        return QuotaManager(user_quota=10, guild_quota=100, preset_weights={'Weak': 1}, state_path=self.path)
+
+    def test_quotas_survive_a_restart(self):
+        quotas = self._quotas()
+        self.assertTrue(quotas.take(1, 100, 'Weak', count=4).allowed)
+        quotas.close()
+
+        remaining = self._quotas().remaining(1, 100)
+        self.assertAlmostEqual(remaining['user'][0], 6, places=2)
+        self.assertAlmostEqual(remaining['guild'][0], 96, places=2)
+
+    def test_shard_processes_sharing_the_file_add_up_their_spending(self):
+        first, second = self._quotas(), self._quotas()
+        self.assertTrue(first.take(1, 100, 'Weak', count=3).allowed)
+        self.assertTrue(second.take(1, 100, 'Weak', count=2).allowed)
+        self.assertTrue(second.take(2, 100, 'Weak', count=1).allowed)
+        first.close()
+        # The second process loaded the file before the first one saved,
+        # its stale copy must not overwrite what the first one spent
+        second.close()
+
+        remaining = self._quotas().remaining(1, 100)
+        self.assertAlmostEqual(remaining['user'][0], 5, places=2)
+        self.assertAlmostEqual(remaining['guild'][0], 94, places=2)
+        self.assertAlmostEqual(self._quotas().remaining(2, 100)['user'][0], 9, places=2)
+
+    def test_saving_leaves_rows_of_other_processes_alone(self):
+        first = self._quotas()
+        self.assertTrue(first.take(1, 100, 'Weak', count=3).allowed)
+        first.close()
+
+        # Loads the row of user 1, but only spends on user 2
+        second = self._quotas()
+        self.assertTrue(second.take(2, None, 'Weak').allowed)
+        second.close()
+
+        self.assertAlmostEqual(self._quotas().remaining(1, 100)['user'][0], 7, places=2)
+
+    def test_refunds_are_saved(self):
+        quotas = self._quotas()
+        self.assertTrue(quotas.take(1, None, 'Weak', count=4).allowed)
+        quotas.refund(1, None, 'Weak', count=3)
+        quotas.close()
+
+        self.assertAlmostEqual(self._quotas().remaining(1, None)['user'][0], 9, places=2)
+
+
+if __name__ == '__main__':
+    unittest.main()
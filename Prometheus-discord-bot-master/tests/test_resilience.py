@@ -0,0 +1,92 @@
+"""Tests for the circuit breaker handling in prometheus_obfuscator.resilience"""
+
+import asyncio
+import time
+import unittest
+
+from prometheus_obfuscator.resilience import CircuitBreaker, CircuitOpenError, ResiliencePolicy, TransientError
+
+
+def _half_open_policy() -> ResiliencePolicy:
+    """A policy whose breaker is half-open, i.e. lets exactly one trial call through"""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    return ResiliencePolicy(max_retries=0, timeout=5.0, breaker=breaker)
+
+
+def _fail_locally(timeout: float):
+    # E.g. one of several API instances is down
+    raise TransientError("instance down", trips_breaker=False)
+
+
+class HalfOpenTrialTest(unittest.TestCase):
+    """A trial that fails without tripping the breaker must not block later calls"""
+
+    def test_sync_trial_failing_without_trip_is_released(self):
+        policy = _half_open_policy()
+        with self.assertRaises(TransientError):
+            policy.call_sync('/obfuscate', _fail_locally)
+
+        self.assertEqual(policy.call_sync('/obfuscate', lambda timeout: 'ok'), 'ok')
+        self.assertEqual(policy.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_async_trial_failing_without_trip_is_released(self):
+        policy = _half_open_policy()
+
+        async def fail(timeout: float):
+            _fail_locally(timeout)
+
+        async def succeed(timeout: float):
+            return 'ok'
+
+        async def run():
+            with self.assertRaises(TransientError):
+                await policy.call('/obfuscate', fail)
+            return await policy.call('/obfuscate', succeed)
+
+        self.assertEqual(asyncio.run(run()), 'ok')
+        self.assertEqual(policy.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_other_calls_ending_do_not_release_the_running_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+        policy = ResiliencePolicy(max_retries=0, timeout=5.0, breaker=breaker)
+
+        async def run():
+            release = asyncio.Event()
+
+            async def wait(timeout: float):
+                await release.wait()
+                return 'ok'
+
+            async def fail_locally(timeout: float):
+                await release.wait()
+                _fail_locally(timeout)
+
+            # Started while the circuit was closed
+            cancelled = asyncio.create_task(policy.call('/obfuscate', wait))
+            failing = asyncio.create_task(policy.call('/obfuscate', fail_locally))
+            await asyncio.sleep(0)
+            breaker.record_failure()
+            await asyncio.sleep(0.02)
+            trial = asyncio.create_task(policy.call('/obfuscate', wait))
+            await asyncio.sleep(0)
+
+            cancelled.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await cancelled
+            with self.assertRaises(CircuitOpenError):
+                breaker.before_call()
+
+            release.set()
+            with self.assertRaises(TransientError):
+                await failing
+            return await trial
+
+        self.assertEqual(asyncio.run(run()), 'ok')
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+
+if __name__ == '__main__':
+    unittest.main()
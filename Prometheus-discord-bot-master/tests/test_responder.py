@@ -0,0 +1,74 @@
+"""Tests for the response pacing in prometheus_obfuscator.responder"""
+
+import asyncio
+import unittest
+
+from prometheus_obfuscator import responder
+from prometheus_obfuscator.responder import ResponseScheduler
+
+
+async def _append(sent: list, item) -> None:
+    sent.append(item)
+
+
+class ResponseSchedulerTest(unittest.TestCase):
+    def test_status_updates_are_merged_per_message(self):
+        sent = []
+
+        async def run():
+            scheduler = ResponseScheduler(rate=1, per=0.05)
+            await scheduler.send('channel', lambda: asyncio.sleep(0))  # spends the only token
+            for position in (3, 2, 1):
+                scheduler.update('channel', 'message', lambda position=position: _append(sent, position))
+            await asyncio.sleep(0.2)
+            return scheduler
+
+        scheduler = asyncio.run(run())
+        self.assertEqual(sent, [1])
+        self.assertEqual(scheduler.dropped, 2)
+
+    def test_final_response_cancels_the_pending_update_it_replaces(self):
+        sent = []
+
+        async def run():
+            scheduler = ResponseScheduler(rate=1, per=0.05)
+            await scheduler.send('channel', lambda: asyncio.sleep(0))
+            scheduler.update('channel', 'message', lambda: _append(sent, 'status'))
+            await scheduler.send('channel', lambda: _append(sent, 'final'), replaces='message')
+            await asyncio.sleep(0.2)
+
+        asyncio.run(run())
+        self.assertEqual(sent, ['final'])
+
+    def test_final_response_waits_for_the_edit_in_flight_even_after_idle_routes_are_forgotten(self):
+        sent = []
+
+        async def run():
+            # Refills almost instantly, so the route looks idle while its edit is in flight
+            scheduler = ResponseScheduler(rate=1, per=0.001)
+            release = asyncio.Event()
+
+            async def slow_status():
+                await release.wait()
+                sent.append('status')
+
+            scheduler.update('channel', 'message', slow_status)
+            await asyncio.sleep(0.01)
+            # Enough other channels to make the scheduler forget idle routes
+            for channel in range(responder.MAX_IDLE_ROUTES):
+                await scheduler.send(channel, lambda: asyncio.sleep(0))
+            await asyncio.sleep(0.01)
+
+            final = asyncio.create_task(
+                scheduler.send('channel', lambda: _append(sent, 'final'), replaces='message')
+            )
+            await asyncio.sleep(0.01)
+            release.set()
+            await final
+
+        asyncio.run(run())
+        self.assertEqual(sent, ['status', 'final'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,260 @@
+"""Tests for the fair job queue in prometheus_obfuscator.scheduler"""
+
+import asyncio
+import unittest
+
+from prometheus_obfuscator.scheduler import JobScheduler, JobSupersededError, QueueFullError
+
+
+def _recorder(order, name):
+    """A job that appends its name to order when it runs"""
+    async def job():
+        order.append(name)
+        return name
+    return job
+
+
+class FairnessTest(unittest.TestCase):
+    def test_waiting_jobs_rotate_across_guilds_then_users(self):
+        async def run():
+            scheduler = JobScheduler(concurrency=1, max_queue=10, max_per_user=5)
+            release = asyncio.Event()
+            blocker = asyncio.create_task(scheduler.submit(release.wait, user_id=0, guild_id='A'))
+            await asyncio.sleep(0)
+
+            order = []
+            jobs = [('A', 1, 'a1'), ('A', 1, 'a2'), ('A', 1, 'a3'), ('A', 2, 'b1'), ('B', 3, 'c1')]
+            tasks = [
+                asyncio.create_task(scheduler.submit(_recorder(order, name), user_id=user_id, guild_id=guild_id))
+                for guild_id, user_id, name in jobs
+            ]
+            await asyncio.sleep(0)
+            self.assertEqual(scheduler.queued, 5)
+
+            release.set()
+            await asyncio.gather(blocker, *tasks)
+            self.assertEqual(order, ['a1', 'c1', 'b1', 'a2', 'a3'])
+
+        asyncio.run(run())
+
+    def test_queue_positions_are_reported(self):
+        async def run():
+            scheduler = JobScheduler(concurrency=1, max_queue=10)
+            release = asyncio.Event()
+            blocker = asyncio.create_task(scheduler.submit(release.wait, user_id=0))
+            await asyncio.sleep(0)
+
+            positions = {1: [], 2: []}
+
+            def on_position(user_id):
+                async def callback(position):
+                    positions[user_id].append(position)
+                return callback
+
+            tasks = [
+                asyncio.create_task(scheduler.submit(
+                    lambda: asyncio.sleep(0), user_id=user_id, on_position=on_position(user_id)))
+                for user_id in (1, 2)
+            ]
+            await asyncio.sleep(0)
+            release.set()
+            await asyncio.gather(blocker, *tasks)
+            await asyncio.sleep(0)
+
+            self.assertEqual(positions[1], [1, 0])
+            self.assertEqual(positions[2], [2, 1, 0])
+
+        asyncio.run(run())
+
+
+class HeavyJobTest(unittest.TestCase):
+    def test_heavy_jobs_are_capped_and_light_jobs_pass_them(self):
+        async def run():
+            scheduler = JobScheduler(concurrency=3, max_queue=10, max_per_user=10, max_heavy=1)
+            release = asyncio.Event()
+            order = []
+
+            async def heavy():
+                order.append('heavy')
+                await release.wait()
+
+            first = asyncio.create_task(scheduler.submit(heavy, user_id=1, heavy=True))
+            second = asyncio.create_task(scheduler.submit(heavy, user_id=1, heavy=True))
+            await asyncio.sleep(0)
+            self.assertEqual((scheduler.running, scheduler.running_heavy, scheduler.queued), (1, 1, 1))
+
+            # A light job queued behind the heavy one starts right away
+            await asyncio.wait_for(scheduler.submit(_recorder(order, 'light'), user_id=1), 1)
+            self.assertEqual(order, ['heavy', 'light'])
+
+            release.set()
+            await asyncio.gather(first, second)
+            self.assertEqual(order, ['heavy', 'light', 'heavy'])
+            self.assertEqual(scheduler.running_heavy, 0)
+
+        asyncio.run(run())
+
+    def test_max_heavy_defaults_to_half_the_slots(self):
+        self.assertEqual(JobScheduler(concurrency=4).max_heavy, 2)
+        self.assertEqual(JobScheduler(concurrency=1).max_heavy, 1)
+
+
+class ReplaceTest(unittest.TestCase):
+    def test_new_version_takes_over_the_waiting_job(self):
+        async def run():
+            scheduler = JobScheduler(concurrency=1, max_queue=2, max_per_user=3)
+            release = asyncio.Event()
+            blocker = asyncio.create_task(scheduler.submit(release.wait, user_id=0))
+            order = []
+            old = asyncio.create_task(scheduler.submit(
+                _recorder(order, 'v1'), user_id=1, guild_id='A', key='script.lua'))
+            other = asyncio.create_task(scheduler.submit(_recorder(order, 'other'), user_id=2, guild_id='A'))
+            await asyncio.sleep(0)
+
+            positions = []
+
+            async def on_position(position):
+                positions.append(position)
+
+            new = asyncio.create_task(scheduler.submit(
+                _recorder(order, 'v2'), user_id=1, guild_id='A', key='script.lua',
+                replaces='script.lua', on_position=on_position))
+            with self.assertRaises(JobSupersededError):
+                await old
+            # Same place in the queue, and the full queue did not reject it
+            self.assertEqual(scheduler.queued, 2)
+
+            release.set()
+            await asyncio.gather(blocker, other, new)
+            self.assertEqual(order, ['v2', 'other'])
+            self.assertEqual(positions, [1, 0])
+
+        asyncio.run(run())
+
+    def test_nothing_to_replace_queues_normally(self):
+        async def run():
+            scheduler = JobScheduler(concurrency=1, max_queue=10)
+            release = asyncio.Event()
+            running = asyncio.create_task(scheduler.submit(release.wait, user_id=1, key='script.lua'))
+            await asyncio.sleep(0)
+
+            order = []
+            # The running job and other users' jobs are never replaced
+            new = asyncio.create_task(scheduler.submit(
+                _recorder(order, 'v2'), user_id=1, key='script.lua', replaces='script.lua'))
+            foreign = asyncio.create_task(scheduler.submit(
+                _recorder(order, 'foreign'), user_id=2, replaces='script.lua'))
+            await asyncio.sleep(0)
+            self.assertEqual(scheduler.queued, 2)
+
+            release.set()
+            await asyncio.gather(running, new, foreign)
+            self.assertEqual(sorted(order), ['foreign', 'v2'])
+
+        asyncio.run(run())
+
+
+class QueueLimitTest(unittest.TestCase):
+    def test_heavy_jobs_waiting_for_a_heavy_slot_count_against_the_queue(self):
+        async def run():
+            scheduler = JobScheduler(concurrency=4, max_queue=1, max_per_user=10, max_heavy=1)
+            release = asyncio.Event()
+            tasks = [
+                asyncio.create_task(scheduler.submit(release.wait, user_id=user_id, heavy=True))
+                for user_id in (1, 2)
+            ]
+            await asyncio.sleep(0)
+            # Slots are free, but the heavy one is taken and the queue is full
+            self.assertEqual((scheduler.running, scheduler.queued), (1, 1))
+            with self.assertRaises(QueueFullError) as raised:
+                await asyncio.wait_for(scheduler.submit(release.wait, user_id=3, heavy=True), 1)
+            self.assertEqual(raised.exception.scope, 'queue')
+            # Light jobs still start right away
+            await asyncio.wait_for(scheduler.submit(lambda: asyncio.sleep(0), user_id=4), 1)
+
+            release.set()
+            await asyncio.gather(*tasks)
+
+        asyncio.run(run())
+
+    def test_user_limit_counts_queued_and_running_jobs(self):
+        async def run():
+            scheduler = JobScheduler(concurrency=1, max_queue=10, max_per_user=2)
+            release = asyncio.Event()
+            tasks = [asyncio.create_task(scheduler.submit(release.wait, user_id=1)) for _ in range(2)]
+            await asyncio.sleep(0)
+
+            with self.assertRaises(QueueFullError) as raised:
+                await asyncio.wait_for(scheduler.submit(release.wait, user_id=1), 1)
+            self.assertEqual(raised.exception.scope, 'user')
+
+            release.set()
+            await asyncio.gather(*tasks)
+            # Finished jobs give the slots back
+            await asyncio.wait_for(scheduler.submit(lambda: asyncio.sleep(0), user_id=1), 1)
+
+        asyncio.run(run())
+
+    def test_full_queue_rejects(self):
+        async def run():
+            scheduler = JobScheduler(concurrency=1, max_queue=1, max_per_user=10)
+            release = asyncio.Event()
+            tasks = [asyncio.create_task(scheduler.submit(release.wait, user_id=user_id)) for user_id in (1, 2)]
+            await asyncio.sleep(0)
+
+            with self.assertRaises(QueueFullError) as raised:
+                await asyncio.wait_for(scheduler.submit(release.wait, user_id=3), 1)
+            self.assertEqual(raised.exception.scope, 'queue')
+
+            release.set()
+            await asyncio.gather(*tasks)
+
+        asyncio.run(run())
+
+
+class CancelTest(unittest.TestCase):
+    def test_cancelled_waiting_job_never_runs_and_frees_its_place(self):
+        async def run():
+            scheduler = JobScheduler(concurrency=1, max_queue=1, max_per_user=1)
+            release = asyncio.Event()
+            blocker = asyncio.create_task(scheduler.submit(release.wait, user_id=0))
+            order = []
+            waiting = asyncio.create_task(scheduler.submit(_recorder(order, 'cancelled'), user_id=1))
+            await asyncio.sleep(0)
+            self.assertEqual(scheduler.queued, 1)
+
+            waiting.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiting
+            self.assertEqual(scheduler.queued, 0)
+
+            # The queue place and the user's share are free again
+            replacement = asyncio.create_task(scheduler.submit(_recorder(order, 'next'), user_id=1))
+            await asyncio.sleep(0)
+            release.set()
+            await asyncio.gather(blocker, replacement)
+            self.assertEqual(order, ['next'])
+
+        asyncio.run(run())
+
+    def test_cancelled_running_job_keeps_its_slot_until_it_ends(self):
+        async def run():
+            scheduler = JobScheduler(concurrency=1, max_queue=10)
+            release = asyncio.Event()
+            running = asyncio.create_task(scheduler.submit(release.wait, user_id=1))
+            await asyncio.sleep(0)
+
+            running.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await running
+            self.assertEqual(scheduler.running, 1)
+
+            release.set()
+            await asyncio.sleep(0)
+            self.assertEqual(scheduler.running, 0)
+
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
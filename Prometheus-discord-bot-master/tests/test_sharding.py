@@ -0,0 +1,91 @@
+"""Tests for the crash handling of prometheus_obfuscator.sharding.ShardRunner"""
+
+import unittest
+from unittest import mock
+
+from prometheus_obfuscator import sharding
+from prometheus_obfuscator.sharding import RESTART_DELAY, ShardRunner
+
+
+class _FakeClock:
+    """Stands in for the time module: sleep() only advances monotonic()"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+        if self.now > 10 * RESTART_DELAY:
+            raise AssertionError("the dead shard process was never restarted")
+
+
+class _FakeProcess:
+    def __init__(self, exitcode=None):
+        self.exitcode = exitcode
+        self.pid = 0
+
+    def is_alive(self) -> bool:
+        return self.exitcode is None
+
+
+class _FakeRunner(ShardRunner):
+    """Starts fake processes, which crash right away while `crashes` is positive"""
+
+    def __init__(self, clock: _FakeClock, crashes: int):
+        super().__init__(target=print, shard_count=2, processes=2)
+        self.clock = clock
+        self.crashes = crashes
+        self.started = []
+
+    def _start(self, assignment) -> None:
+        self.started.append((assignment.process_index, self.clock.now))
+        if self.crashes:
+            self.crashes -= 1
+            self._processes[assignment.process_index] = _FakeProcess(exitcode=1)
+        else:
+            self._processes[assignment.process_index] = _FakeProcess()
+            self.stop()
+
+
+class RestartTest(unittest.TestCase):
+    def _supervise(self, crashes: int) -> _FakeRunner:
+        clock = _FakeClock()
+        runner = _FakeRunner(clock, crashes)
+        runner._processes = {0: _FakeProcess(exitcode=1), 1: _FakeProcess()}
+        with mock.patch.object(sharding, 'time', clock):
+            runner._supervise()
+        return runner
+
+    def test_dead_shard_is_restarted_after_its_delay(self):
+        runner = self._supervise(crashes=0)
+
+        [(index, started_at)] = runner.started
+        self.assertEqual(index, 0)
+        # Noticed within a second of polling, restarted one delay later
+        self.assertGreaterEqual(started_at, RESTART_DELAY)
+        self.assertLessEqual(started_at, RESTART_DELAY + 2)
+        self.assertTrue(runner._processes[0].is_alive())
+
+    def test_restart_delay_doubles_for_a_shard_that_keeps_crashing(self):
+        runner = self._supervise(crashes=1)
+
+        (_, first), (_, second) = runner.started
+        self.assertGreaterEqual(second - first, 2 * RESTART_DELAY)
+        self.assertLessEqual(second - first, 2 * RESTART_DELAY + 2)
+
+    def test_clean_exit_is_not_restarted(self):
+        clock = _FakeClock()
+        runner = _FakeRunner(clock, crashes=0)
+        runner._processes = {0: _FakeProcess(exitcode=0), 1: _FakeProcess(exitcode=0)}
+        with mock.patch.object(sharding, 'time', clock):
+            runner._supervise()
+
+        self.assertEqual(runner.started, [])
+        self.assertEqual(runner._processes, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+"""Tests for the streaming JSON parser in prometheus_obfuscator.streaming"""
+
+import io
+import json
+import unittest
+
+from prometheus_obfuscator.streaming import JsonFieldStream
+
+CODE = 'local s = "tab\\t quote\\" slash/ é 中 \U0001f600"\nprint(s)\r\n'
+BODY = json.dumps({
+    'success': True,
+    'obfuscatedCode': CODE,
+    'stats': {'size': [1, 2], 'note': 'a "}" inside'},
+    'ratio': 1.5e2,
+    'warning': None,
+    'preset': 'Wéak',
+}).encode('utf-8')
+
+
+def _parse(chunks):
+    sink = io.BytesIO()
+    stream = JsonFieldStream('obfuscatedCode', sink)
+    for chunk in chunks:
+        stream.feed(chunk)
+    return stream, stream.close(), sink.getvalue()
+
+
+class JsonFieldStreamTest(unittest.TestCase):
+    def assertParsed(self, chunks):
+        stream, fields, streamed = _parse(chunks)
+        self.assertTrue(stream.found)
+        self.assertEqual(streamed.decode('utf-8'), CODE)
+        self.assertEqual(stream.streamed_bytes, len(streamed))
+        expected = json.loads(BODY)
+        del expected['obfuscatedCode']
+        self.assertEqual(fields, expected)
+
+    def test_whole_body(self):
+        self.assertParsed([BODY])
+
+    def test_every_two_way_split(self):
+        for cut in range(len(BODY) + 1):
+            with self.subTest(cut=cut):
+                self.assertParsed([BODY[:cut], BODY[cut:]])
+
+    def test_one_byte_at_a_time(self):
+        self.assertParsed([BODY[i:i + 1] for i in range(len(BODY))])
+
+    def test_ascii_escaped_body(self):
+        # \uXXXX escapes and surrogate pairs split across chunks
+        body = json.dumps({'obfuscatedCode': CODE, 'success': True}, ensure_ascii=True).encode('ascii')
+        for size in (1, 2, 3, 5, 7):
+            with self.subTest(size=size):
+                sink = io.BytesIO()
+                stream = JsonFieldStream('obfuscatedCode', sink)
+                for start in range(0, len(body), size):
+                    stream.feed(body[start:start + size])
+                self.assertEqual(stream.close(), {'success': True})
+                self.assertEqual(sink.getvalue().decode('utf-8'), CODE)
+
+    def test_missing_field_is_reported(self):
+        stream, fields, streamed = _parse([b'{"error": "bad preset", "code": 400}'])
+        self.assertFalse(stream.found)
+        self.assertEqual(fields, {'error': 'bad preset', 'code': 400})
+        self.assertEqual(streamed, b'')
+
+    def test_truncated_body_raises(self):
+        for cut in (0, 1, len(BODY) // 2, len(BODY) - 1):
+            with self.subTest(cut=cut):
+                stream = JsonFieldStream('obfuscatedCode', io.BytesIO())
+                stream.feed(BODY[:cut])
+                with self.assertRaises(ValueError):
+                    stream.close()
+
+    def test_non_object_body_raises(self):
+        stream = JsonFieldStream('obfuscatedCode', io.BytesIO())
+        with self.assertRaises(ValueError):
+            stream.feed(b'<html>502 Bad Gateway</html>')
+
+
+if __name__ == '__main__':
+    unittest.main()
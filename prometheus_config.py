@@ -19,6 +19,10 @@ Update these settings when you deploy your Prometheus API server.
 # - DigitalOcean: "https://your-droplet-ip:3000"
 PROMETHEUS_API_URL = "http://localhost:3000"  # ðŸ”§ CHANGE THIS
 
+# Several API instances? List them all and the bot balances requests across
+# them (PROMETHEUS_API_URL is ignored when this list is not empty)
+PROMETHEUS_API_URLS = []
+
 # Enable/Disable Prometheus API
 # True = Use Prometheus API (recommended)
 # False = Use built-in obfuscation only
@@ -40,6 +44,11 @@ PROMETHEUS_API_TIMEOUT = 30
 # False = Return error if API is unavailable
 PROMETHEUS_FALLBACK_ENABLED = True
 
+# The built-in engine covers Minify and Weak; it runs in worker processes
+PROMETHEUS_FALLBACK_WORKERS = 2
+# True = Minify is always done locally (no API call), even when the API is up
+PROMETHEUS_LOCAL_MINIFY = True
+
 # ============================================================================
 # DEPLOYMENT QUICK CONFIGS
 # ============================================================================
@@ -72,15 +81,129 @@ PROMETHEUS_FALLBACK_ENABLED = True
 
 # Retry settings for API calls
 PROMETHEUS_MAX_RETRIES = 3
-PROMETHEUS_RETRY_DELAY = 1  # seconds
+PROMETHEUS_RETRY_DELAY = 1  # seconds (base of the jittered exponential backoff)
+
+# Total time budget per endpoint, retries included (others use PROMETHEUS_API_TIMEOUT)
+PROMETHEUS_ENDPOINT_DEADLINES = {
+    "/health": 5,
+    "/presets": 5,
+}
+
+# Load balancing across PROMETHEUS_API_URLS
+# Strategy: "round_robin", "least_outstanding" or "latency_weighted"
+PROMETHEUS_LB_STRATEGY = "round_robin"
+PROMETHEUS_LB_EJECT_AFTER = 3  # consecutive failures before an instance is skipped
+PROMETHEUS_LB_EJECT_DURATION = 30  # seconds an ejected instance is skipped
+
+# Circuit breaker: stop calling the API after this many consecutive failures
+# and fail fast until the reset timeout has passed
+PROMETHEUS_CIRCUIT_FAILURE_THRESHOLD = 5
+PROMETHEUS_CIRCUIT_RESET_TIMEOUT = 30  # seconds
+
+# Seconds between background /health checks (commands read the cached result)
+PROMETHEUS_HEALTH_CHECK_INTERVAL = 30
+
+# Job queue: obfuscations running against the API at once, jobs allowed to
+# wait (more are rejected right away) and jobs one user may have in flight
+PROMETHEUS_MAX_CONCURRENT_JOBS = 4
+PROMETHEUS_MAX_QUEUE_DEPTH = 50
+PROMETHEUS_MAX_JOBS_PER_USER = 3
+
+# Heavy jobs: sources are checked and costed before queueing (tokens x preset
+# weight, Strong weighs 12 per token). Jobs above the cost only get
+# PROMETHEUS_MAX_HEAVY_JOBS of the slots (None = half of them)
+PROMETHEUS_HEAVY_JOB_COST = 30000
+PROMETHEUS_MAX_HEAVY_JOBS = None
+
+# Admission control: when the expected wait plus the preset's observed API
+# time is over the budget (seconds), the guild's policy applies:
+# "queue" (wait anyway), "downgrade" (Strong runs as Medium, with a notice)
+# or "reject". Per-guild policies map guild IDs to one of these, admins can
+# also change them with !admission
+PROMETHEUS_ADMISSION_LATENCY_BUDGET = 60
+PROMETHEUS_ADMISSION_POLICY = "queue"
+PROMETHEUS_GUILD_ADMISSION_POLICIES = {}  # e.g. {123456789012345678: "downgrade"}
+
+# Quotas: every user and every server may spend QUOTA units per PERIOD
+# seconds (refilled evenly, None = no limit), a job costs its preset's
+# weight. Checked before the attachment is downloaded; refused jobs are
+# told when to retry. Per-guild overrides map guild IDs to their quota.
+# With STATE_PATH set, quotas are saved on shutdown and survive restarts.
+# Sharded bots keep user quotas per shard process
+PROMETHEUS_QUOTA_PERIOD = 600
+PROMETHEUS_USER_QUOTA = 20  # e.g. 5 Strong or 20 Weak jobs per 10 minutes
+PROMETHEUS_GUILD_QUOTA = 200
+PROMETHEUS_GUILD_QUOTAS = {}  # e.g. {123456789012345678: 500}
+PROMETHEUS_QUOTA_PRESET_WEIGHTS = {"Minify": 1, "Weak": 1, "Medium": 2, "Strong": 4}
+PROMETHEUS_QUOTA_STATE_PATH = None  # e.g. "obfuscation_quotas.db"
+
+# Job journal: !obfuscate jobs are recorded in this SQLite file until their
+# result is delivered, and unfinished ones are replayed after a restart.
+# Set PROMETHEUS_RESULT_CACHE_PATH too, so results finished just before the
+# restart come from the cache instead of the API. Jobs older than MAX_AGE
+# seconds are dropped instead of replayed
+PROMETHEUS_JOB_STORE_PATH = None  # e.g. "obfuscation_jobs.db"
+PROMETHEUS_JOB_STORE_MAX_AGE = 3600
+
+# Resubmissions: a script sharing at least THRESHOLD of its top-level
+# functions with one of the user's last HISTORY uploads (within MAX_AGE
+# seconds) is flagged as a new version of it, and replaces that upload if
+# it is still waiting in the queue
+PROMETHEUS_RESUBMISSION_THRESHOLD = 0.5
+PROMETHEUS_RESUBMISSION_HISTORY = 10
+PROMETHEUS_RESUBMISSION_MAX_AGE = 3600
+
+# Batch command: files of one batch sent to the API at once and files
+# accepted per batch (attachments plus .lua files inside .zip archives)
+PROMETHEUS_BATCH_CONCURRENCY = 2
+PROMETHEUS_BATCH_MAX_FILES = 50
+
+# Discord allows about 5 message sends/edits per channel per 5 seconds.
+# Responses are paced to that budget; queue position edits that pile up
+# are merged so only the latest one is sent
+PROMETHEUS_RESPONSE_RATE = 5
+PROMETHEUS_RESPONSE_PER = 5.0
+
+# Sharding (shard_runner.py): total shards (None = as recommended by
+# Discord) and processes to spread them over (None = one per CPU core).
+# Each process has its own job queue, so PROMETHEUS_MAX_CONCURRENT_JOBS
+# applies per process, and serves metrics on PROMETHEUS_METRICS_PORT plus
+# its index
+PROMETHEUS_SHARD_COUNT = None
+PROMETHEUS_SHARD_PROCESSES = None
+
+# Discord bot token used by shard_runner.py and discord_bot_integration.py
+# (the DISCORD_BOT_TOKEN environment variable takes precedence)
+# PROMETHEUS_BOT_TOKEN = "your_actual_bot_token_here"
+
+# The ! prefix commands need the privileged message content intent. Set to
+# False to not request it and use the slash commands only
+PROMETHEUS_PREFIX_COMMANDS = True
+
+# Largest attachment the bot uploads, in bytes (None = the server's limit,
+# 10 MB in DMs). Bigger results are sent zipped, or split into parts if the
+# zip does not fit either
+PROMETHEUS_UPLOAD_LIMIT = None
 
 # Logging settings
 PROMETHEUS_LOG_API_CALLS = True
 PROMETHEUS_LOG_ERRORS = True
 
+# Metrics: stage timings, sizes, cache hits and errors of the obfuscation
+# commands, served in the Prometheus text format on http://HOST:PORT/metrics
+PROMETHEUS_METRICS_ENABLED = False
+PROMETHEUS_METRICS_HOST = "127.0.0.1"  # keep local unless a scraper needs remote access
+PROMETHEUS_METRICS_PORT = 9108
+
 # Performance settings
 PROMETHEUS_CACHE_PRESETS = True  # Cache available presets
-PROMETHEUS_CACHE_DURATION = 300  # 5 minutes
+PROMETHEUS_CACHE_DURATION = 300  # 5 minutes (refreshed in the background after this)
+
+# Result cache: identical (script, preset) pairs are served without an API call
+PROMETHEUS_RESULT_CACHE_ENABLED = True
+PROMETHEUS_RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024  # in-memory budget (64MB)
+PROMETHEUS_RESULT_CACHE_PATH = None  # e.g. "obfuscation_cache.db" to also cache on disk
+PROMETHEUS_RESULT_CACHE_TTL = 86400  # seconds a disk entry stays valid (1 day)
 
 # ============================================================================
 # USAGE INSTRUCTIONS